@@ -0,0 +1,75 @@
+# clients/asr_cache.py
+from __future__ import annotations
+from typing import Optional, Tuple, Dict, Any
+
+import numpy as np
+
+from config import settings
+from utils.audio import resample, vad_trim
+from utils.cache import audio_fingerprint, sha256_text, cache_get_text, cache_put_text
+from utils.logging import write_log
+
+# HTTP / WebSocket 两种 ASR 传输共用的上传前处理与结果缓存：
+# 先统一到 16kHz 单声道并做 VAD 裁剪，再对“有效语音”取指纹作为缓存键，
+# 因此同一段录音无论走哪种传输、重复提交几次，都只请求一次网络。
+
+ASR_SAMPLE_RATE = 16000
+
+
+def to_mono(audio_np: np.ndarray) -> np.ndarray:
+    if audio_np.ndim > 1:
+        if audio_np.shape[0] < audio_np.shape[1]:
+            audio_np = audio_np.mean(axis=1)
+        else:
+            audio_np = audio_np[:, 0]
+    return audio_np.astype(np.float32)
+
+
+def prepare_audio(audio_np: np.ndarray, sample_rate: int) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    上传前的本地处理（在调用方线程执行）：
+    单声道 -> 16kHz 重采样（多相加窗 sinc，带抗混叠）-> VAD 裁首尾静音。
+    返回 (audio16k, prep_meta)；prep_meta["vad"]["vad"] == "silent" 表示整段无声。
+    """
+    audio_np = to_mono(audio_np)
+    if int(sample_rate) != ASR_SAMPLE_RATE:
+        audio_np = resample(audio_np, int(sample_rate), ASR_SAMPLE_RATE)
+    audio_np = audio_np.astype(np.float32)
+    if not getattr(settings, "ASR_VAD_ENABLE", False):
+        return audio_np, {}
+    audio_np, vad = vad_trim(audio_np, ASR_SAMPLE_RATE,
+                             frame_ms=settings.ASR_VAD_FRAME_MS,
+                             thr_dbfs=settings.ASR_VAD_DBFS,
+                             margin_db=settings.ASR_VAD_MARGIN_DB,
+                             max_thr_dbfs=settings.ASR_VAD_MAX_DBFS,
+                             pad_ms=settings.ASR_VAD_PAD_MS,
+                             min_speech_ms=settings.ASR_VAD_MIN_SPEECH_MS)
+    return audio_np, {"vad": vad}
+
+
+def is_silent(prep_meta: Dict[str, Any]) -> bool:
+    return (prep_meta.get("vad") or {}).get("vad") == "silent"
+
+
+def asr_cache_key(audio16k: np.ndarray) -> str:
+    """缓存键 = 模型名 + 归一化音频指纹；缓存关闭时仍返回（兼作在途去重键），读写由 get/put 判断开关。"""
+    return sha256_text(f"{settings.ASR_MODEL}|{audio_fingerprint(audio16k, ASR_SAMPLE_RATE)}")
+
+
+def asr_cache_get(key: Optional[str], transport: str) -> Optional[str]:
+    if not key or not settings.ENABLE_SPEECH_CACHE:
+        return None
+    text = cache_get_text(settings.CACHE_ASR_DIR, key)
+    write_log(settings.LOG_PATH, {"event": "asr_cache", "hit": text is not None,
+                                  "transport": transport, "key": key[:12]})
+    return text
+
+
+def asr_cache_put(key: Optional[str], text: str, meta: Dict[str, Any]) -> None:
+    # 只缓存成功的识别：失败/超时的占位文本不能落盘；
+    # WS 没等到末包（空闲超时提前结束）的结果可能被截断，也不落盘
+    if not key or not settings.ENABLE_SPEECH_CACHE or not text or meta.get("error") or meta.get("stage"):
+        return
+    if meta.get("transport") == "ws" and not meta.get("last_pkg"):
+        return
+    cache_put_text(settings.CACHE_ASR_DIR, key, text)
@@ -3,13 +3,14 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Optional, Tuple, Dict, Any
 import numpy as np
-import base64, io, wave
+import asyncio, base64, io, wave
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from utils.http import shared_session, shared_async_client
 from config import settings
-from utils.cache import sha256_bytes, cache_get_text, cache_put_text
+from utils.cache import sha256_text, cache_get_text
 from utils.logging import write_log
+from utils.singleflight import SingleFlight
+from clients.asr_cache import ASR_SAMPLE_RATE, prepare_audio, is_silent, asr_cache_key, asr_cache_get, asr_cache_put
 
 
 @dataclass
@@ -31,51 +32,101 @@ def _float32_to_wav_bytes(audio: np.ndarray, sample_rate: int) -> bytes:
         wf.writeframes(pcm16.tobytes())
     return buf.getvalue()
 
+
+# 同一段录音（或同一 URL）的并发识别只上传一次，键与 ASR 结果缓存一致
+_asr_flight = SingleFlight("asr_http")
+
+
 class ASRClient:
-    def __init__(self, provider: Optional[str] = None, base_url: Optional[str] = None, api_key: Optional[str] = None):
+    def __init__(self, provider: Optional[str] = None, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 session: Optional[requests.Session] = None):
         self.base_url = (base_url or getattr(settings, "BASE_URL", "https://openai.qiniu.com/v1")).rstrip("/")
         self.api_key = api_key or getattr(settings, "API_KEY", None)
         self._url = f"{self.base_url}/voice/asr"
 
-        # 带重试的Session
-        self.session = requests.Session()
-        retry = Retry(
-            total=settings.HTTP_MAX_RETRIES,
-            read=settings.HTTP_MAX_RETRIES,
-            connect=settings.HTTP_MAX_RETRIES,
-            backoff_factor=settings.HTTP_BACKOFF_SEC,
-            status_forcelist=(429, 502, 503, 504),
-            allowed_methods=frozenset(["POST"])
-        )
-        adapter = HTTPAdapter(max_retries=retry)
-        self.session.mount("https://", adapter)
-        self.session.mount("http://", adapter)
-
+        # 进程级共享 Session（带重试与连接池，见 utils/http.py）
+        self.session = session or shared_session()
 
     def transcribe(self, audio_np: np.ndarray, sample_rate: int, audio_url: Optional[str] = None) -> ASRResult:
         """
         优先 URL 上送（与官方契约对齐）；无URL时走 base64 内联兜底。
         返回：ASRResult(text, confidence=0.0, meta含duration_ms和upload_mode)
         """
+        req = self._build_request(audio_np, sample_rate, audio_url)
+        if isinstance(req, ASRResult):
+            return req
+        return _asr_flight.do(req["cache_key"], lambda: self._post(req))
+
+    def _post(self, req: Dict[str, Any]) -> ASRResult:
+        try:
+            resp = self.session.post(self._url, headers=req["headers"], json=req["data"], timeout=settings.REQUEST_TIMEOUT)
+            resp.raise_for_status()
+            return self._handle_response(resp.json(), req)
+        except requests.exceptions.RequestException as e:
+            body = getattr(e.response,"text","") if hasattr(e,"response") else str(e)
+            
+            # 埋点测试
+            write_log(settings.LOG_PATH, {
+                "event": "asr_error",
+                "error": (getattr(e.response, "text", "") or str(e))[:300]
+            })
+            return ASRResult("（ASR请求失败）", 0.0, {"provider":"qiniu","error": body[:300]})
+        except Exception as e:
+            # 埋点测试
+            write_log(settings.LOG_PATH, {
+                "event": "asr_error",
+                "error": str(e)[:300]
+            })
+            return ASRResult("（ASR解析异常）", 0.0, {"provider":"qiniu","error": str(e)[:300]})
+
+    async def atranscribe(self, audio_np: np.ndarray, sample_rate: int, audio_url: Optional[str] = None) -> ASRResult:
+        """transcribe 的异步版本：本地处理放线程池，请求走共享 httpx.AsyncClient。"""
+        loop = asyncio.get_running_loop()
+        req = await loop.run_in_executor(None, self._build_request, audio_np, sample_rate, audio_url)
+        if isinstance(req, ASRResult):
+            return req
+        return await _asr_flight.ado(req["cache_key"], lambda: self._apost(req))
+
+    async def _apost(self, req: Dict[str, Any]) -> ASRResult:
+        import httpx
+        try:
+            resp = await shared_async_client().post(self._url, headers=req["headers"], json=req["data"])
+            resp.raise_for_status()
+            return self._handle_response(resp.json(), req)
+        except httpx.HTTPError as e:
+            body = e.response.text if isinstance(e, httpx.HTTPStatusError) else str(e)
+            write_log(settings.LOG_PATH, {"event": "asr_error", "error": body[:300]})
+            return ASRResult("（ASR请求失败）", 0.0, {"provider":"qiniu","error": body[:300]})
+        except Exception as e:
+            write_log(settings.LOG_PATH, {"event": "asr_error", "error": str(e)[:300]})
+            return ASRResult("（ASR解析异常）", 0.0, {"provider":"qiniu","error": str(e)[:300]})
+
+    def _build_request(self, audio_np: np.ndarray, sample_rate: int, audio_url: Optional[str]):
+        """本地处理 + 查缓存 + 组请求体；无需请求（未启用/无声/命中缓存）时直接返回 ASRResult。"""
         if not settings.ENABLE_ASR:
             return ASRResult("（ASR未启用）", 0.0, {"enabled": False})
 
-        # === 缓存命中（可选）===
-        cache_key = None
-        if settings.ENABLE_SPEECH_CACHE:
-            if audio_url:
-                cache_key = audio_url  # 直接用url字符串哈希更好，这里简化为原串
-            else:
-                wav_bytes = _float32_to_wav_bytes(audio_np, sample_rate)
-                cache_key = sha256_bytes(wav_bytes)
-            cached = cache_get_text(settings.CACHE_ASR_DIR, cache_key)
-            if cached is not None:
-                return ASRResult(cached, 0.0, {"provider":"qiniu","cache":"hit"})
+        # === 本地处理 + 缓存命中（与 WS 传输共用：16kHz + VAD 后的音频指纹）===
+        use_url = bool(settings.ASR_USE_URL_UPLOAD and audio_url)
+        prep_meta: Dict[str, Any] = {}
+        if use_url:
+            cache_key = sha256_text(audio_url)
+            cached = cache_get_text(settings.CACHE_ASR_DIR, cache_key) if settings.ENABLE_SPEECH_CACHE else None
+        else:
+            audio_np, prep_meta = prepare_audio(audio_np, sample_rate)
+            sample_rate = ASR_SAMPLE_RATE
+            if is_silent(prep_meta):
+                write_log(settings.LOG_PATH, {"event": "asr_vad_silent", **prep_meta})
+                return ASRResult("", 0.0, {"provider": "qiniu", **prep_meta})
+            cache_key = asr_cache_key(audio_np)
+            cached = asr_cache_get(cache_key, "http")
+        if cached is not None:
+            return ASRResult(cached, 0.0, {"provider":"qiniu","cache":"hit", **prep_meta})
 
         headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
 
         # === 请求体：URL优先 ===
-        if settings.ASR_USE_URL_UPLOAD and audio_url:
+        if use_url:
             data = {"model": settings.ASR_MODEL,
                     "audio": {"format": settings.ASR_INPUT_FORMAT, "url": audio_url}}
             upload_mode = "url"
@@ -91,44 +142,26 @@ class ASRClient:
             "event": "asr_request",
             "upload_mode": upload_mode,                      # "inline" or "url"
             "format": data["audio"].get("format"),
-            "use_url": bool(settings.ASR_USE_URL_UPLOAD and audio_url),
+            "use_url": use_url,
         })
+        return {"headers": headers, "data": data, "cache_key": cache_key,
+                "prep_meta": prep_meta, "upload_mode": upload_mode}
 
-        try:
-            resp = self.session.post(self._url, headers=headers, json=data, timeout=settings.REQUEST_TIMEOUT)
-            resp.raise_for_status()
-            js = resp.json()
-            # 按文档解析
-            data_node = js.get("data", {}) or {}
-            result = data_node.get("result", {}) or {}
-            text = result.get("text") or ""
-            duration_ms = (data_node.get("audio_info", {}) or {}).get("duration")
+    def _handle_response(self, js: Dict[str, Any], req: Dict[str, Any]) -> ASRResult:
+        # 按文档解析
+        data_node = js.get("data", {}) or {}
+        result = data_node.get("result", {}) or {}
+        text = result.get("text") or ""
+        duration_ms = (data_node.get("audio_info", {}) or {}).get("duration")
 
-            # 埋点测试
-            write_log(settings.LOG_PATH, {
-                "event": "asr_response",
-                "text_len": len(text or ""),
-                "duration_ms": duration_ms
-            })
+        # 埋点测试
+        write_log(settings.LOG_PATH, {
+            "event": "asr_response",
+            "text_len": len(text or ""),
+            "duration_ms": duration_ms
+        })
 
-            # 缓存落盘
-            if settings.ENABLE_SPEECH_CACHE and cache_key and text:
-                cache_put_text(settings.CACHE_ASR_DIR, cache_key, text)
-            return ASRResult(text=text or "（空识别结果）", confidence=0.0,
-                             meta={"provider":"qiniu","duration_ms":duration_ms,"upload_mode":upload_mode})
-        except requests.exceptions.RequestException as e:
-            body = getattr(e.response,"text","") if hasattr(e,"response") else str(e)
-            
-            # 埋点测试
-            write_log(settings.LOG_PATH, {
-                "event": "asr_error",
-                "error": (getattr(e.response, "text", "") or str(e))[:300]
-            })
-            return ASRResult("（ASR请求失败）", 0.0, {"provider":"qiniu","error": body[:300]})
-        except Exception as e:
-            # 埋点测试
-            write_log(settings.LOG_PATH, {
-                "event": "asr_error",
-                "error": str(e)[:300]
-            })
-            return ASRResult("（ASR解析异常）", 0.0, {"provider":"qiniu","error": str(e)[:300]})
+        # 缓存落盘
+        asr_cache_put(req["cache_key"], text, {})
+        return ASRResult(text=text or "（空识别结果）", confidence=0.0,
+                         meta={"provider":"qiniu","duration_ms":duration_ms,"upload_mode":req["upload_mode"], **req["prep_meta"]})
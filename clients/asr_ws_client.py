@@ -1,6 +1,7 @@
 # clients/asr_ws_client.py
 from __future__ import annotations
 import asyncio, gzip, json, time
+from collections import deque
 from dataclasses import dataclass
 from typing import Optional, Dict, Any, Tuple, List
 
@@ -9,7 +10,15 @@ import websockets
 from websockets.client import connect as ws_connect  # 显式用 client.connect
 
 from config import settings
+from utils.aio import get_loop, run_sync, run_async
+from utils.audio import Resampler, Endpointer
 from utils.logging import write_log
+from utils.singleflight import SingleFlight
+from clients.asr_cache import (to_mono, prepare_audio, is_silent,
+                               asr_cache_key, asr_cache_get, asr_cache_put)
+
+# 同一段录音的并发识别只占用一条 WS 会话，键与 ASR 结果缓存一致
+_asr_flight = SingleFlight("asr_ws")
 
 # 与 HTTP 版一致的返回结构
 @dataclass
@@ -139,62 +148,414 @@ def _float32_to_pcm16(audio: np.ndarray) -> bytes:
     pcm16 = (a * 32767.0).astype(np.int16)
     return pcm16.tobytes()
 
-class ASRWsClient:
+class _WsPool:
     """
-    WebSocket 版 ASR 客户端：
-      - 不需要 URL
-      - 发送：配置包(JSON+gzip) + 音频分片(PCM16+gzip)
-      - 接收：解析返回帧，取 result.text
+    预连接池（只在后台 loop 上使用）：
+      - 七牛 ASR 协议一条连接只承载一次识别（finish 后服务端关闭），
+        因此池里放的是“已完成 TLS/WS 握手、尚未发配置帧”的热连接；
+      - acquire：取出一条健康连接（未超龄 + ping 通过），同时后台补齐；池空则现连；
+      - release：用完即关；
+      - keeper：定期轮换超龄连接，保证空闲一段时间后取到的仍是热连接。
     """
-    def __init__(self, ws_url: Optional[str] = None, api_key: Optional[str] = None):
-        self.ws_url = ws_url or settings.ASR_WS_URL
-        self.api_key = api_key or getattr(settings, "API_KEY", None)
+    def __init__(self, url: str, api_key: Optional[str], size: int, max_idle_s: float, ping_timeout: float):
+        self.url = url
+        self.api_key = api_key
+        self.size = max(0, int(size))
+        self.max_idle_s = max_idle_s
+        self.ping_timeout = ping_timeout
+        self._idle: deque = deque()     # [(ws, t_open)]
+        self._filling = 0
+        self._keeper: Optional[asyncio.Task] = None
+
+    async def _open(self):
+        # 注意：extra_headers 用“列表[(k,v)]”形式
+        headers_list = [("Authorization", f"Bearer {self.api_key}")]
+        return await ws_connect(self.url,
+                                extra_headers=headers_list,
+                                max_size=100_000_000,
+                                open_timeout=10,
+                                ping_interval=None)
+
+    async def _healthy(self, ws, t_open: float) -> bool:
+        if ws.closed or time.time() - t_open > self.max_idle_s:
+            return False
+        try:
+            pong = await ws.ping()
+            await asyncio.wait_for(pong, timeout=self.ping_timeout)
+            return True
+        except Exception:
+            return False
 
-    async def _run(self, audio_np: np.ndarray, sample_rate: int,
-                   seg_ms: int = 300, enable_punc: bool = True) -> Tuple[str, Dict[str, Any]]:
-        
-        # —— 确保单声道 float32 —— 
-        if audio_np.ndim > 1:
-            if audio_np.shape[1] > 1:
-                audio_np = audio_np.mean(axis=1)
-        # —— 强制重采样到 16kHz —— 
-        def _resample_to_16k(x: np.ndarray, sr: int) -> tuple[np.ndarray, int]:
-            target = 16000
-            if sr == target:
-                return x.astype(np.float32), sr
-            # 线性插值重采样（避免额外依赖）
-            import numpy as np
-            t_old = np.linspace(0, 1, num=len(x), endpoint=False)
-            t_new = np.linspace(0, 1, num=int(len(x) * (target / sr)), endpoint=False)
-            y = np.interp(t_new, t_old, x).astype(np.float32)
-            return y, target
-        
-        audio_np, sample_rate = _resample_to_16k(audio_np.astype(np.float32), int(sample_rate))
-        
-        
-        # 1) 组装配置帧
-        seq = 1
+    @staticmethod
+    async def _close_quietly(ws) -> None:
+        try:
+            await ws.close()
+        except Exception:
+            pass
+
+    async def acquire(self) -> Tuple[Any, bool]:
+        """返回 (ws, warm)；warm=True 表示来自池中的热连接。"""
+        self._ensure_keeper()
+        while self._idle:
+            ws, t_open = self._idle.popleft()
+            if await self._healthy(ws, t_open):
+                self._refill()
+                return ws, True
+            await self._close_quietly(ws)
+        self._refill()
+        return await self._open(), False
+
+    async def release(self, ws) -> None:
+        await self._close_quietly(ws)
+
+    def _refill(self) -> None:
+        need = self.size - len(self._idle) - self._filling
+        for _ in range(max(0, need)):
+            self._filling += 1
+            asyncio.get_running_loop().create_task(self._fill_one())
+
+    async def _fill_one(self) -> None:
+        try:
+            ws = await self._open()
+            self._idle.append((ws, time.time()))
+        except Exception as e:
+            write_log(settings.LOG_PATH, {"event": "asr_ws_pool_error", "error": str(e)[:300]})
+        finally:
+            self._filling -= 1
+
+    def _ensure_keeper(self) -> None:
+        if self.size and (self._keeper is None or self._keeper.done()):
+            self._keeper = asyncio.get_running_loop().create_task(self._keep())
+
+    async def _keep(self) -> None:
+        interval = max(1.0, self.max_idle_s / 2)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.time()
+            fresh = deque()
+            while self._idle:
+                ws, t_open = self._idle.popleft()
+                # 提前半个周期轮换，避免取用时恰好超龄
+                if ws.closed or now - t_open > self.max_idle_s - interval:
+                    await self._close_quietly(ws)
+                else:
+                    fresh.append((ws, t_open))
+            self._idle.extend(fresh)
+            self._refill()
+
+    async def warmup(self) -> int:
+        self._ensure_keeper()
+        self._refill()
+        return self.size
+
+
+# (url, api_key) -> _WsPool；只在后台 loop 线程里读写
+_POOLS: Dict[Tuple[str, Optional[str]], _WsPool] = {}
+
+def _get_pool(url: str, api_key: Optional[str]) -> _WsPool:
+    key = (url, api_key)
+    pool = _POOLS.get(key)
+    if pool is None:
+        pool = _WsPool(url, api_key,
+                       size=getattr(settings, "ASR_WS_POOL_SIZE", 0),
+                       max_idle_s=getattr(settings, "ASR_WS_POOL_MAX_IDLE_S", 20),
+                       ping_timeout=getattr(settings, "ASR_WS_PING_TIMEOUT", 2.0))
+        _POOLS[key] = pool
+    return pool
+
+def _payload_text(parsed: Dict[str, Any]) -> str:
+    msg = parsed.get("payload_msg")
+    if isinstance(msg, dict):
+        # 常见：{"result":{"text":"..."}}
+        return (msg.get("result") or {}).get("text", "") or ""
+    if isinstance(msg, str):
+        return msg
+    return ""
+
+
+class _AsrSession:
+    """
+    一次识别会话（全双工）：
+      - start：发配置帧并等 ACK，随后启动 reader 协程在后台持续收增量结果；
+      - send_audio：writer 侧只管发送音频帧，不再每片等待 recv；
+      - finish：发结束帧，等待末包（is_last_package）或空闲超时；
+        空闲截断随已收到的增量自适应：还没有任何识别文本时不按空闲截断（只受总时长上限约束），
+        否则取 max(ASR_WS_FINAL_IDLE_S, 2 × 平均帧间隔)，服务端出结果慢时不会在末包之前放弃。
+    """
+    def __init__(self, ws, sample_rate: int, enable_punc: bool = True):
+        self.ws = ws
+        self.sample_rate = int(sample_rate)
+        self.enable_punc = enable_punc
+        self.seq = 1
+        self.text = ""
+        self.n_partial = 0
+        self.got_last = False
+        self.error: Optional[str] = None   # reader 异常（协议/解析错误等）
+        self._n_rx = 0
+        self._first_rx = 0.0
+        self._last_rx = time.time()
+        self._done = asyncio.Event()
+        self._reader: Optional[asyncio.Task] = None
+
+    def _frame(self, message_type: int, payload: bytes, serial_method: int, compression_type: int) -> bytearray:
+        frame = bytearray(_gen_header(
+            message_type=message_type,
+            message_type_specific_flags=POS_SEQUENCE,    # 携带序列号
+            serial_method=serial_method,
+            compression_type=compression_type
+        ))
+        frame.extend(_before_payload_with_seq(self.seq))
+        frame.extend((len(payload)).to_bytes(4, "big"))
+        frame.extend(payload)
+        return frame
+
+    async def start(self) -> bool:
         req = {
             "user": {"uid": "voicery-ws"},
             "audio": {
-                "format": "pcm",        # 发送原始pcm16（gzip压缩）
-                "sample_rate": int(sample_rate),
+                "format": "pcm",        # 发送原始pcm16
+                "sample_rate": self.sample_rate,
                 "bits": 16,
                 "channel": 1,
                 "codec": "raw"
             },
             "request": {
                 "model_name": "asr",
-                "enable_punc": bool(enable_punc)
+                "enable_punc": bool(self.enable_punc)
             }
         }
         payload_bytes = gzip.compress(json.dumps(req, ensure_ascii=False).encode("utf-8"))
-        cfg_frame = bytearray(_gen_header(message_type_specific_flags=POS_SEQUENCE))
-        cfg_frame.extend(_before_payload_with_seq(seq))
-        cfg_frame.extend((len(payload_bytes)).to_bytes(4, "big"))
-        cfg_frame.extend(payload_bytes)
+        await self.ws.send(self._frame(FULL_CLIENT_REQUEST, payload_bytes, JSON_SERIALIZATION, GZIP_COMPRESSION))
+        try:
+            res = await asyncio.wait_for(self.ws.recv(), timeout=10.0)
+        except asyncio.TimeoutError:
+            write_log(settings.LOG_PATH, {"event": "asr_ws_cfg_timeout"})
+            return False
+        parsed = _parse_server_frame(res)
+        write_log(settings.LOG_PATH, {"event": "asr_ws_cfg_ack", "msg": str(parsed.get("payload_msg"))[:200]})
+        self._reader = asyncio.get_running_loop().create_task(self._read())
+        return True
+
+    async def send_audio(self, chunk: bytes) -> None:
+        self.seq += 1
+        # 音频无JSON、**不压缩**
+        await self.ws.send(self._frame(AUDIO_ONLY_REQUEST, chunk, NO_SERIALIZATION, NO_COMPRESSION))
+
+    async def _read(self) -> None:
+        try:
+            while True:
+                parsed = _parse_server_frame(await self.ws.recv())
+                self._last_rx = time.time()
+                self._n_rx += 1
+                if self._n_rx == 1:
+                    self._first_rx = self._last_rx
+                new_text = _payload_text(parsed)
+                if new_text and new_text != self.text:
+                    self.text = new_text
+                    self.n_partial += 1
+                if parsed.get("is_last_package"):
+                    self.got_last = True
+                    break
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as e:
+            # 协议/解析错误：记录并唤醒 finish()，不让 reader 悄无声息地死掉
+            self.error = str(e)[:300]
+            write_log(settings.LOG_PATH, {"event": "asr_ws_read_error", "error": self.error,
+                                          "partials": self.n_partial})
+        finally:
+            self._done.set()
+
+    def _idle_cutoff(self, base_s: float) -> Optional[float]:
+        if self.n_partial == 0:
+            return None
+        avg_gap = (self._last_rx - self._first_rx) / (self._n_rx - 1) if self._n_rx > 1 else 0.0
+        return max(base_s, 2.0 * avg_gap)
+
+    async def finish(self) -> str:
+        # —— 显式发送“结束”控制帧 ——
+        self.seq += 1
+        finish_bytes = gzip.compress(json.dumps({"request": {"finish": True}}, ensure_ascii=False).encode("utf-8"))
+        await self.ws.send(self._frame(FULL_CLIENT_REQUEST, finish_bytes, JSON_SERIALIZATION, GZIP_COMPRESSION))
+        t_fin = time.time()
+
+        # 末包到达立即返回；否则自“结束帧/最后一次收到数据”起空闲 idle_s 即结束，总时长不超过 max_s
+        base_idle_s = float(getattr(settings, "ASR_WS_FINAL_IDLE_S", 0.8))
+        deadline = t_fin + float(getattr(settings, "ASR_WS_FINAL_MAX_S", 3.0))
+        while not self._done.is_set():
+            now = time.time()
+            idle_s = self._idle_cutoff(base_idle_s)
+            wait = (deadline if idle_s is None else min(deadline, max(t_fin, self._last_rx) + idle_s)) - now
+            if wait <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._done.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+        if self._reader is not None and not self._reader.done():
+            self._reader.cancel()
+        return self.text
 
-        # 2) 切片音频（每 seg_ms 一片）
+
+class ASRStream:
+    """
+    流式识别会话（录音进行中使用；同步门面，可在 Gradio 回调线程里调用）：
+      - push：把新到的麦克风音频块重采样到 16kHz、做端点检测后推入已打开的 WebSocket；
+      - 首次检测到语音才从预连接池取连接，纯静音录音不建连；
+      - 语音后静音达到 SENTENCE_SILENCE_MS 只置 ended 提示“可以停止录音”，不关闭输入：句中停顿后继续说仍会转发；
+      - finish：结束输入并取最终结果（何时结束由停止录音决定）；
+      - 会话超过 ASR_STREAM_IDLE_S 没收到新音频（如停止录音之后才到的分片新开的会话）即自行收尾、归还连接。
+    """
+    def __init__(self, client: "ASRWsClient", seg_ms: int = 300):
+        self.client = client
+        self.seg_bytes = int(16000 * seg_ms / 1000) * 2
+        self.ended = False           # 端点已触发（说完了的提示；之后继续说会清除）
+        self._closed = False         # 输入已关闭（不再接受 push）
+        self._resampler: Optional[Resampler] = None
+        self._endpointer = Endpointer(16000,
+                                      frame_ms=settings.ASR_VAD_FRAME_MS,
+                                      thr_dbfs=settings.ASR_VAD_DBFS,
+                                      max_thr_dbfs=settings.ASR_VAD_MAX_DBFS,
+                                      margin_db=settings.ASR_VAD_MARGIN_DB,
+                                      silence_ms=settings.SENTENCE_SILENCE_MS,
+                                      preroll_ms=settings.ASR_VAD_PAD_MS)
+        self._q: asyncio.Queue = asyncio.Queue()
+        self._sess: Optional[_AsrSession] = None
+        self._fut = None
+        self._t_end: Optional[float] = None
+        self._n_in = 0
+        self._n_sent = 0
+
+    @property
+    def partial(self) -> str:
+        return self._sess.text if self._sess is not None else ""
+
+    def push(self, audio_np: np.ndarray, sample_rate: int) -> bool:
+        """推入一块音频；返回是否已检测到端点（说完了）。"""
+        if self._closed:
+            return self.ended
+        x = to_mono(audio_np)
+        if self._resampler is None:
+            self._resampler = Resampler(int(sample_rate), 16000)
+        self._n_in += x.size * 16000 // max(1, int(sample_rate))
+        self._forward(self._endpointer.feed(self._resampler.process(x)))
+        self.ended = self._endpointer.ended
+        return self.ended
+
+    def _forward(self, x16k: np.ndarray) -> None:
+        if x16k.size == 0 or (self._fut is not None and self._fut.done()):
+            return
+        loop = get_loop()
+        if self._fut is None:
+            self._fut = asyncio.run_coroutine_threadsafe(self._session(), loop)
+        self._n_sent += x16k.size
+        loop.call_soon_threadsafe(self._q.put_nowait, _float32_to_pcm16(x16k))
+
+    def _close_input(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._t_end = time.time()
+        if self._fut is not None:
+            get_loop().call_soon_threadsafe(self._q.put_nowait, None)
+
+    def finish(self, timeout: Optional[float] = None) -> ASRResult:
+        """录音结束：冲出尾部音频、关闭输入并等待最终结果。"""
+        t_stop = time.time()
+        vad = self._end_input()
+        if self._fut is None:
+            return self.client._silent_result({"vad": vad, "stream": True})
+        text, meta = self._fut.result(timeout)
+        return self._result(text, meta, vad, t_stop)
+
+    async def afinish(self) -> ASRResult:
+        """finish 的异步版本：在调用方事件循环中等待后台会话的最终结果。"""
+        t_stop = time.time()
+        vad = self._end_input()
+        if self._fut is None:
+            return self.client._silent_result({"vad": vad, "stream": True})
+        text, meta = await asyncio.wrap_future(self._fut)
+        return self._result(text, meta, vad, t_stop)
+
+    def _end_input(self) -> Dict[str, Any]:
+        if not self._closed:
+            if self._resampler is not None:
+                self._forward(self._endpointer.feed(self._resampler.flush()))
+            self._forward(self._endpointer.flush())
+            self._close_input()
+        return {"vad": "speech" if self._endpointer.started else "silent",
+                "in_ms": self._n_in // 16, "out_ms": self._n_sent // 16,
+                "trimmed_ms": (self._n_in - self._n_sent) // 16}
+
+    def _result(self, text: str, meta: Dict[str, Any], vad: Dict[str, Any], t_stop: float) -> ASRResult:
+        meta.update({"vad": vad, "stream": True, "endpoint": self.ended,
+                     "ready_after_stop_ms": int((time.time() - t_stop) * 1000)})
+        return ASRResult(text=text or "", confidence=0.0, meta=meta)
+
+    async def _session(self) -> Tuple[str, Dict[str, Any]]:
+        pool = _get_pool(self.client.ws_url, self.client.api_key)
+        t0 = time.time()
+        try:
+            ws, warm = await pool.acquire()
+            try:
+                sess = _AsrSession(ws, 16000)
+                if not await sess.start():
+                    return "（ASR初始化超时）", {"transport": "ws", "stage": "cfg_timeout"}
+                self._sess = sess
+                idle_s = float(getattr(settings, "ASR_STREAM_IDLE_S", 10.0))
+                while True:
+                    try:
+                        pcm = await asyncio.wait_for(self._q.get(), timeout=idle_s)
+                    except asyncio.TimeoutError:
+                        # 没人再推音频也没人 finish（孤儿会话）：关闭输入，收尾并归还连接
+                        self._closed = True
+                        write_log(settings.LOG_PATH, {"event": "asr_ws_stream_idle", "idle_s": idle_s})
+                        break
+                    if pcm is None:
+                        break
+                    for i in range(0, len(pcm), self.seg_bytes):
+                        await sess.send_audio(pcm[i:i + self.seg_bytes])
+                t_fin = time.time()
+                text = await sess.finish()
+                ms = int((time.time() - t0) * 1000)
+                write_log(settings.LOG_PATH, {"event": "asr_ws_stream_done", "ms": ms, "len": len(text),
+                                              "final_wait_ms": int((time.time() - t_fin) * 1000),
+                                              "partials": sess.n_partial, "last_pkg": sess.got_last,
+                                              "read_error": sess.error, "endpoint": self.ended})
+                return text, {"transport": "ws", "ms": ms, "warm": warm, "last_pkg": sess.got_last}
+            finally:
+                await pool.release(ws)
+        except Exception as e:
+            write_log(settings.LOG_PATH, {"event": "asr_ws_error", "error": str(e)[:300]})
+            return "（ASR请求失败）", {"transport": "ws", "error": str(e)[:300]}
+
+
+class ASRWsClient:
+    """
+    WebSocket 版 ASR 客户端：
+      - 不需要 URL
+      - 发送：配置包(JSON+gzip) + 音频分片(PCM16+gzip)
+      - 接收：解析返回帧，取 result.text
+      - 连接：复用进程级后台 loop 与预连接池；transcribe 为同步门面，atranscribe 为异步门面
+    """
+    def __init__(self, ws_url: Optional[str] = None, api_key: Optional[str] = None):
+        self.ws_url = ws_url or settings.ASR_WS_URL
+        self.api_key = api_key or getattr(settings, "API_KEY", None)
+
+    def _lookup(self, audio_np: np.ndarray, sample_rate: int) -> Tuple[np.ndarray, Dict[str, Any], Optional[str], Optional[str]]:
+        """本地处理 + 查缓存（同步，在调用方线程/执行器中跑）：返回 (audio16k, prep_meta, cache_key, cached_text)。"""
+        audio16k, prep_meta = prepare_audio(audio_np, sample_rate)
+        if is_silent(prep_meta):
+            return audio16k, prep_meta, None, None
+        key = asr_cache_key(audio16k)
+        return audio16k, prep_meta, key, asr_cache_get(key, "ws")
+
+    async def _run(self, audio_np: np.ndarray, sample_rate: int, prep_meta: Dict[str, Any] | None = None,
+                   seg_ms: int = 300, enable_punc: bool = True) -> Tuple[str, Dict[str, Any]]:
+        """audio_np 须已是 16kHz 单声道 float32（见 prepare_audio）。"""
+        prep_meta = prep_meta or {}
+
+        # 1) 切片音频（每 seg_ms 一片）
         pcm = _float32_to_pcm16(audio_np)
         bytes_per_sample = 2
         frames_per_seg = int(sample_rate * seg_ms / 1000)
@@ -203,114 +564,86 @@ class ASRWsClient:
 
         write_log(settings.LOG_PATH, {"event": "asr_ws_open", "url": self.ws_url, "segs": len(segments)})
 
-        # 3) 连接（注意：extra_headers 用“列表[(k,v)]”形式）
-        headers_list = [("Authorization", f"Bearer {self.api_key}")]
+        # 2) 连接：从预连接池取热连接（池空则现连）
         t0 = time.time()
         try:
-            async with ws_connect(self.ws_url,
-                                  extra_headers=headers_list,
-                                  max_size=100_000_000,
-                                  open_timeout=10,
-                                  ping_interval=None) as ws:
-
-                # 3.1) 发配置帧
-                await ws.send(cfg_frame)
-                try:
-                    res = await asyncio.wait_for(ws.recv(), timeout=10.0)
-                    parsed = _parse_server_frame(res)
-                    write_log(settings.LOG_PATH, {"event": "asr_ws_cfg_ack",
-                                                  "msg": str(parsed.get("payload_msg"))[:200]})
-                except asyncio.TimeoutError:
-                    write_log(settings.LOG_PATH, {"event": "asr_ws_cfg_timeout"})
+            ws, warm = await _get_pool(self.ws_url, self.api_key).acquire()
+            write_log(settings.LOG_PATH, {"event": "asr_ws_conn", "warm": warm, "ms": int((time.time() - t0) * 1000)})
+            try:
+                sess = _AsrSession(ws, sample_rate, enable_punc=enable_punc)
+                if not await sess.start():
                     return "（ASR初始化超时）", {"transport": "ws", "stage": "cfg_timeout"}
 
-                # 3.2) 循环发送音频分片；间歇读取增量
-                text_accum = ""
+                # 3) 全双工：writer 按线速（或 ASR_WS_SEND_PACE 倍实时）发送，reader 已在后台收增量
+                pace = float(getattr(settings, "ASR_WS_SEND_PACE", 0.0) or 0.0)
                 for chunk in segments:
-                    seq += 1
-                    audio_frame = bytearray(_gen_header(
-                        message_type=AUDIO_ONLY_REQUEST,
-                        message_type_specific_flags=POS_SEQUENCE,
-                        serial_method=NO_SERIALIZATION,      # 音频无JSON
-                        compression_type=NO_COMPRESSION      # **不压缩**
-                    ))
-                    audio_frame.extend(_before_payload_with_seq(seq))
-                    audio_frame.extend((len(chunk)).to_bytes(4, "big"))
-                    audio_frame.extend(chunk)
-                    await ws.send(audio_frame)
-
-
-                    # 可选：尝试读取一帧增量（不强制每片都等）
-                    try:
-                        res = await asyncio.wait_for(ws.recv(), timeout=0.5)
-                        parsed = _parse_server_frame(res)
-                        msg = parsed.get("payload_msg")
-                        new_text = ""
-                        if isinstance(msg, dict):
-                            # 常见：{"result":{"text":"..."}}
-                            new_text = (msg.get("result") or {}).get("text", "") or new_text
-                        elif isinstance(msg, str):
-                            new_text = msg
-                        if new_text and new_text != text_accum:
-                            text_accum = new_text
-                            write_log(settings.LOG_PATH, {"event": "asr_ws_partial", "len": len(text_accum)})
-                    except asyncio.TimeoutError:
-                        pass
-
-
-                # —— 显式发送“结束”控制帧 —— 
-                seq += 1
-                finish_req = {"request": {"finish": True}}
-                finish_bytes = gzip.compress(json.dumps(finish_req, ensure_ascii=False).encode("utf-8"))
-                finish_frame = bytearray(_gen_header(
-                    message_type=FULL_CLIENT_REQUEST,
-                    message_type_specific_flags=POS_SEQUENCE,    # 携带序列号
-                    serial_method=JSON_SERIALIZATION,
-                    compression_type=GZIP_COMPRESSION
-                ))
-                finish_frame.extend(_before_payload_with_seq(seq))
-                finish_frame.extend((len(finish_bytes)).to_bytes(4, "big"))
-                finish_frame.extend(finish_bytes)
-                await ws.send(finish_frame)
-                
-                
-                # 3.3) 所有分片发完后，再等最多3秒拿最终结果
-                deadline = time.time() + 3.0
-                while time.time() < deadline:
-                    try:
-                        res = await asyncio.wait_for(ws.recv(), timeout=1.0)
-                        parsed = _parse_server_frame(res)
-                        msg = parsed.get("payload_msg")
-                        new_text = ""
-                        if isinstance(msg, dict):
-                            new_text = (msg.get("result") or {}).get("text", "") or new_text
-                        elif isinstance(msg, str):
-                            new_text = msg
-                        if new_text and new_text != text_accum:
-                            text_accum = new_text
-                            write_log(settings.LOG_PATH, {"event": "asr_ws_final_partial", "len": len(text_accum)})
-                        if parsed.get("is_last_package"):
-                            break
-                    except asyncio.TimeoutError:
-                        break
+                    await sess.send_audio(chunk)
+                    if pace > 0:
+                        await asyncio.sleep(seg_ms / 1000.0 * pace)
+                t_sent = time.time()
+
+                # 4) 结束帧 + 等最终结果（收到末包立即返回；否则按空闲超时提前结束）
+                text_accum = await sess.finish()
 
                 ms = int((time.time() - t0) * 1000)
-                write_log(settings.LOG_PATH, {"event": "asr_ws_done", "ms": ms, "len": len(text_accum)})
-                return text_accum or "", {"transport": "ws", "ms": ms}
+                write_log(settings.LOG_PATH, {"event": "asr_ws_done", "ms": ms, "len": len(text_accum),
+                                              "send_ms": int((t_sent - t0) * 1000),
+                                              "final_wait_ms": int((time.time() - t_sent) * 1000),
+                                              "partials": sess.n_partial, "last_pkg": sess.got_last,
+                                              "read_error": sess.error})
+                return text_accum or "", {"transport": "ws", "ms": ms, "warm": warm,
+                                          "last_pkg": sess.got_last, **prep_meta}
+            finally:
+                await _get_pool(self.ws_url, self.api_key).release(ws)
 
         except Exception as e:
             write_log(settings.LOG_PATH, {"event": "asr_ws_error", "error": str(e)[:300]})
             return "（ASR请求失败）", {"transport": "ws", "error": str(e)[:300]}
 
+    def warmup(self) -> None:
+        """提前建立预连接（非阻塞）：应用启动时调用，首个语音轮次即可拿到热连接。"""
+        async def _warm():
+            return await _get_pool(self.ws_url, self.api_key).warmup()
+        asyncio.run_coroutine_threadsafe(_warm(), get_loop())
+
+    def open_stream(self) -> ASRStream:
+        """开启流式识别会话（麦克风边录边推）。"""
+        return ASRStream(self)
+
+    def _silent_result(self, prep_meta: Dict[str, Any]) -> ASRResult:
+        # VAD 判定整段无声：不建连、不上传，直接返回空文本（上层按“未识别到有效语音”处理）
+        write_log(settings.LOG_PATH, {"event": "asr_vad_silent", **prep_meta})
+        return ASRResult(text="", confidence=0.0, meta={"transport": "ws", **prep_meta})
+
     def transcribe(self, audio_np: np.ndarray, sample_rate: int, audio_url: Optional[str] = None) -> ASRResult:
         """
-        与 HTTP 版对齐的同步接口（忽略 audio_url）。
+        与 HTTP 版对齐的同步接口（忽略 audio_url）：协程投递到后台常驻 loop 执行。
+        """
+        audio16k, prep_meta, key, cached = self._lookup(audio_np, sample_rate)
+        if is_silent(prep_meta):
+            return self._silent_result(prep_meta)
+        if cached is not None:
+            return ASRResult(text=cached, confidence=0.0, meta={"transport": "ws", "cache": "hit", **prep_meta})
+        def _call():
+            text, meta = run_sync(self._run(audio16k, 16000, prep_meta))
+            asr_cache_put(key, text, meta)
+            return text, meta
+        text, meta = _asr_flight.do(key, _call)
+        return ASRResult(text=text or "", confidence=0.0, meta=meta)
+
+    async def atranscribe(self, audio_np: np.ndarray, sample_rate: int, audio_url: Optional[str] = None) -> ASRResult:
+        """
+        异步接口：可在任意事件循环中 await；实际收发仍在后台 loop 上（共享连接池）。
         """
-        # 单声道
-        if audio_np.ndim > 1:
-            if audio_np.shape[0] < audio_np.shape[1]:
-                audio_np = audio_np.mean(axis=1)
-            else:
-                audio_np = audio_np[:, 0]
-        text, meta = asyncio.run(self._run(audio_np.astype(np.float32), int(sample_rate)))
+        loop = asyncio.get_running_loop()
+        audio16k, prep_meta, key, cached = await loop.run_in_executor(None, self._lookup, audio_np, sample_rate)
+        if is_silent(prep_meta):
+            return self._silent_result(prep_meta)
+        if cached is not None:
+            return ASRResult(text=cached, confidence=0.0, meta={"transport": "ws", "cache": "hit", **prep_meta})
+        async def _acall():
+            text, meta = await run_async(self._run(audio16k, 16000, prep_meta))
+            await loop.run_in_executor(None, asr_cache_put, key, text, meta)
+            return text, meta
+        text, meta = await _asr_flight.ado(key, _acall)
         return ASRResult(text=text or "", confidence=0.0, meta=meta)
@@ -1,16 +1,22 @@
 # clients/llm_client.py
 from __future__ import annotations
 import os, json, requests, re
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Sequence
 from core.types import Message
 from config import settings
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from utils.http import shared_session, shared_async_client
+from utils.logging import write_log
+from utils.resilience import hedged_call, ahedged_call, UpstreamHTTPError
+
+# 进程内累计：prompt token 总数与其中命中服务端前缀缓存的部分（见 LLMClient._log_usage）
+_usage_stats = {"prompt_tokens": 0, "cached_tokens": 0}
 
 
 class LLMClient:
     def __init__(self, model: str | None = None, temperature: float = None,
-                 api_key: str | None = None, base_url: str | None = None):
+                 api_key: str | None = None, base_url: str | None = None,
+                 session: requests.Session | None = None):
         self.model = model or settings.LLM_MODEL
         self.temperature = temperature if temperature is not None else settings.LLM_TEMPERATURE
         self.api_key = api_key or settings.API_KEY
@@ -19,19 +25,8 @@ class LLMClient:
             raise RuntimeError("API_KEY 未配置，请在 .env 中设置 API_KEY=")
         self._chat_url = f"{self.base_url}/chat/completions"
 
-        # 带重试的 Session（连超时/读超时/502/503/504 自动重试）
-        self.session = requests.Session()
-        retry = Retry(
-            total=settings.HTTP_MAX_RETRIES,
-            read=settings.HTTP_MAX_RETRIES,
-            connect=settings.HTTP_MAX_RETRIES,
-            backoff_factor=settings.HTTP_BACKOFF_SEC,
-            status_forcelist=(429, 502, 503, 504),
-            allowed_methods=frozenset(["POST"])
-        )
-        adapter = HTTPAdapter(max_retries=retry)
-        self.session.mount("https://", adapter)
-        self.session.mount("http://", adapter)
+        # 进程级共享 Session（带重试与连接池，见 utils/http.py）
+        self.session = session or shared_session()
 
     def _ensure_openai_messages(self, messages):
         """把 List[Message] 或 List[dict] 统一转为 [{'role':'user','content':'...'}]"""
@@ -69,28 +64,15 @@ class LLMClient:
         payload = {
             "model": self.model,
             "messages": messages,
-            "temperature": getattr(settings, "LLM_TEMPERATURE", 0.7),
+            "temperature": self.temperature,
             "max_tokens": max_tokens,
             "stream": bool(stream),
         }
         timeout = getattr(settings, "REQUEST_TIMEOUT", 30)
 
         if not stream:
-            # 非流式
-            try:
-                resp = self.session.post(url, headers=headers, json=payload, timeout=timeout)
-                resp.raise_for_status()
-                js = resp.json()
-                choice = (js.get("choices") or [{}])[0]
-                msg = choice.get("message") or {}
-                return (msg.get("content") or "").strip()
-            except requests.exceptions.RequestException as e:
-                body = getattr(e.response, "text", "") if hasattr(e, "response") else str(e)
-                raise RuntimeError(f"LLM HTTP error: {body[:500]}")
-            except ValueError:
-                # 200 但不是 JSON，说明是 SSE 被误开（或服务端异常）
-                txt = (resp.text or "").strip()
-                raise RuntimeError(f"LLM HTTP non-JSON (status={resp.status_code}): {txt[:500]}")
+            # 非流式：带熔断与对冲（见 utils/resilience.py；按模型分端点，摘要等便宜模型不影响主对话）
+            return hedged_call(f"llm_complete:{self.model}", lambda: self._complete_once(messages, max_tokens))
         else:
             # 流式（SSE）
             try:
@@ -137,60 +119,136 @@ class LLMClient:
                 body = getattr(e.response, "text", "") if hasattr(e, "response") else str(e)
                 raise RuntimeError(f"LLM HTTP error (stream): {body[:500]}")
     
+    def _complete_once(self, messages, max_tokens: int) -> str:
+        """单次非流式请求（不含对冲/熔断，可重复执行）。"""
+        payload = self._payload(messages, max_tokens, stream=False)
+        resp = None
+        try:
+            resp = self.session.post(self._chat_url, headers=self._headers(), json=payload,
+                                     timeout=getattr(settings, "REQUEST_TIMEOUT", 30))
+            resp.raise_for_status()
+            js = resp.json()
+            self._log_usage(js.get("usage"))
+            choice = (js.get("choices") or [{}])[0]
+            msg = choice.get("message") or {}
+            return (msg.get("content") or "").strip()
+        except requests.exceptions.RequestException as e:
+            body = getattr(e.response, "text", "") if hasattr(e, "response") else str(e)
+            raise RuntimeError(f"LLM HTTP error: {body[:500]}") from e
+        except ValueError:
+            # 200 但不是 JSON，说明是 SSE 被误开（或服务端异常）
+            txt = (resp.text or "").strip()
+            raise RuntimeError(f"LLM HTTP non-JSON (status={resp.status_code}): {txt[:500]}")
+
     def complete_chunks(self, messages, max_tokens=512):
         """
         逐片段产出文本（生成器）。调用方式：
         for piece in llm.complete_chunks(msgs): ...
         """
-        messages = self._ensure_openai_messages(messages)
-        url = f"{self.base_url}/chat/completions"
-        headers = {"Authorization": f"Bearer {self.api_key}", 
-                   "Content-Type": "application/json",
-                   "Accept": "text/event-stream",     # 关键：明确 SSE
-                   }
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": getattr(settings, "LLM_TEMPERATURE", 0.7),
-            "max_tokens": max_tokens,
-            "stream": True,
-        }
+        payload = self._payload(messages, max_tokens, stream=True)
+        resp = None
         try:
-            resp = self.session.post(url, headers=headers, json=payload,
+            resp = self.session.post(self._chat_url, headers=self._headers(sse=True), json=payload,
                                     timeout=getattr(settings,"REQUEST_TIMEOUT",30),
                                     stream=True)
             resp.raise_for_status()
-            def _clean(s):
-                return "".join(ch for ch in s if ch == "\n" or ch >= " ")
-            
             # 不自动解码，自己解码
             for raw in resp.iter_lines(decode_unicode=False):
-                if not raw: 
+                if not raw:
                     continue
-                try:
-                    line = raw.decode("utf-8", errors="ignore").strip()
-                except Exception:
-                    continue
-
-                if not line.startswith("data:"):
-                    continue
-                data_str = line[5:].strip()
-                if data_str == "[DONE]":
+                piece = _sse_piece(raw.decode("utf-8", errors="ignore"), self._log_usage)
+                if piece is None:
                     break
-                try:
-                    chunk = json.loads(data_str)
-                    delta = (chunk.get("choices") or [{}])[0].get("delta") or {}
-                    piece = delta.get("content") or ""
-                    if piece:
-                        yield _clean(piece)
-                except Exception:
-                    continue
+                if piece:
+                    yield piece
         except requests.exceptions.RequestException as e:
             body = getattr(e.response,"text","") if hasattr(e,"response") else str(e)
-            raise RuntimeError(f"LLM HTTP error (stream): {body[:400]}")
+            raise RuntimeError(f"LLM HTTP error (stream): {body[:400]}") from e
+        finally:
+            # 调用方提前 close() 生成器时立即断开连接，不再接收（和计费）后续 token
+            if resp is not None:
+                resp.close()
 
-    
-    def classify(self, text: str) -> Dict[str, Any]:
+    # ===== 异步版本（共享 httpx.AsyncClient，见 utils/http.py）=====
+    async def acomplete(self, messages, max_tokens: int = 512) -> str:
+        """complete(stream=False) 的异步版本：等待期间不占线程；对冲的副本请求是同一 loop 上的任务。"""
+        return await ahedged_call(f"llm_complete:{self.model}", lambda: self._acomplete_once(messages, max_tokens))
+
+    async def _acomplete_once(self, messages, max_tokens: int) -> str:
+        import httpx
+        payload = self._payload(messages, max_tokens, stream=False)
+        try:
+            resp = await shared_async_client().post(self._chat_url, headers=self._headers(), json=payload)
+            resp.raise_for_status()
+            js = resp.json()
+            self._log_usage(js.get("usage"))
+            choice = (js.get("choices") or [{}])[0]
+            return ((choice.get("message") or {}).get("content") or "").strip()
+        except httpx.HTTPStatusError as e:
+            raise RuntimeError(f"LLM HTTP error: {e.response.text[:500]}") from e
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"LLM HTTP error: {str(e)[:500]}") from e
+
+    async def acomplete_chunks(self, messages, max_tokens: int = 512):
+        """
+        complete_chunks 的异步版本（异步生成器）：
+        async for piece in llm.acomplete_chunks(msgs): ...
+        """
+        import httpx
+        payload = self._payload(messages, max_tokens, stream=True)
+        try:
+            async with shared_async_client().stream("POST", self._chat_url, headers=self._headers(sse=True),
+                                                    json=payload) as resp:
+                if resp.status_code >= 400:
+                    body = (await resp.aread()).decode("utf-8", errors="ignore")
+                    raise UpstreamHTTPError(f"LLM HTTP error (stream, status={resp.status_code}): {body[:400]}",
+                                            resp.status_code)
+                async for line in resp.aiter_lines():
+                    if not line:
+                        continue
+                    piece = _sse_piece(line, self._log_usage)
+                    if piece is None:
+                        break
+                    if piece:
+                        yield piece
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"LLM HTTP error (stream): {str(e)[:400]}") from e
+
+    def _headers(self, sse: bool = False) -> Dict[str, str]:
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        if sse:
+            headers["Accept"] = "text/event-stream"   # 关键：明确 SSE
+        return headers
+
+    def _payload(self, messages, max_tokens: int, stream: bool) -> Dict[str, Any]:
+        payload = {
+            "model": self.model,
+            "messages": self._ensure_openai_messages(messages),
+            "temperature": self.temperature,
+            "max_tokens": max_tokens,
+            "stream": stream,
+        }
+        if stream and settings.LLM_STREAM_USAGE:
+            payload["stream_options"] = {"include_usage": True}   # 最后一帧带 usage（含前缀缓存命中数）
+        return payload
+
+    def _log_usage(self, usage: Optional[Dict[str, Any]]) -> None:
+        """记录 prompt token 与服务端前缀缓存命中的 token（cached_tokens），并累计命中比例。"""
+        if not usage:
+            return
+        prompt = int(usage.get("prompt_tokens") or 0)
+        details = usage.get("prompt_tokens_details") or {}
+        cached = int(details.get("cached_tokens") or usage.get("prompt_cache_hit_tokens") or 0)
+        _usage_stats["prompt_tokens"] += prompt
+        _usage_stats["cached_tokens"] += cached
+        write_log(settings.LOG_PATH, {
+            "event": "llm_usage", "model": self.model,
+            "prompt_tokens": prompt, "cached_tokens": cached,
+            "completion_tokens": usage.get("completion_tokens"),
+            "cached_rate_total": round(_usage_stats["cached_tokens"] / max(1, _usage_stats["prompt_tokens"]), 4),
+        })
+
+    def classify(self, text: str, candidates: Sequence[str] | None = None) -> Dict[str, Any]:
         """
         让模型输出：
         {
@@ -201,36 +259,92 @@ class LLMClient:
         }
         - 不再让模型直接给 skill；由我们在代码端做 argmax 选择 skill。
         - 会返回规范化后的 best_skill 与 best_score，外加 _debug。
+        candidates 为当前角色的技能候选（见 dispatcher 的角色路由表），缺省为 SKILL_CANDIDATES。
+        CLASSIFY_MODE="compact" 时改走 classify_compact（只输出“标签 分数”，流式提前结束）。
         """
-        candidates: List[str] = settings.SKILL_CANDIDATES
-        # 将候选及其中文说明注入，帮助模型“对号入座”
-        desc = settings.SKILL_DESCRIPTIONS
-
-        sys_prompt = (
-            "你是一个严格的JSON分类器。"
-            "只输出一个JSON对象，不要任何多余文字或解释。\n\n"
-            "字段说明：\n"
-            "- intent：用4~10个中文动词短语，概括“用户到底想让你帮他做什么”，不要复述原文。\n"
-            "- confidence：一个对象，对下列候选项逐一给出置信度，所有值相加必须等于1。\n"
-            "候选项与含义如下：\n"
-        )
-        for k in candidates:
-            cn = desc.get(k, "")
-            sys_prompt += f"- {k}：{cn}\n"
-        sys_prompt += (
-            "\n注意：\n"
-            "1) 只输出JSON，不要加任何文本。\n"
-            "2) confidence 里的键必须与给定候选项完全一致（区分大小写），每个都有值。\n"
-            "3) 所有置信度是0~1之间的小数，总和=1。\n"
-        )
-
-        
+        candidates = tuple(candidates or settings.SKILL_CANDIDATES)
+        return hedged_call(f"llm_classify:{self.model}", lambda: self._classify_once(text, candidates))
+
+    def _classify_once(self, text: str, candidates: tuple) -> Dict[str, Any]:
+        if settings.CLASSIFY_MODE == "compact":
+            return self.classify_compact(text, candidates)
+        raw = self._complete_once(self._classify_messages(text, candidates), max_tokens=220)
+        return self._parse_classify(raw, candidates)
+
+    async def aclassify(self, text: str, candidates: Sequence[str] | None = None) -> Dict[str, Any]:
+        """classify 的异步版本。"""
+        candidates = tuple(candidates or settings.SKILL_CANDIDATES)
+        return await ahedged_call(f"llm_classify:{self.model}", lambda: self._aclassify_once(text, candidates))
+
+    async def _aclassify_once(self, text: str, candidates: tuple) -> Dict[str, Any]:
+        if settings.CLASSIFY_MODE == "compact":
+            return await self.aclassify_compact(text, candidates)
+        raw = await self._acomplete_once(self._classify_messages(text, candidates), max_tokens=220)
+        return self._parse_classify(raw, candidates)
+
+    def classify_compact(self, text: str, candidates: Sequence[str] | None = None) -> Dict[str, Any]:
+        """
+        紧凑分类：模型只输出一行“<skill> <分数>”，边收 SSE 边解析，
+        标签与分数一旦完整立即关闭连接；返回结构与 classify 相同。
+        """
+        candidates = tuple(candidates or settings.SKILL_CANDIDATES)
+        scan = _CompactScanner(candidates)
+        chunks = self.complete_chunks(self._compact_messages(text, candidates),
+                                      max_tokens=settings.CLASSIFY_COMPACT_MAX_TOKENS)
+        try:
+            for piece in chunks:
+                if scan.feed(piece):
+                    break
+        finally:
+            chunks.close()
+        return self._compact_result(scan, candidates)
+
+    async def aclassify_compact(self, text: str, candidates: Sequence[str] | None = None) -> Dict[str, Any]:
+        """classify_compact 的异步版本。"""
+        candidates = tuple(candidates or settings.SKILL_CANDIDATES)
+        scan = _CompactScanner(candidates)
+        chunks = self.acomplete_chunks(self._compact_messages(text, candidates),
+                                       max_tokens=settings.CLASSIFY_COMPACT_MAX_TOKENS)
+        try:
+            async for piece in chunks:
+                if scan.feed(piece):
+                    break
+        finally:
+            await chunks.aclose()
+        return self._compact_result(scan, candidates)
+
+    def _compact_messages(self, text: str, candidates: tuple) -> List[Dict[str, str]]:
+        return [{"role": "system", "content": _compact_system_prompt(candidates)},
+                {"role": "user", "content": f"输入文本：{text}"}]
+
+    def _compact_result(self, scan: "_CompactScanner", candidates: Sequence[str]) -> Dict[str, Any]:
+        label, score = scan.result()
+        fallback = label is None
+        if fallback:
+            # 解析失败：与 JSON 模式一致，none=1 兜底
+            label, score = "none", 1.0
+        # 只有胜出项的分数；其余候选平分剩余概率，保持 confidence_map 形状不变
+        rest = (1.0 - score) / max(1, len(candidates) - 1)
+        norm_map = {k: (score if k == label else rest) for k in candidates}
+        result = {
+            "intent": "",
+            "skill": label,
+            "confidence": score,
+            "confidence_map": norm_map,
+        }
+        if fallback:
+            result["fallback"] = True   # 兜底结果：只用于本次，不进分类缓存
+        if settings.DEBUG:
+            result["_debug"] = {"raw": scan.raw, "mode": "compact", "early_stop": scan.done}
+        return result
+
+    def _classify_messages(self, text: str, candidates: tuple) -> List[Dict[str, str]]:
         # 不走自定义 Message 了，彻底避免 JSON 序列化错误
-        system = {"role": "system", "content": sys_prompt}
+        system = {"role": "system", "content": _classify_system_prompt(candidates)}
         user   = {"role": "user",   "content": f"输入文本：{text}\n请仅按上述schema输出JSON。"}
+        return [system, user]
 
-        raw = self.complete([system, user], max_tokens=220, stream=False)
-
+    def _parse_classify(self, raw: str, candidates: Sequence[str]) -> Dict[str, Any]:
         # 解析：从 raw 中抽取 JSON
         parsed, candidate_json = {}, "{}"
         try:
@@ -262,7 +376,8 @@ class LLMClient:
 
         # 归一化（有时模型和为0或不等于1）
         s = sum(norm_map.values())
-        if s > 0:
+        fallback = s <= 0
+        if not fallback:
             norm_map = {k: v / s for k, v in norm_map.items()}
         else:
             # 都是0的话，让 none=1 兜底
@@ -278,6 +393,117 @@ class LLMClient:
             "confidence": best_score,      # 最高项的分数，供阈值判断
             "confidence_map": norm_map     # 完整分布（便于debug和可解释）
         }
+        if fallback:
+            result["fallback"] = True      # 兜底结果：只用于本次，不进分类缓存
         if settings.DEBUG:
             result["_debug"] = {"raw": raw, "candidate": candidate_json, "parsed": parsed}
         return result
+
+
+# 分类提示词只依赖候选集合：按角色候选（tuple）缓存，每个角色只拼一次
+@lru_cache(maxsize=32)
+def _classify_system_prompt(candidates: tuple) -> str:
+    # 将候选及其中文说明注入，帮助模型“对号入座”
+    desc = settings.ALL_SKILL_DESCRIPTIONS
+    sys_prompt = (
+        "你是一个严格的JSON分类器。"
+        "只输出一个JSON对象，不要任何多余文字或解释。\n\n"
+        "字段说明：\n"
+        "- intent：用4~10个中文动词短语，概括“用户到底想让你帮他做什么”，不要复述原文。\n"
+        "- confidence：一个对象，对下列候选项逐一给出置信度，所有值相加必须等于1。\n"
+        "候选项与含义如下：\n"
+    )
+    for k in candidates:
+        cn = desc.get(k, "")
+        sys_prompt += f"- {k}：{cn}\n"
+    sys_prompt += (
+        "\n注意：\n"
+        "1) 只输出JSON，不要加任何文本。\n"
+        "2) confidence 里的键必须与给定候选项完全一致（区分大小写），每个都有值。\n"
+        "3) 所有置信度是0~1之间的小数，总和=1。\n"
+    )
+    return sys_prompt
+
+
+@lru_cache(maxsize=32)
+def _compact_system_prompt(candidates: tuple) -> str:
+    desc = settings.ALL_SKILL_DESCRIPTIONS
+    sys_prompt = "你是一个意图分类器。从下列候选项中选出最符合用户意图的一个：\n"
+    for k in candidates:
+        sys_prompt += f"- {k}：{desc.get(k, '')}\n"
+    sys_prompt += (
+        "\n只输出一行：候选项名 + 空格 + 0~1之间的置信度（两位小数），例如：none 0.90\n"
+        "不要输出任何其他文字。"
+    )
+    return sys_prompt
+
+
+class _CompactScanner:
+    """
+    增量解析紧凑分类输出“<label> <score>”：
+    label 必须是候选项之一；分数后出现非数字字符或已有两位小数即视为完整（done）。
+    """
+    _PAT = re.compile(r"([A-Za-z_]+)\s*[:：=]?\s*([01](?:\.\d*)?)")
+
+    def __init__(self, candidates: List[str]):
+        self.candidates = set(candidates)
+        self.raw = ""
+        self.done = False
+        self._label = None
+        self._score = None
+
+    def feed(self, piece: str) -> bool:
+        self.raw += piece
+        m = self._match()
+        if m is not None:
+            num = m.group(2)
+            if m.end() < len(self.raw) or len(num.partition(".")[2]) >= 2:
+                self._label, self._score = m.group(1), float(num)
+                self.done = True
+        return self.done
+
+    def result(self):
+        """(label, score)；流已结束但未 done 时按当前缓冲兜底解析。"""
+        if not self.done:
+            m = self._match()
+            if m is not None:
+                self._label, self._score = m.group(1), float(m.group(2).rstrip(".") or 0)
+            else:
+                # 只给了标签、没给分数：视为确定
+                for tok in re.findall(r"[A-Za-z_]+", self.raw):
+                    if tok in self.candidates:
+                        self._label, self._score = tok, 1.0
+                        break
+        if self._label is None:
+            return None, 0.0
+        return self._label, min(1.0, max(0.0, self._score))
+
+    def _match(self):
+        for m in self._PAT.finditer(self.raw):
+            if m.group(1) in self.candidates:
+                return m
+        return None
+
+
+def _clean_piece(s: str) -> str:
+    # 只保留可打印字符与换行，防止乱码（包含中英文）
+    return "".join(ch for ch in s if ch == "\n" or ch >= " ")
+
+
+def _sse_piece(line: str, on_usage=None):
+    """解析一行 SSE：返回文本片段；非数据行/无内容返回 ""；[DONE] 返回 None。带 usage 的帧交给 on_usage。"""
+    line = line.strip()
+    if not line.startswith("data:"):
+        return ""
+    data_str = line[5:].strip()
+    if data_str == "[DONE]":
+        return None
+    try:
+        chunk = json.loads(data_str)
+        if on_usage is not None and chunk.get("usage"):
+            on_usage(chunk["usage"])
+        delta = (chunk.get("choices") or [{}])[0].get("delta") or {}
+        return _clean_piece(delta.get("content") or "")
+    except Exception:
+        # 跳过非 JSON 或包含推理字段的片段
+        return ""
@@ -0,0 +1,46 @@
+# clients/registry.py
+from __future__ import annotations
+import threading
+from typing import Any, Callable, Dict
+
+from config import settings
+
+# 进程级客户端注册表：各会话、各线程共享同一组客户端实例（底层共享连接池的 Session / WS 预连接池），
+# 回调里不再每次 new 客户端。客户端本身无会话状态，可安全并发使用。
+_instances: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def _get(name: str, factory: Callable[[], Any]) -> Any:
+    inst = _instances.get(name)
+    if inst is None:
+        with _lock:
+            inst = _instances.get(name)
+            if inst is None:
+                inst = _instances[name] = factory()
+    return inst
+
+
+def get_llm_client():
+    from clients.llm_client import LLMClient
+    return _get("llm", LLMClient)
+
+
+def get_summary_llm_client():
+    """滚动摘要用的 LLM 客户端（SUMMARY_MODEL 为空时与对话同模型）。"""
+    from clients.llm_client import LLMClient
+    return _get("llm_summary", lambda: LLMClient(model=settings.SUMMARY_MODEL or None))
+
+
+def get_tts_client():
+    from clients.tts_client import TTSClient
+    return _get("tts", TTSClient)
+
+
+def get_asr_client():
+    """按 ASR_TRANSPORT 返回 WS 或 HTTP 版 ASR 客户端。"""
+    if settings.ASR_TRANSPORT == "ws":
+        from clients.asr_ws_client import ASRWsClient
+        return _get("asr_ws", ASRWsClient)
+    from clients.asr_client import ASRClient
+    return _get("asr_http", ASRClient)
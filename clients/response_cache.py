@@ -0,0 +1,236 @@
+# clients/response_cache.py
+from __future__ import annotations
+import asyncio, json, os, sqlite3, threading, time
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from utils.cache import TTLCache, sha256_text
+from utils.logging import write_log
+from utils.singleflight import SingleFlight
+
+# LLM 回复精确缓存：键 = 完整 messages + 模型 + 温度 + max_tokens。
+# 两级：进程内 LRU（TTLCache）+ SQLite（跨进程/重启复用，按最近使用时间淘汰）。
+# 只对开启缓存的技能生效（RESPONSE_CACHE_SCOPES），由 pipeline 用 CachedLLM 包一层 llm_client。
+
+
+def response_cache_key(messages: List[Any], model: str, temperature: float, max_tokens: int) -> str:
+    msgs = [{"role": m["role"], "content": m["content"]} if isinstance(m, dict)
+            else {"role": m.role, "content": m.content} for m in messages]
+    blob = json.dumps({"model": model, "temperature": temperature, "max_tokens": max_tokens, "messages": msgs},
+                      ensure_ascii=False, sort_keys=True)
+    return sha256_text(blob)
+
+
+class _SqliteTier:
+    def __init__(self, path: str, max_rows: int, ttl: float):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.max_rows, self.ttl = max_rows, ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses ("
+                         "key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses(used)")
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT text, created FROM responses WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key=?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE responses SET used=? WHERE key=?", (now, key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, key: str, text: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses(key, text, created, used) VALUES (?,?,?,?)",
+                             (key, text, now, now))
+            # 超出行数上限：删掉最久未用的
+            self._db.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used DESC "
+                             "LIMIT -1 OFFSET ?)", (self.max_rows,))
+            self._db.commit()
+
+
+class ResponseCache:
+    def __init__(self):
+        self._mem = TTLCache(settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL_S)
+        self._db: Optional[_SqliteTier] = None
+        if settings.RESPONSE_CACHE_DB:
+            self._db = _SqliteTier(settings.RESPONSE_CACHE_DB, settings.RESPONSE_CACHE_DB_MAX_ROWS,
+                                   settings.RESPONSE_CACHE_TTL_S)
+
+    def get(self, key: str, scope: str) -> Optional[str]:
+        text, layer = self._mem.get(key), "memory"
+        if text is None and self._db is not None:
+            text, layer = self._db.get(key), "sqlite"
+            if text is not None:
+                self._mem.put(key, text)
+        self._log(key, scope, text is not None, layer)
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        if not text:
+            return
+        self._mem.put(key, text)
+        if self._db is not None:
+            self._db.put(key, text)
+
+    async def aget(self, key: str, scope: str) -> Optional[str]:
+        text = self._mem.get(key)
+        if text is not None or self._db is None:
+            self._log(key, scope, text is not None, "memory")
+            return text
+        # SQLite 读写放到线程池，避免阻塞事件循环
+        text = await asyncio.get_running_loop().run_in_executor(None, self._db.get, key)
+        if text is not None:
+            self._mem.put(key, text)
+        self._log(key, scope, text is not None, "sqlite")
+        return text
+
+    async def aput(self, key: str, text: str) -> None:
+        if not text:
+            return
+        self._mem.put(key, text)
+        if self._db is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._db.put, key, text)
+
+    @staticmethod
+    def _log(key: str, scope: str, hit: bool, layer: str) -> None:
+        write_log(settings.LOG_PATH, {"event": "response_cache", "scope": scope, "hit": hit,
+                                      "layer": layer if hit else None, "key": key[:12]})
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+
+# 同一缓存键的并发生成只请求一次上游；流式的等待方在发起方生成完后拿到整段文本
+_llm_flight = SingleFlight("llm")
+
+
+class CachedLLM:
+    """
+    llm_client 的缓存代理：complete / complete_chunks / acomplete / acomplete_chunks 先查缓存，
+    未命中才转发给原 client，完整生成后写回；流式被提前关闭（未生成完）的不写入。其余属性透传。
+    缓存未命中但同键请求已在途时，不再重复请求，等待并共享其结果（发起方中途放弃则自己生成）。
+    """
+
+    def __init__(self, llm_client, scope: str):
+        self._llm = llm_client
+        self.scope = scope
+
+    def __getattr__(self, name):
+        return getattr(self._llm, name)
+
+    def _key(self, messages, max_tokens: int) -> str:
+        return response_cache_key(messages, getattr(self._llm, "model", ""),
+                                  getattr(self._llm, "temperature", settings.LLM_TEMPERATURE), max_tokens)
+
+    def complete(self, messages, max_tokens: int = 512, stream: bool = False) -> str:
+        cache, key = get_response_cache(), self._key(messages, max_tokens)
+        text = cache.get(key, self.scope)
+        if text is None:
+            def _call():
+                out = self._llm.complete(messages, max_tokens=max_tokens, stream=stream)
+                cache.put(key, out)
+                return out
+            text = _llm_flight.do(key, _call)
+        return text
+
+    def complete_chunks(self, messages, max_tokens: int = 512):
+        cache, key = get_response_cache(), self._key(messages, max_tokens)
+        text = cache.get(key, self.scope)
+        fut, leader = None, False
+        if text is None:
+            fut, leader = _llm_flight.join(key)
+            if not leader:
+                # 同键生成在途：等它完成后整段返回（与缓存命中一致）；超时则自己生成
+                text = _llm_flight.wait(fut, _follow_timeout())
+        if text is not None:
+            yield text
+            return
+        buf: List[str] = []
+        done = False
+        pieces = self._llm.complete_chunks(messages, max_tokens=max_tokens)
+        try:
+            for piece in pieces:
+                buf.append(piece)
+                yield piece
+            done = True
+        finally:
+            pieces.close()
+            if leader and not done:
+                _llm_flight.abandon(key, fut)
+        text = "".join(buf).strip()
+        if leader:
+            _llm_flight.finish(key, fut, text)
+        cache.put(key, text)
+
+    async def acomplete(self, messages, max_tokens: int = 512) -> str:
+        cache, key = get_response_cache(), self._key(messages, max_tokens)
+        text = await cache.aget(key, self.scope)
+        if text is None:
+            async def _acall():
+                out = await self._llm.acomplete(messages, max_tokens=max_tokens)
+                await cache.aput(key, out)
+                return out
+            text = await _llm_flight.ado(key, _acall)
+        return text
+
+    async def acomplete_chunks(self, messages, max_tokens: int = 512):
+        cache, key = get_response_cache(), self._key(messages, max_tokens)
+        text = await cache.aget(key, self.scope)
+        fut, leader = None, False
+        if text is None:
+            fut, leader = _llm_flight.join(key)
+            if not leader:
+                text = await _llm_flight.await_(fut, _follow_timeout())
+        if text is not None:
+            yield text
+            return
+        buf: List[str] = []
+        done = False
+        pieces = self._llm.acomplete_chunks(messages, max_tokens=max_tokens)
+        try:
+            async for piece in pieces:
+                buf.append(piece)
+                yield piece
+            done = True
+        finally:
+            await pieces.aclose()
+            if leader and not done:
+                _llm_flight.abandon(key, fut)
+        text = "".join(buf).strip()
+        if leader:
+            _llm_flight.finish(key, fut, text)
+        await cache.aput(key, text)
+
+
+def _follow_timeout() -> float:
+    """流式等待方最多等多久（REQUEST_TIMEOUT 的总和）：发起方的流若被搁置既不迭代也不关闭，等待方不至于永远挂住。"""
+    t = settings.REQUEST_TIMEOUT
+    return float(sum(t)) if isinstance(t, (tuple, list)) else float(t)
+
+
+def cached_llm(llm_client, scope: str):
+    """scope（技能名，或 "default" 表示普通对话）开启了回复缓存时返回 CachedLLM，否则原样返回。"""
+    if settings.RESPONSE_CACHE_ENABLE and scope in settings.RESPONSE_CACHE_SCOPES:
+        return CachedLLM(llm_client, scope)
+    return llm_client
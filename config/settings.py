@@ -10,6 +10,7 @@ LLM_MODEL = os.getenv("MODEL_NAME", "doubao-seed-1.6-flash")
 LLM_TEMPERATURE = 0.7
 MAX_ROUNDS = 10
 MAX_TOKENS_RESPONSE = 512
+LLM_STREAM_USAGE = True   # 流式请求带 stream_options.include_usage：最后一帧返回 usage（含 cached_tokens），写 llm_usage 日志
 
 API_KEY = os.getenv("API_KEY")
 BASE_URL = os.getenv("BASE_URL", "https://openai.qiniu.com/v1")
@@ -21,9 +22,34 @@ TTS_VOICE = "alloy"
 # 对话/记忆
 MAX_ROUNDS = 8
 MAX_TOKENS_RESPONSE = 512
+HISTORY_TOKEN_BUDGET = 1200    # 送入 prompt 的历史 token 上限（估算值，从新到旧整轮装入）；0 = 按 MAX_ROUNDS 轮数截断
+HISTORY_STORE_ROUNDS = 30      # 按预算选历史时会话最多保留的轮数（短对话可装进更多轮）
+# 滚动摘要：移出历史窗口的旧轮次由后台线程折叠进 SessionState.summary，prompt 发“摘要 + 最近窗口”
+SUMMARY_ENABLE = True
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL_NAME", "")   # 便宜的小模型；空 = 与对话同模型
+SUMMARY_BATCH_ROUNDS = 2       # 攒够这么多轮再折叠一次，减少调用
+SUMMARY_MAX_PENDING_ROUNDS = 20  # 摘要持续失败时待折叠的上限，超出丢弃最旧的
+SUMMARY_MAX_CHARS = 300
+SUMMARY_MAX_TOKENS = 400
 
 # 选择阈值（最高分需要≥该阈值才触发技能；否则走普通对话）
 INTENT_CONF_THRESHOLD = 0.6
+CLASSIFY_MODE = "compact"          # compact：只输出“标签 分数”、流式提前结束；json：完整置信度分布
+CLASSIFY_COMPACT_MAX_TOKENS = 12
+SPECULATIVE_ROUTING = True   # 规则未命中时，分类与普通对话并行启动；技能胜出再取消普通对话
+
+# 本地意图分类器（字符 n-gram + 最近质心；python -m tools.train_intent 训练）：拿不准时才调 LLM 分类
+LOCAL_INTENT_ENABLE = True
+LOCAL_INTENT_MODEL_PATH = "cache/intent_local.npz"
+LOCAL_INTENT_TEMPERATURE = 0.05   # 相似度 -> 概率的 softmax 温度
+LOCAL_INTENT_MIN_CONF = 0.8       # 本地最高概率低于此值视为“拿不准”
+LOCAL_INTENT_MIN_SIM = 0.3        # 与最近质心的余弦相似度低于此值视为“没见过”（拿不准）
+
+# 意图分类结果缓存：键 = 归一化文本（去空白/标点、全半角统一）+ 角色，命中则不再调用 LLM 分类
+CLASSIFY_CACHE_ENABLE = True
+CLASSIFY_CACHE_SIZE = 2048        # 内存 LRU 条数上限
+CLASSIFY_CACHE_TTL_S = 24 * 3600  # 过期时间（秒）
+CLASSIFY_CACHE_PERSIST = False    # True：同时写入 CACHE_CLASSIFY_DIR，重启后仍可命中
 
 # 评估/埋点
 ENABLE_LOGGING = True
@@ -58,6 +84,28 @@ SKILL_DESCRIPTIONS_Aris = {
     "aris_practice": "出一小题并给三条递进提示，等待用户作答再给详解。",
     "aris_bimap": "用数学与编程两种视角解释同一概念，互证并给示例。"}
 
+ALL_SKILL_DESCRIPTIONS = {**SKILL_DESCRIPTIONS, **SKILL_DESCRIPTIONS_Luma, **SKILL_DESCRIPTIONS_Aris}
+
+# 角色 -> 本角色可路由的技能候选：启动时据此编译每个角色的关键词规则表与分类提示词
+# config/roles 下的每个角色都应在此列出；未列出的角色按 SKILL_CANDIDATES（规则与分类候选一致）
+ROLE_SKILL_CANDIDATES = {
+    "Socratic mentor": SKILL_CANDIDATES,
+    "Know-it-all": SKILL_CANDIDATES,
+    "Luma": SKILL_CANDIDATES_Luma + ["none"],
+    "Aris": SKILL_CANDIDATES_Aris + ["none"],
+}
+
+# 对冲请求与熔断（utils/resilience.py；端点：llm_complete:<模型> / llm_classify:<模型> / tts；只有超时/连接错误/5xx/429 计失败）
+HEDGE_ENABLE = True
+HEDGE_QUANTILE = 0.95      # 主请求超过最近成功调用耗时的该分位数仍未返回，就再发一份相同请求
+HEDGE_WINDOW = 100         # 参与统计的最近成功调用数
+HEDGE_MIN_SAMPLES = 20     # 样本不足时不对冲
+HEDGE_MIN_DELAY_S = 0.3
+HEDGE_MAX_DELAY_S = 10.0
+HEDGE_MAX_WORKERS = 16     # 同步调用最多同时对冲的个数（各占主/副本两个线程）；用满时新调用在本线程直接执行、不对冲
+CIRCUIT_FAIL_THRESHOLD = 5 # 连续失败次数达到即熔断（快速失败）
+CIRCUIT_COOLDOWN_S = 30    # 熔断后多久放一个探测请求（半开）
+
 # 超时（秒）
 CONNECT_TIMEOUT = 5      # 连接建立
 READ_TIMEOUT = 90        # 响应读取（生成可能较慢，适当放宽，文本太长会导致TTS读取失败）
@@ -67,6 +115,13 @@ REQUEST_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
 HTTP_MAX_RETRIES = 0     # 读/超时的自动重试次数(暂时关掉重试)
 HTTP_BACKOFF_SEC = 0.5   # 指数退避初值
 
+# 连接池（进程级共享 Session，见 utils/http.py）
+HTTP_POOL_CONNECTIONS = 4   # 缓存的主机连接池个数（上游通常只有一个主机）
+HTTP_POOL_MAXSIZE = 16      # 单主机保留的连接数：≥ 并发会话数 × 每轮在途请求数（LLM 流 + TTS）
+HTTP_ASYNC_MAX_CONNECTIONS = 256  # 异步流水线（httpx）同时在途的最大连接数
+HTTP_ASYNC_MAX_KEEPALIVE = 64     # 异步流水线保留的空闲 keep-alive 连接数
+UI_CONCURRENCY_LIMIT = 200        # Gradio 每个事件的并发上限（回调为协程，等待 I/O 时不占线程）
+
 # === Speech configs ===
 ENABLE_ASR = True           
 ENABLE_TTS = True        
@@ -88,6 +143,28 @@ ENABLE_SPEECH_CACHE = True
 CACHE_DIR = "cache"                 # 统一缓存根目录
 CACHE_TTS_DIR = "cache/tts"         # 文本->音频缓存
 CACHE_ASR_DIR = "cache/asr"         # 音频->文本缓存
+CACHE_CLASSIFY_DIR = "cache/classify"  # 意图分类结果（CLASSIFY_CACHE_PERSIST 开启时落盘）
+
+# LLM 回复精确缓存（键 = 完整 messages + 模型 + 温度 + max_tokens）：命中则跳过整段生成
+# 只对不依赖历史、同输入同提示词的技能开启；"default" 表示普通对话（含历史，仅完全相同的上下文才会命中）
+RESPONSE_CACHE_ENABLE = True
+RESPONSE_CACHE_SCOPES = ["steelman", "luma_story", "aris_bimap"]
+RESPONSE_CACHE_SIZE = 256                     # 内存 LRU 条数上限
+RESPONSE_CACHE_TTL_S = 7 * 24 * 3600          # 过期时间（秒）
+RESPONSE_CACHE_DB = "cache/responses.sqlite3" # SQLite 二级缓存；置空则只用内存
+RESPONSE_CACHE_DB_MAX_ROWS = 5000             # SQLite 行数上限（按最近使用淘汰）
+
+# 语义回复缓存（core/semantic_cache.py）：字符 n-gram 向量 + 按“角色|技能”分区的进程内索引，
+# 与历史输入足够相似（余弦 ≥ 阈值）且否定/反义词一致时直接复用回复；"default" 为普通对话，只在无历史的首轮参与。
+# 默认不含 steelman / default：观点类输入一字之差立场就相反，字符 n-gram 分不开
+SEMANTIC_CACHE_ENABLE = True
+SEMANTIC_CACHE_SCOPES = ["luma_story", "aris_bimap"]
+SEMANTIC_CACHE_THRESHOLD = 0.9
+SEMANTIC_CACHE_DIM = 4096            # 向量维度（每条约 16KB）
+SEMANTIC_CACHE_MAX_ENTRIES = 500     # 每个分区的条数上限（满后覆盖最旧）
+SEMANTIC_CACHE_TTL_S = 24 * 3600
+SEMANTIC_CACHE_AUDIT_RATE = 0.05     # 命中后按此比例后台重新生成一次，统计误命中
+SEMANTIC_CACHE_AUDIT_MIN_SIM = 0.35  # 审计时新旧回复相似度低于此值记为误命中
 
 # === ASR 传输方式：'http' | 'ws'
 ASR_TRANSPORT = "ws"   # 先用 WebSocket；需要回到 HTTP 时改为 "http"
@@ -95,6 +172,30 @@ ASR_TRANSPORT = "ws"   # 先用 WebSocket；需要回到 HTTP 时改为 "http"
 # WebSocket ASR 入口（七牛官方）
 ASR_WS_URL = "wss://openai.qiniu.com/v1/voice/asr"  # 文档给出的 ws 地址
 
+# WebSocket 预连接池（常驻后台 loop 上；一条连接承载一次识别，用完后台补齐）
+ASR_WS_POOL_SIZE = 2          # 预先建立好的空闲连接数（0=关闭预连接）
+ASR_WS_POOL_MAX_IDLE_S = 20   # 空闲连接最长保留时间（秒），超时丢弃重连，避免被服务端静默断开
+ASR_WS_PING_TIMEOUT = 2.0     # 取用前 ping 健康检查的超时（秒）
+
+# 全双工收发：发送与接收是两个并发协程，发送端不再每片等待 recv
+ASR_WS_SEND_PACE = 0.0        # 发送节奏：0=线速；1.0=按实时速率；0.5=两倍实时
+ASR_WS_FINAL_IDLE_S = 0.8     # 发完结束帧后，若此时长（且不短于 2 倍平均帧间隔）内无新结果则提前结束；尚无识别文本时不提前结束
+ASR_WS_FINAL_MAX_S = 3.0      # 等最终结果的硬上限（秒）
+
+# —— ASR 上传前的本地 VAD（能量 + 过零率）：裁首尾静音，整段无声不建连 ——
+ASR_VAD_ENABLE = True
+ASR_VAD_FRAME_MS = 30         # 帧长（毫秒）
+ASR_VAD_DBFS = -55.0          # 语音能量阈值下限（自适应阈值=底噪+余量，夹在 [下限, 上限]）
+ASR_VAD_MAX_DBFS = -45.0      # 自适应阈值上限（防止底噪高/整段都是语音时阈值被抬高，把轻声说话判成静音）
+ASR_VAD_MARGIN_DB = 12.0      # 高出底噪多少 dB 才算语音
+ASR_VAD_PAD_MS = 200          # 裁剪后两端保留的余量（毫秒），避免切掉字头字尾
+ASR_VAD_MIN_SPEECH_MS = 120   # 语音帧总时长低于此值视为“整段无声”
+
+# —— 流式麦克风识别：录音过程中边推边识别，静音端点后自动发结束帧 ——
+ASR_STREAMING_CAPTURE = True  # True=麦克风流式推送（Gradio streaming）；False=录完整段再识别
+ASR_STREAM_EVERY_S = 0.3      # 前端推送音频块的间隔（秒）
+ASR_STREAM_IDLE_S = 10.0      # 流式识别会话多久收不到新音频就自行收尾（停止录音后迟到的分片新开的会话）
+
 # —— TTS 静音排查/裁剪阈值（可调）——
 TTS_SILENCE_DBFS = -45.0        # 低于此 dBFS 视作静音（典型 -40~-50）
 TTS_RMS_WIN_MS   = 30           # 计算 RMS 的滑窗（毫秒）
@@ -103,9 +204,11 @@ TTS_TARGET_SR    = 24000        # 期望的统一采样率（与厂商默认一
 
 
 # ===== 语音句级快速反馈（B方案）参数 =====
-SENTENCE_SILENCE_MS = 800   # 断句的静音阈值（若走在线WS增量断句时用；现在先用于日志/保留）
+SENTENCE_SILENCE_MS = 800   # 断句的静音阈值：流式麦克风识别中，语音后静音达到该时长即判定说完
 MAX_REPLY_CHARS_VOICE = 120 # 语音模式每句最长字数（1~2句）
 TTS_SEG_GAP_MS = 120        # 句与句之间的微静音（若做拼接时用；我们用逐句播就不用拼接）
+VOICE_STREAMING = True      # 语音流式：LLM边生成边断句，首句先送TTS（首音延迟≈TTFT+单句TTS）
+VOICE_STREAM_SEG_CHARS = 40 # 流式断句的目标句长（比整段切分更短，首句更快出声）
 
 # 文本模式
 TEXT_STREAMING = True       # 文本对话开启流式输出（和语音解耦，不限长）
@@ -0,0 +1,67 @@
+# core/classify_cache.py
+from __future__ import annotations
+import json, time
+from typing import Any, Dict, Optional, Sequence
+
+from config import settings
+from utils.cache import TTLCache, cache_get_text, cache_put_text, sha256_text
+from utils.logging import write_log
+from utils.singleflight import SingleFlight
+from utils.textvec import normalize_query
+
+# 意图分类结果缓存（挂在 LLM 分类前面）：内存 LRU + TTL，可选落盘。
+# 同一角色下“帮我强化一下这个观点” / “帮我强化一下这个观点！”命中同一条。
+_cache = TTLCache(settings.CLASSIFY_CACHE_SIZE, settings.CLASSIFY_CACHE_TTL_S)
+_stats = {"lookups": 0, "hits": 0}
+# 同一键的并发 LLM 分类只发一次（缓存要等第一次返回后才能命中）
+classify_flight = SingleFlight("classify")
+
+
+def classify_cache_key(text: str, role_name: Optional[str], candidates: Sequence[str]) -> Optional[str]:
+    """键 = 分类模式 + 角色 + 候选集合 + 归一化文本；候选/模式变化后旧结果自然失效。
+    缓存关闭时仍返回键（兼作在途去重键），读写由 get/put 判断开关。"""
+    norm = normalize_query(text)
+    if not norm:
+        return None
+    return sha256_text(f"{settings.CLASSIFY_MODE}|{role_name or ''}|{','.join(candidates)}|{norm}")
+
+
+def classify_cache_get(key: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not key or not settings.CLASSIFY_CACHE_ENABLE:
+        return None
+    res, layer = _cache.get(key), "memory"
+    if res is None and settings.CLASSIFY_CACHE_PERSIST:
+        res, layer = _disk_get(key), "disk"
+        if res is not None:
+            _cache.put(key, res)   # 磁盘命中回填内存
+    _stats["lookups"] += 1
+    _stats["hits"] += res is not None
+    write_log(settings.LOG_PATH, {"event": "classify_cache", "hit": res is not None,
+                                  "layer": layer if res is not None else None,
+                                  "hit_rate": round(_stats["hits"] / _stats["lookups"], 4),
+                                  "size": len(_cache)})
+    return dict(res) if res is not None else None
+
+
+def classify_cache_put(key: Optional[str], res: Dict[str, Any]) -> None:
+    # 解析失败的兜底结果（fallback）不缓存：一次乱码/截断的输出不能把这句话钉在普通对话上一整个 TTL
+    if not key or not settings.CLASSIFY_CACHE_ENABLE or res.get("fallback"):
+        return
+    res = {k: v for k, v in res.items() if k != "_debug"}   # 原始输出只用于当次调试，不缓存
+    _cache.put(key, res)
+    if settings.CLASSIFY_CACHE_PERSIST:
+        cache_put_text(settings.CACHE_CLASSIFY_DIR, key,
+                       json.dumps({"ts": time.time(), "res": res}, ensure_ascii=False))
+
+
+def _disk_get(key: str) -> Optional[Dict[str, Any]]:
+    raw = cache_get_text(settings.CACHE_CLASSIFY_DIR, key)
+    if raw is None:
+        return None
+    try:
+        item = json.loads(raw)
+    except ValueError:
+        return None
+    if time.time() - float(item.get("ts", 0)) > settings.CLASSIFY_CACHE_TTL_S:
+        return None
+    return item.get("res")
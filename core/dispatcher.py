@@ -1,8 +1,14 @@
 # core/dispatcher.py
 from __future__ import annotations
-from typing import Optional, Dict, Any
+import time
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Callable, List, Tuple
 from .types import SkillCall, RoleConfig
+from .intent_local import classify_local
+from .classify_cache import classify_cache_key, classify_cache_get, classify_cache_put, classify_flight
 from config import settings
+from utils.logging import write_log
+from utils.kwmatch import KeywordMatcher
 
 
 _RULES = [
@@ -35,31 +41,160 @@ _RULES = [
 ]
 
 
+@dataclass
+class _RouteTable:
+    """单个角色的路由表：本角色技能的关键词匹配器 + 分类候选。"""
+    matcher: KeywordMatcher
+    candidates: Tuple[str, ...]
+
+
+def _compile_table(candidates: List[str]) -> _RouteTable:
+    # 关键词规则只取候选里的技能：规则能命中的技能，分类时也一定在候选里
+    allowed = set(candidates)
+    entries = [(kw.lower(), prio, skill_name)
+               for prio, (keywords, skill_name) in enumerate(_RULES)
+               if skill_name in allowed
+               for kw in keywords]
+    return _RouteTable(KeywordMatcher(entries), tuple(candidates))
+
+
+# 启动时按角色编译一次；每轮只扫描文本一遍，开销不随角色/技能数量增长
+_TABLES: Dict[str, _RouteTable] = {name: _compile_table(list(c)) for name, c in settings.ROLE_SKILL_CANDIDATES.items()}
+_DEFAULT_TABLE = _compile_table(list(settings.SKILL_CANDIDATES))   # 未配置角色的兜底表
+
+
+def _table_for(role: Optional[RoleConfig]) -> _RouteTable:
+    return _TABLES.get(getattr(role, "name", None), _DEFAULT_TABLE)
+
+
+
+def _new_debug() -> Dict[str, Any]:
+    return {"phase": "route",
+            "rule_hit": False,
+            "rule_name": None,
+            "classify": None}
+
+
+def _match_rules(user_text: str, table: _RouteTable, debug: Dict[str, Any]) -> Optional[SkillCall]:
+    skill_name = table.matcher.search(user_text.strip().lower())
+    if skill_name is not None:
+        debug["rule_hit"] = True
+        debug["rule_name"] = skill_name
+        return SkillCall(name=skill_name, args={"debug": debug})
+    return None
+
+
+def _match_local(user_text: str, table: _RouteTable, debug: Dict[str, Any]) -> Optional[SkillCall]:
+    """本地分类器足够确定时直接给出结果；拿不准则把本地预测记入 debug，交给 LLM 分类。"""
+    res = classify_local(user_text, table.candidates)
+    if res is None:
+        return None
+    if res["sure"]:
+        return _from_classify(res, debug)
+    debug["local"] = {k: res[k] for k in ("skill", "confidence", "similarity")}
+    return None
+
+
+def _cache_key(user_text: str, role: Optional[RoleConfig], table: _RouteTable) -> Optional[str]:
+    return classify_cache_key(user_text, getattr(role, "name", None), table.candidates)
+
+
+def _match_cached(key: Optional[str], debug: Dict[str, Any]) -> Optional[SkillCall]:
+    """同一角色下归一化后相同的输入，直接复用上次的 LLM 分类结果。"""
+    res = classify_cache_get(key)
+    if res is None:
+        return None
+    debug["classify_cache"] = True
+    return _from_classify(res, debug)
+
+
+def _from_llm(res: Dict[str, Any], key: Optional[str], debug: Dict[str, Any]) -> SkillCall:
+    classify_cache_put(key, res)
+    return _from_classify(res, debug)
+
+
+def _from_classify(res: Dict[str, Any], debug: Dict[str, Any]) -> SkillCall:
+    debug["classify"] = res
+    best_skill = res.get("skill")
+    best_score = float(res.get("confidence", 0.0))
+    # 阈值判断 & 过滤 none
+    if best_skill and best_skill != "none" and best_score >= settings.INTENT_CONF_THRESHOLD:
+        return SkillCall(name=best_skill, args={"conf": best_score, "intent": res.get("intent"), "debug": debug})
+    # 未命中：带着 debug 信息返回占位
+    return SkillCall(name="__none__", args={"debug": debug})
+
 
 def route(user_text: str, role: RoleConfig, llm_client=None,
           context_hint: Dict[str, Any] | None = None) -> Optional[SkillCall]:
-    text = user_text.strip().lower()
-    debug: Dict[str, Any] = {"phase": "route", 
-                             "rule_hit": False, 
-                             "rule_name": None, 
-                             "classify": None}
-
-    # 1) 规则优先（可解释）
-    for keywords, skill_name in _RULES:
-        if any(kw in text for kw in keywords):
-            debug["rule_hit"] = True
-            debug["rule_name"] = skill_name
-            return SkillCall(name=skill_name, args={"debug": debug})
-
-    # 2) 兜底分类：拿分布，代码端 argmax
+    debug = _new_debug()
+    table = _table_for(role)
+
+    # 1) 规则优先（可解释），只匹配本角色的技能关键词
+    hit = _match_rules(user_text, table, debug)
+    if hit is not None:
+        return hit
+
+    # 2) 分类缓存 / 本地分类器（微秒级），有结论时不再调用 LLM
+    key = _cache_key(user_text, role, table)
+    hit = _match_cached(key, debug) or _match_local(user_text, table, debug)
+    if hit is not None:
+        return hit
+
+    # 3) 兜底分类：只带本角色候选，拿分布，代码端 argmax（结果写入缓存；同键并发请求共享一次调用）
     if llm_client is not None:
-        res = llm_client.classify(user_text)
-        debug["classify"] = res
-        best_skill = res.get("skill")
-        best_score = float(res.get("confidence", 0.0))
-        # 阈值判断 & 过滤 none
-        if best_skill and best_skill != "none" and best_score >= settings.INTENT_CONF_THRESHOLD:
-            return SkillCall(name=best_skill, args={"conf": best_score, "intent": res.get("intent"), "debug": debug})
-
-    # 3) 未命中：带着 debug 信息返回占位
+        res = classify_flight.do(key, lambda: llm_client.classify(user_text, table.candidates))
+        return _from_llm(res, key, debug)
+
+    # 4) 未命中：带着 debug 信息返回占位
+    return SkillCall(name="__none__", args={"debug": debug})
+
+
+async def aroute(user_text: str, role: RoleConfig, llm_client=None,
+                 context_hint: Dict[str, Any] | None = None) -> Optional[SkillCall]:
+    """route 的异步版本：规则、缓存、本地分类同上，兜底分类走 llm_client.aclassify。"""
+    debug = _new_debug()
+    table = _table_for(role)
+    hit = _match_rules(user_text, table, debug)
+    if hit is not None:
+        return hit
+    key = _cache_key(user_text, role, table)
+    hit = _match_cached(key, debug) or _match_local(user_text, table, debug)
+    if hit is not None:
+        return hit
+    if llm_client is not None:
+        res = await classify_flight.ado(key, lambda: llm_client.aclassify(user_text, table.candidates))
+        return _from_llm(res, key, debug)
     return SkillCall(name="__none__", args={"debug": debug})
+
+
+async def aroute_speculative(user_text: str, role: RoleConfig, llm_client,
+                             speculate: Callable[[], Any]) -> Tuple[SkillCall, Any]:
+    """
+    推测式路由：规则、缓存与本地分类都未给出结论时，先调用 speculate() 启动普通对话（返回带 cancel() 的句柄），
+    与 aclassify 并行；分类结果为 none / 低于阈值则保留这路生成，技能胜出则取消。
+    返回 (skill_call, handle)；handle 为 None 表示未推测或已取消。
+    """
+    debug = _new_debug()
+    table = _table_for(role)
+    hit = _match_rules(user_text, table, debug)
+    if hit is None:
+        key = _cache_key(user_text, role, table)
+        hit = _match_cached(key, debug) or _match_local(user_text, table, debug)
+    if hit is not None or llm_client is None:
+        return hit or SkillCall(name="__none__", args={"debug": debug}), None
+
+    handle = speculate()
+    t0 = time.time()
+    try:
+        res = await classify_flight.ado(key, lambda: llm_client.aclassify(user_text, table.candidates))
+        call = _from_llm(res, key, debug)
+    except BaseException:
+        handle.cancel()
+        raise
+    kept = call.name == "__none__"
+    if not kept:
+        handle.cancel()
+    debug["speculative"] = "kept" if kept else "cancelled"
+    write_log(settings.LOG_PATH, {"event": "route_speculation", "kept": kept, "skill": call.name,
+                                  "classify_ms": int((time.time() - t0) * 1000)})
+    return call, (handle if kept else None)
@@ -0,0 +1,152 @@
+# core/intent_local.py
+from __future__ import annotations
+import json, os, random, threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import settings
+from utils.textvec import DEFAULT_DIM, hash_sparse, hash_matrix, normalize_text
+
+# 本地意图分类器：字符 n-gram 哈希特征 + 最近质心（余弦相似度）。
+# 训练数据来自日志中 LLM 分类的路由结果（chat_turn.route_debug.classify），
+# 线上先走本地模型，只有“拿不准”时才调用 LLM 分类。
+
+
+class LocalIntentModel:
+    def __init__(self, labels: Sequence[str], centroids: np.ndarray, dim: int = DEFAULT_DIM):
+        self.labels = list(labels)
+        self.centroids = np.asarray(centroids, dtype=np.float32)   # (n_labels, dim)，每行单位向量
+        self.dim = int(dim)
+
+    @classmethod
+    def fit(cls, texts: Sequence[str], labels: Sequence[str], dim: int = DEFAULT_DIM) -> "LocalIntentModel":
+        names = sorted(set(labels))
+        X = hash_matrix(texts, dim)
+        y = np.array([names.index(l) for l in labels])
+        C = np.stack([X[y == k].mean(axis=0) for k in range(len(names))])
+        C /= np.maximum(np.linalg.norm(C, axis=1, keepdims=True), 1e-12)
+        return cls(names, C, dim)
+
+    def similarities(self, text: str) -> np.ndarray:
+        idx, val = hash_sparse(text, self.dim)
+        if idx.size == 0:
+            return np.zeros(len(self.labels), dtype=np.float32)
+        return self.centroids[:, idx] @ val
+
+    def predict(self, text: str, candidates: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """
+        返回与 LLMClient.classify 同形的结果，另加：
+          sure：是否足够确定（置信度与最高相似度都过阈值）；
+          similarity：与最近质心的余弦相似度。
+        candidates 给定时只在这些标签（当前角色的候选）之间选择。
+        """
+        labels, sims = self.labels, self.similarities(text)
+        if candidates is not None:
+            keep = [i for i, l in enumerate(labels) if l in candidates]
+            if not keep:
+                return {"intent": "", "skill": "none", "confidence": 0.0, "confidence_map": {},
+                        "similarity": 0.0, "sure": False, "source": "local"}
+            labels, sims = [labels[i] for i in keep], sims[keep]
+        z = sims / max(1e-6, settings.LOCAL_INTENT_TEMPERATURE)
+        p = np.exp(z - z.max())
+        p /= p.sum()
+        k = int(np.argmax(p))
+        conf, sim = float(p[k]), float(sims[k])
+        return {
+            "intent": "",
+            "skill": labels[k],
+            "confidence": conf,
+            "confidence_map": {l: float(v) for l, v in zip(labels, p)},
+            "similarity": sim,
+            "sure": conf >= settings.LOCAL_INTENT_MIN_CONF and sim >= settings.LOCAL_INTENT_MIN_SIM,
+            "source": "local",
+        }
+
+    def save(self, path: str) -> None:
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez_compressed(f, labels=np.array(self.labels), centroids=self.centroids, dim=self.dim)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalIntentModel":
+        with np.load(path) as z:
+            return cls([str(l) for l in z["labels"]], z["centroids"], int(z["dim"]))
+
+
+# ---- 训练数据：日志中的 LLM 路由结果 ----
+def router_label(classify: Dict[str, Any]) -> str:
+    """LLM 分类结果 -> 路由最终决策（技能名，或 none：含低于阈值的情况）。"""
+    skill = classify.get("skill") or "none"
+    if skill != "none" and float(classify.get("confidence", 0.0)) >= settings.INTENT_CONF_THRESHOLD:
+        return skill
+    return "none"
+
+
+def load_training_records(log_path: str) -> List[Tuple[str, str]]:
+    """读取 chat_turn 中由 LLM 给出的分类记录（本地模型产生的不算），同一文本保留最后一次。"""
+    latest: Dict[str, Tuple[str, str]] = {}
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except Exception:
+                continue
+            if rec.get("event") != "chat_turn":
+                continue
+            cls_res = (rec.get("route_debug") or {}).get("classify")
+            text = (rec.get("user_text") or "").strip()
+            if not cls_res or not text or cls_res.get("source") == "local":
+                continue
+            if text.startswith("（") and text.endswith("）"):   # ASR 失败/无语音等占位文本
+                continue
+            latest[normalize_text(text)] = (text, router_label(cls_res))
+    return list(latest.values())
+
+
+def cross_validate(records: Sequence[Tuple[str, str]], folds: int = 5, seed: int = 0) -> List[Tuple[str, Dict[str, Any]]]:
+    """k 折交叉验证：返回 [(真实标签, 预测结果)]；样本很少时退化为留一法。"""
+    items = list(records)
+    random.Random(seed).shuffle(items)
+    folds = max(2, min(folds, len(items)))
+    out: List[Tuple[str, Dict[str, Any]]] = []
+    for k in range(folds):
+        test = items[k::folds]
+        train = [r for i, r in enumerate(items) if i % folds != k]
+        if len({l for _, l in train}) < 2:
+            continue
+        model = LocalIntentModel.fit([t for t, _ in train], [l for _, l in train])
+        out.extend((label, model.predict(text)) for text, label in test)
+    return out
+
+
+# ---- 线上：进程内单例（模型文件更新后自动重载） ----
+_model: Optional[LocalIntentModel] = None
+_model_mtime: Optional[float] = None
+_lock = threading.Lock()
+
+
+def get_local_model() -> Optional[LocalIntentModel]:
+    global _model, _model_mtime
+    if not getattr(settings, "LOCAL_INTENT_ENABLE", False):
+        return None
+    path = settings.LOCAL_INTENT_MODEL_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if mtime != _model_mtime:
+        with _lock:
+            if mtime != _model_mtime:
+                _model, _model_mtime = LocalIntentModel.load(path), mtime
+    return _model
+
+
+def classify_local(text: str, candidates: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+    """本地模型预测；未训练/未启用时返回 None。调用方根据 sure 决定是否再问 LLM。"""
+    model = get_local_model()
+    return model.predict(text, candidates) if model is not None else None
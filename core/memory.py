@@ -0,0 +1,109 @@
+# core/memory.py
+from __future__ import annotations
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from config import settings
+from utils.logging import write_log
+from .state import SessionState, get_recent_messages
+from .types import Message
+
+# 滚动摘要（记忆压缩）：每轮 append_turn 之后，把已移出历史窗口的旧轮次交给后台线程，
+# 用一次便宜的模型调用与已有摘要合并，写回 SessionState.summary；
+# assemble_messages 发送“摘要 + 最近窗口”，长会话的 prompt 长度有界而不丢上下文。
+
+_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-compact")
+_lock = threading.Lock()
+_CLIP_CHARS = 400   # 单条消息送去摘要时的截断长度
+
+_SYSTEM = ("你是对话记忆整理助手。把“已有摘要”和“新增对话”合并成一份更新后的摘要："
+           "保留用户的观点与立场、关键事实、已达成的结论和尚未解决的问题，删去寒暄与重复。"
+           "用中文第三人称叙述，不超过{max_chars}字，只输出摘要正文。")
+
+
+def _evict_outside_window(state: SessionState, max_rounds: int) -> None:
+    """窗口（get_recent_messages 选中的部分）之前的消息移入 state.evicted，等待折叠。"""
+    window = get_recent_messages(state, max_rounds, settings.HISTORY_TOKEN_BUDGET)
+    n_old = len(state.messages) - len(window)
+    if n_old <= 0:
+        return
+    with _lock:
+        state.evicted.extend(state.messages[:n_old])
+        del state.messages[:n_old]
+        cap = 2 * settings.SUMMARY_MAX_PENDING_ROUNDS
+        if len(state.evicted) > cap:
+            del state.evicted[:len(state.evicted) - cap]
+
+
+def _summary_messages(summary: str, batch: List[Message]) -> List[Message]:
+    lines = [f"{'用户' if m.role == 'user' else '助手'}：{m.content[:_CLIP_CHARS]}" for m in batch]
+    return [Message(role="system", content=_SYSTEM.format(max_chars=settings.SUMMARY_MAX_CHARS)),
+            Message(role="user", content=f"已有摘要：\n{summary or '（无）'}\n\n新增对话：\n" + "\n".join(lines))]
+
+
+def compact(state: SessionState, llm_client) -> bool:
+    """
+    把当前待折叠的消息并入摘要（同步执行，由后台线程调用）；失败时保留待折叠消息，下次再试。
+    折叠期间会话被重置（generation 变化）则丢弃结果，不把旧对话的摘要写回新会话。
+    """
+    with _lock:
+        batch = list(state.evicted)
+        summary, gen = state.summary, state.generation
+    if not batch:
+        return False
+    t0 = time.time()
+    try:
+        text = llm_client.complete(_summary_messages(summary, batch),
+                                   max_tokens=settings.SUMMARY_MAX_TOKENS, stream=False)
+    except Exception as e:
+        write_log(settings.LOG_PATH, {"event": "summary_error", "session": state.session_id, "error": str(e)[:300]})
+        return False
+    text = (text or "").strip()[:settings.SUMMARY_MAX_CHARS]
+    if not text:
+        return False
+    with _lock:
+        stale = state.generation != gen
+        if not stale:
+            state.summary = text
+            # 只删本批：折叠期间新移出的消息留给下一次
+            n = len(batch) if state.evicted[:len(batch)] == batch else 0
+            del state.evicted[:n]
+    if stale:
+        write_log(settings.LOG_PATH, {"event": "summary_discarded", "session": state.session_id,
+                                      "reason": "reset", "folded_msgs": len(batch)})
+        return False
+    write_log(settings.LOG_PATH, {"event": "summary_update", "session": state.session_id,
+                                  "folded_msgs": len(batch), "summary_len": len(text),
+                                  "ms": int((time.time() - t0) * 1000)})
+    return True
+
+
+def schedule_compaction(state: SessionState, max_rounds: int, llm_client=None) -> bool:
+    """
+    append_turn 之后调用：移出窗口外的旧轮次，攒够 SUMMARY_BATCH_ROUNDS 轮就提交后台折叠。
+    每个会话同一时间最多一个折叠任务；llm_client 缺省为注册表里的摘要客户端。返回是否提交了任务。
+    """
+    if not settings.SUMMARY_ENABLE:
+        return False
+    _evict_outside_window(state, max_rounds)
+    with _lock:
+        if state.compacting or len(state.evicted) < 2 * settings.SUMMARY_BATCH_ROUNDS:
+            return False
+        state.compacting = True
+
+    def _run():
+        try:
+            if llm_client is None:
+                from clients.registry import get_summary_llm_client
+                compact(state, get_summary_llm_client())
+            else:
+                compact(state, llm_client)
+        except Exception as e:
+            write_log(settings.LOG_PATH, {"event": "summary_error", "session": state.session_id, "error": str(e)[:300]})
+        finally:
+            with _lock:
+                state.compacting = False
+
+    _pool.submit(_run)
+    return True
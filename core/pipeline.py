@@ -1,9 +1,9 @@
 # core/pipeline.py
 from __future__ import annotations
-from typing import Generator, List, Dict, Optional, Any
+from typing import AsyncGenerator, AsyncIterator, Generator, Iterator, List, Dict, Optional, Any
 from .types import Message, RoleConfig, TurnResult, SkillResult
-from .state import SessionState, get_recent_messages, append_turn
-from .dispatcher import route
+from .state import SessionState, get_recent_messages, append_turn, history_store_rounds
+from .dispatcher import route, aroute, aroute_speculative
 from config import settings
 from skills import steelman as skill_steelman
 from skills import x_exam as skill_x_exam
@@ -11,16 +11,24 @@ from skills import counterfactual as skill_cf
 from skills import luma_story, luma_reframe, luma_roleplay
 from skills import aris_reverse, aris_practice, aris_bimap
 from utils.logging import write_log
-import time
-from clients.asr_client import ASRClient
-from clients.tts_client import TTSClient
-from clients.asr_ws_client import ASRWsClient
-from utils.textseg import split_for_tts
+import asyncio, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from clients.registry import get_asr_client, get_tts_client
+from clients.response_cache import cached_llm
+from .memory import schedule_compaction
+from .prompts import memo_prompt, prompt_cache_size, skill_prompt
+from .semantic_cache import semantic_namespace, semantic_lookup, semantic_store, maybe_audit, amaybe_audit
+from utils.textseg import split_for_tts, SentenceSegmenter, ReplyCapper
 import os
 
 
-# 根据角色配置生成system prompt（口吻、禁区、格式偏好）
+# 根据角色配置生成system prompt（口吻、禁区、格式偏好）；每个角色只拼一次，之后逐字节复用
 def build_system_prompt(role: RoleConfig) -> str:
+    return memo_prompt("role", role, _role_prompt)
+
+
+def _role_prompt(role: RoleConfig) -> str:
     parts = [f"你现在扮演：{role.name}。风格：{role.style}。"]
     if role.mission:
         parts.append(f"使命：{role.mission}。")
@@ -39,98 +47,199 @@ def build_system_prompt(role: RoleConfig) -> str:
 
 
 # 把system + 历史 + 当前user 拼成LLM可用的messages
-def assemble_messages(system_prompt: str, history: List[Message], user_text: str) -> List[Message]:
+def assemble_messages(system_prompt: str, history: List[Message], user_text: str,
+                      summary: str = "") -> List[Message]:
     msgs: List[Message] = [Message(role="system", content=system_prompt)]
-    # 只保留最近 N 轮（由 get_recent_messages 控制）
+    # 更早轮次的滚动摘要（core/memory.py 后台折叠）单独一条，不改动 system prompt 本身
+    if summary:
+        msgs.append(Message(role="system", content=f"此前对话摘要：{summary}"))
+    # 历史已按 token 预算 / 轮数截好（由 get_recent_messages 控制）
     msgs.extend(history)
     msgs.append(Message(role="user", content=user_text))
     return msgs
 
 
-def run_skill(skill_name: str, user_text: str, role: RoleConfig, history: list[Message], llm_client) -> SkillResult:
-    if skill_name == "steelman":
-        return skill_steelman.run(user_text, role, history, llm_client)
-    if skill_name == "x_exam":
-        return skill_x_exam.run(user_text, role, history, llm_client)
-    if skill_name == "counterfactual":
-        return skill_cf.run(user_text, role, history, llm_client)
-    
+# 技能名 -> 技能模块（统一暴露 NAME / DISPLAY_TAG / MAX_TOKENS / SYSTEM_PROMPT / _style_hint / build_messages，
+# 调用入口见下方 _skill_*；build_messages 只给 system 之后的消息，system 由 skill_prompt 统一拼）
+_SKILLS = {
+    "steelman": skill_steelman,
+    "x_exam": skill_x_exam,
+    "counterfactual": skill_cf,
+
     # Luma
-    if skill_name == "luma_story":
-        return luma_story.run(user_text, role, history, llm_client)
-    if skill_name == "luma_reframe":
-        return luma_reframe.run(user_text, role, history, llm_client)
-    if skill_name == "luma_roleplay":
-        return luma_roleplay.run(user_text, role, history, llm_client)
+    "luma_story": luma_story,
+    "luma_reframe": luma_reframe,
+    "luma_roleplay": luma_roleplay,
 
     # Aris
-    if skill_name == "aris_reverse":
-        return aris_reverse.run(user_text, role, history, llm_client)
-    if skill_name == "aris_practice":
-        return aris_practice.run(user_text, role, history, llm_client)
-    if skill_name == "aris_bimap":
-        return aris_bimap.run(user_text, role, history, llm_client)
+    "aris_reverse": aris_reverse,
+    "aris_practice": aris_practice,
+    "aris_bimap": aris_bimap,
+}
+
+
+def _skill_messages(mod, user_text: str, role: RoleConfig, history: List[Message]) -> List[Message]:
+    return [Message(role="system", content=skill_prompt(mod, role))] + mod.build_messages(user_text, role, history)
+
+
+def _skill_run(mod, user_text: str, role: RoleConfig, history: List[Message], llm_client) -> SkillResult:
+    msgs = _skill_messages(mod, user_text, role, history)
+    reply = llm_client.complete(msgs, max_tokens=mod.MAX_TOKENS)
+    return SkillResult(name=mod.NAME, display_tag=mod.DISPLAY_TAG, reply_text=reply, data={})
+
+
+def _skill_stream(mod, user_text: str, role: RoleConfig, history: List[Message], llm_client) -> Iterator[str]:
+    """流式入口：逐片段产出回复文本（与 _skill_run 使用同一份 messages）。"""
+    msgs = _skill_messages(mod, user_text, role, history)
+    yield from llm_client.complete_chunks(msgs, max_tokens=mod.MAX_TOKENS)
+
+
+async def _askill_run(mod, user_text: str, role: RoleConfig, history: List[Message], llm_client) -> SkillResult:
+    """_skill_run 的异步版本。"""
+    msgs = _skill_messages(mod, user_text, role, history)
+    reply = await llm_client.acomplete(msgs, max_tokens=mod.MAX_TOKENS)
+    return SkillResult(name=mod.NAME, display_tag=mod.DISPLAY_TAG, reply_text=reply, data={})
+
+
+async def _askill_stream(mod, user_text: str, role: RoleConfig, history: List[Message], llm_client) -> AsyncIterator[str]:
+    """_skill_stream 的异步版本。"""
+    msgs = _skill_messages(mod, user_text, role, history)
+    async for piece in llm_client.acomplete_chunks(msgs, max_tokens=mod.MAX_TOKENS):
+        yield piece
+
+
+def precompile_prompts(roles) -> int:
+    """启动时为每个角色编译对话 / 语音短回复 / 各技能的 system prompt，返回缓存条数。"""
+    for role in roles:
+        build_system_prompt(role)
+        memo_prompt("voice_short", role, _short_reply_prompt)
+        for mod in set(_SKILLS.values()):
+            skill_prompt(mod, role)
+    return prompt_cache_size()
+
+
+def run_skill(skill_name: str, user_text: str, role: RoleConfig, history: list[Message], llm_client) -> SkillResult:
+    mod = _SKILLS.get(skill_name)
+    if mod is not None:
+        return _skill_run(mod, user_text, role, history, cached_llm(llm_client, skill_name))
 
     # 未知技能：回退普通对话
     return SkillResult(name="none", display_tag="", reply_text=user_text, data={})
 
 def respond(user_text: str, state: SessionState, role: RoleConfig, llm_client, max_rounds: int = None) -> TurnResult:
     max_rounds = max_rounds or settings.MAX_ROUNDS
-    
-    # 1) 技能优先
+
+    # 1) 技能优先（未命中为 "__none__"：普通对话）
     skill_call = route(user_text=user_text, role=role, llm_client=llm_client, context_hint=None)
-    
-    # 未命中：可能是 "__none__"
-    if skill_call and skill_call.name == "__none__":
-        route_debug = skill_call.args.get("debug", {})
-        # 普通对话
-        system_prompt = build_system_prompt(role)
-        history = get_recent_messages(state, max_rounds=max_rounds)
-        messages = assemble_messages(system_prompt, history, user_text)
-        reply_text = llm_client.complete(messages, max_tokens=settings.MAX_TOKENS_RESPONSE, stream=settings.TEXT_STREAMING)
-        append_turn(state, Message(role="user", content=user_text), Message(role="assistant", content=reply_text), max_rounds)
-
-        if settings.DEBUG:
-            write_log(settings.LOG_PATH, {
-                "event": "chat_turn",
-                "path": "llm_default",
-                "user_text": user_text,
-                "route_debug": route_debug,
-                "reply_len": len(reply_text)
-            })
-        return TurnResult(reply_text=reply_text, skill=None, data={"route_debug": route_debug}, audio_bytes=None)
-
-    # 命中技能（规则或分类）
-    if skill_call and skill_call.name:
-        history = get_recent_messages(state, max_rounds=max_rounds)
-        sres = run_skill(skill_call.name, user_text, role, history, llm_client)
-        append_turn(state, Message(role="user", content=user_text), Message(role="assistant", content=sres.reply_text), max_rounds)
-
-        if settings.DEBUG:
-            write_log(settings.LOG_PATH, {
-                "event": "chat_turn",
-                "path": "skill",
-                "skill": sres.name,
-                "user_text": user_text,
-                "route_debug": skill_call.args.get("debug"),
-                "reply_len": len(sres.reply_text)
-            })
-        return TurnResult(reply_text=sres.reply_text, 
-                          skill=sres.name,
-                          data={"display_tag": sres.display_tag, 
-                                "route_debug": skill_call.args.get("debug")},
-                          audio_bytes=None)
-
-    # 理论不会到这
-    return TurnResult(reply_text="（抱歉，路由异常。）", skill=None, data={}, audio_bytes=None)
+    route_debug = skill_call.args.get("debug", {}) if skill_call else {}
+    history = get_recent_messages(state, max_rounds, settings.HISTORY_TOKEN_BUDGET)
+    summary = state.summary
+    mod = _SKILLS.get(skill_call.name) if skill_call else None
+
+    # 2) 语义缓存：同角色同技能下的相似输入直接复用回复
+    ns = semantic_namespace(role.name, mod.NAME if mod else None, bool(history or summary))
+    hit = semantic_lookup(ns, user_text)
+    if hit is not None:
+        _note_semantic_hit(route_debug, hit)
+        maybe_audit(ns, user_text, hit, lambda: _generate(user_text, role, history, mod, llm_client, summary))
+        reply_text = hit.reply
+    else:
+        reply_text = _generate(user_text, role, history, mod, llm_client, summary)
+        semantic_store(ns, user_text, reply_text)
+    return _record_turn(state, role, user_text, reply_text, mod, route_debug, max_rounds, stream=False)
+
+
+def _generate(user_text: str, role: RoleConfig, history: List[Message], mod, llm_client,
+              summary: str = "") -> str:
+    """整段生成：技能走 mod.run，普通对话走 complete（整段返回不需要 SSE；真·流式走 respond_stream）。"""
+    if mod is not None:
+        return _skill_run(mod, user_text, role, history, cached_llm(llm_client, mod.NAME)).reply_text
+    messages = assemble_messages(build_system_prompt(role), history, user_text, summary)
+    return cached_llm(llm_client, "default").complete(messages, max_tokens=settings.MAX_TOKENS_RESPONSE, stream=False)
+
+
+def _note_semantic_hit(route_debug: Dict[str, Any], hit) -> None:
+    route_debug["semantic_cache"] = {"sim": round(hit.sim, 4), "matched_text": hit.matched_text}
+
+
+def respond_stream(user_text: str, state: SessionState, role: RoleConfig, llm_client,
+                   max_rounds: int = None) -> Generator[Dict[str, Any], None, None]:
+    """
+    respond 的生成器版本：先路由，再从普通对话或技能逐片段产出。
+    yield 事件（按 kind 区分）：
+      {"kind": "route", "skill": 技能名或None, "display_tag": 标签, "route_debug": 路由调试}
+      {"kind": "delta", "text": 片段}
+      {"kind": "done",  "turn": TurnResult}
+    """
+    max_rounds = max_rounds or settings.MAX_ROUNDS
+
+    skill_call = route(user_text=user_text, role=role, llm_client=llm_client, context_hint=None)
+    route_debug = skill_call.args.get("debug", {}) if skill_call else {}
+    history = get_recent_messages(state, max_rounds, settings.HISTORY_TOKEN_BUDGET)
+    summary = state.summary
+
+    mod = _SKILLS.get(skill_call.name) if skill_call else None
+    ns = semantic_namespace(role.name, mod.NAME if mod else None, bool(history or summary))
+    hit = semantic_lookup(ns, user_text)
+    if hit is not None:
+        _note_semantic_hit(route_debug, hit)
+        maybe_audit(ns, user_text, hit, lambda: _generate(user_text, role, history, mod, llm_client, summary))
+
+    if mod is not None:
+        yield {"kind": "route", "skill": mod.NAME, "display_tag": mod.DISPLAY_TAG, "route_debug": route_debug}
+    else:
+        # "__none__" 或未知技能：普通对话
+        yield {"kind": "route", "skill": None, "display_tag": "", "route_debug": route_debug}
+    if hit is not None:
+        pieces = iter([hit.reply])
+    elif mod is not None:
+        pieces = _skill_stream(mod, user_text, role, history, cached_llm(llm_client, mod.NAME))
+    else:
+        messages = assemble_messages(build_system_prompt(role), history, user_text, summary)
+        pieces = cached_llm(llm_client, "default").complete_chunks(messages, max_tokens=settings.MAX_TOKENS_RESPONSE)
+
+    buf: List[str] = []
+    for piece in pieces:
+        buf.append(piece)
+        yield {"kind": "delta", "text": piece}
+    reply_text = "".join(buf).strip()
+    if hit is None:
+        semantic_store(ns, user_text, reply_text)
+    yield {"kind": "done", "turn": _record_turn(state, role, user_text, reply_text, mod, route_debug, max_rounds, stream=True)}
+
+
+def _record_turn(state: SessionState, role: RoleConfig, user_text: str, reply_text: str, mod,
+                 route_debug: Dict[str, Any], max_rounds: int, stream: bool) -> TurnResult:
+    """写回会话 + chat_turn 埋点，返回 TurnResult（mod 为命中的技能模块，普通对话为 None）。"""
+    append_turn(state, Message(role="user", content=user_text), Message(role="assistant", content=reply_text),
+                history_store_rounds(max_rounds))
+    schedule_compaction(state, max_rounds)   # 窗口外的旧轮次后台折叠进摘要，不占本轮耗时
+
+    skill = mod.NAME if mod is not None else None
+    if settings.DEBUG:
+        write_log(settings.LOG_PATH, {
+            "event": "chat_turn",
+            "path": "skill" if skill else "llm_default",
+            "skill": skill,
+            "stream": stream,
+            "role": role.name,
+            "user_text": user_text,
+            "route_debug": route_debug,
+            "reply_text": reply_text,
+            "reply_len": len(reply_text)
+        })
+    data = {"route_debug": route_debug}
+    if mod is not None:
+        data["display_tag"] = mod.DISPLAY_TAG
+    return TurnResult(reply_text=reply_text, skill=skill, data=data, audio_bytes=None)
 
 
 def respond_voice(audio_np, sample_rate, state: SessionState, role: RoleConfig, llm_client,
                   override_voice: Optional[str]=None, override_speed: Optional[float]=None) -> TurnResult:
     t0 = time.time()
 
-    asr = ASRWsClient() if settings.ASR_TRANSPORT == "ws" else ASRClient()
-    tts = TTSClient()
+    asr = get_asr_client()
+    tts = get_tts_client()
 
     # 1) ASR
     t_asr0 = time.time()
@@ -195,33 +304,65 @@ def respond_voice(audio_np, sample_rate, state: SessionState, role: RoleConfig,
                       audio_bytes=tts_res.audio_path)  # 用此字段承载路径
 
 
+def _short_reply_prompt(role: RoleConfig) -> str:
+    limit_note = f"【重要】请用1-2句中文回答，总字数不超过{settings.MAX_REPLY_CHARS_VOICE}字。如需展开，请最后问：要继续吗？"
+    return build_system_prompt(role) + "\n" + limit_note
+
+
+# 语音模式下的短回复：system 约束 + 历史 + 当前输入
+def _short_reply_messages(user_text: str, state: SessionState, role: RoleConfig) -> List[Message]:
+    sys_prompt = memo_prompt("voice_short", role, _short_reply_prompt)
+
+    history = get_recent_messages(state, settings.MAX_ROUNDS, settings.HISTORY_TOKEN_BUDGET)
+    return assemble_messages(sys_prompt, history, user_text, state.summary)
+
+
+def _push_short_turn(state: SessionState, user_text: str, reply: str) -> None:
+    # 与文本轮次同一条写回路径：计 token、按 history_store_rounds 截断、窗口外的旧轮次交给摘要器
+    append_turn(state, Message(role="user", content=user_text), Message(role="assistant", content=reply),
+                history_store_rounds(settings.MAX_ROUNDS))
+    schedule_compaction(state, settings.MAX_ROUNDS)
+
+
 # 语音模式下的短回复
 def respond_short(user_text: str, state: SessionState, role: RoleConfig, llm_client) -> TurnResult:
     """
     语音模式下的“短回复”：限制为 1-2 句/不超过 MAX_REPLY_CHARS_VOICE。
     复用你的 build_system_prompt / assemble_messages，只是多加一段约束。
     """
-    sys_prompt = build_system_prompt(role)
-    limit_note = f"【重要】请用1-2句中文回答，总字数不超过{settings.MAX_REPLY_CHARS_VOICE}字。如需展开，请最后问：要继续吗？"
-    sys_prompt = sys_prompt + "\n" + limit_note
+    # 走流式：达到字数上限即截断并断开连接，不等模型说完（会话在 respond_short_stream 里写回）
+    reply = "".join(respond_short_stream(user_text, state, role, llm_client)).strip()
+    return TurnResult(reply_text=reply, skill=None, data={})
 
-    history = getattr(state, "history", None) or getattr(state, "turns", None) or getattr(state, "messages", None) or []
-    msgs = assemble_messages(sys_prompt, history, user_text)
 
-    # 也可在 user 侧再加一句“请简洁回答”
-    reply = llm_client.complete(msgs, max_tokens=256, stream=False)
-    
-    # 更新会话
-    # 改为显式 push 到 messages：
+# 语音模式下的短回复（流式）：按句界放出片段，累计达到 MAX_REPLY_CHARS_VOICE 时截断并立即关闭上游流
+def respond_short_stream(user_text: str, state: SessionState, role: RoleConfig, llm_client) -> Generator[str, None, None]:
+    msgs = _short_reply_messages(user_text, state, role)
+    cap = ReplyCapper(settings.MAX_REPLY_CHARS_VOICE)
+    buf: List[str] = []
+    pieces = cached_llm(llm_client, "default").complete_chunks(msgs, max_tokens=256)
     try:
-        if not hasattr(state, "messages") or state.messages is None:
-            state.messages = []
-        state.messages.append(Message(role="user", content=user_text))
-        state.messages.append(Message(role="assistant", content=reply))
-    except Exception:
-        # 容错：不因日志失败影响主流程
-        pass
-    return TurnResult(reply_text=reply, skill=None, data={})
+        for piece in pieces:
+            out = cap.feed(piece)
+            if out:
+                buf.append(out)
+                yield out
+            if cap.done:
+                break
+    finally:
+        pieces.close()   # 截断后不再接收（和计费）后续 token
+    tail = cap.flush()
+    if tail:
+        buf.append(tail)
+        yield tail
+    _finish_short_turn(state, user_text, "".join(buf).strip(), cap)
+
+
+def _finish_short_turn(state: SessionState, user_text: str, reply: str, cap: ReplyCapper) -> None:
+    if cap.done:
+        write_log(settings.LOG_PATH, {"event": "voice_reply_capped", "cap": cap.cap, "reply_len": len(reply)})
+    _push_short_turn(state, user_text, reply)
+
 
 # 句级：一句识别→一句短答→一句TTS→逐句产出
 def voice_sentence_loop(audio_np, sample_rate, state: SessionState, role: RoleConfig, llm_client, asr_client, tts_client) -> Generator[Dict[str, Any], None, None]:
@@ -289,4 +430,458 @@ def voice_sentence_loop(audio_np, sample_rate, state: SessionState, role: RoleCo
         "asr_ms": int((asr_t1-asr_t0)*1000),
         "total_ms": total,
         "n_sent": len(sentences)
-    })
\ No newline at end of file
+    })
+
+
+# 流式语音：一次识别 -> LLM 流式生成 -> 边断句边TTS -> 逐句产出
+def voice_stream_loop(audio_np, sample_rate, state: SessionState, role: RoleConfig, llm_client, asr_client, tts_client) -> Generator[Dict[str, Any], None, None]:
+    """
+    生成器：与 voice_sentence_loop 的 yield 字段一致，另加 reply_so_far（当前助手气泡的累计文本）。
+    LLM 仍在生成第 2 句时，第 1 句已在后台线程合成；合成完成即 yield，首音延迟≈TTFT+单句TTS。
+    """
+    yield {"status": "🧠 正在识别(ASR)...", "chat_add": []}
+
+    # 1) ASR（整段识别）
+    asr_t0 = time.time()
+    asr_res = asr_client.transcribe(audio_np, sample_rate, audio_url=None)
+    asr_ms = int((time.time() - asr_t0) * 1000)
+
+    yield from voice_reply_stream(asr_res, state, role, llm_client, tts_client, asr_ms=asr_ms)
+
+
+# 流式语音的回复段：已有识别结果（整段识别或麦克风流式识别）-> LLM 流式 -> 边断句边TTS
+def voice_reply_stream(asr_res, state: SessionState, role: RoleConfig, llm_client, tts_client,
+                       asr_ms: Optional[int] = None) -> Generator[Dict[str, Any], None, None]:
+    t0 = time.time()
+    user_text = (asr_res.text or "").strip()
+
+    if not user_text:
+        yield {
+            "status": "❗未识别到有效语音，请重录或改用文本输入。",
+            "audio_path": None,
+            "user_text": "",
+            "chat_add": [("user", "（空语音）"), ("assistant", "没听清哦，可以再试一次吗？")]
+        }
+        return
+
+    yield {"status": "🤖 正在思考(LLM)...", "chat_add": [("user", user_text)]}
+
+    tts_prefs = getattr(role, "tts", {}) or {}
+    voice, speed = tts_prefs.get("voice_type"), tts_prefs.get("speed_ratio")
+    seg = SentenceSegmenter(max_chars=getattr(settings, "VOICE_STREAM_SEG_CHARS", settings.MAX_REPLY_CHARS_VOICE))
+
+    # 2) LLM 片段 -> 断句 -> 提交TTS（单线程保证顺序）；主循环只负责收片段与按序产出
+    pool = ThreadPoolExecutor(max_workers=1)
+    pending: deque = deque()
+    said: List[str] = []
+    n_sent, ttft_ms, first_audio_ms = 0, None, None
+
+    def _emit(sent: str, fut) -> Dict[str, Any]:
+        nonlocal n_sent, first_audio_ms
+        n_sent += 1
+        audio_path = fut.result().audio_path
+        if audio_path:
+            audio_path = os.path.normpath(audio_path).replace("\\", "/")
+            if first_audio_ms is None:
+                first_audio_ms = int((time.time() - t0) * 1000)
+        return {"status": f"🗣️ 第{n_sent}句：{sent}", "audio_path": audio_path, "user_text": user_text, "chat_add": []}
+
+    def _submit(sent: str) -> Dict[str, Any]:
+        said.append(sent)
+        pending.append((sent, pool.submit(tts_client.synthesize, sent, voice_type=voice, speed_ratio=speed)))
+        return {"status": "🔊 正在合成(TTS)...", "reply_so_far": "".join(said), "chat_add": []}
+
+    try:
+        for piece in respond_short_stream(user_text=user_text, state=state, role=role, llm_client=llm_client):
+            if ttft_ms is None:
+                ttft_ms = int((time.time() - t0) * 1000)
+            for sent in seg.feed(piece):
+                yield _submit(sent)
+            while pending and pending[0][1].done():
+                yield _emit(*pending.popleft())
+        for sent in seg.flush():
+            yield _submit(sent)
+        while pending:
+            yield _emit(*pending.popleft())
+    finally:
+        pool.shutdown(wait=False)
+
+    write_log(settings.LOG_PATH, {
+        "event": "voice_stream_done",
+        "asr_ms": asr_ms,
+        "asr_stream": bool((asr_res.meta or {}).get("stream")),
+        "ttft_ms": ttft_ms,
+        "first_audio_ms": first_audio_ms,
+        "total_ms": int((time.time() - t0) * 1000),
+        "n_sent": n_sent
+    })
+
+
+# ===================== 异步版本（协程 / 异步生成器） =====================
+# 与上面的同步版逐一对应：LLM / TTS / ASR 走 a* 接口，等待上游时让出事件循环，
+# Gradio 回调不再整轮占用工作线程，一个进程可同时挂起大量在等 I/O 的会话。
+
+async def arun_skill(skill_name: str, user_text: str, role: RoleConfig, history: list[Message], llm_client) -> SkillResult:
+    mod = _SKILLS.get(skill_name)
+    if mod is not None:
+        return await _askill_run(mod, user_text, role, history, cached_llm(llm_client, skill_name))
+    return SkillResult(name="none", display_tag="", reply_text=user_text, data={})
+
+
+class _SpecStream:
+    """推测式生成的普通对话流：后台任务预先消费片段进队列，路由确认后再按序取出；技能胜出则 cancel。"""
+    _END = object()
+
+    def __init__(self, pieces):
+        self._q: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.ensure_future(self._pump(pieces))
+
+    async def _pump(self, pieces) -> None:
+        try:
+            async for piece in pieces:
+                self._q.put_nowait(piece)
+        except Exception as e:
+            self._q.put_nowait(e)
+        finally:
+            # 取消时关闭上游流（释放连接），不再继续生成
+            await pieces.aclose()
+            self._q.put_nowait(self._END)
+
+    def cancel(self) -> None:
+        self._task.cancel()
+
+    async def pieces(self):
+        while True:
+            item = await self._q.get()
+            if item is self._END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+def _spec_task(coro) -> asyncio.Task:
+    task = asyncio.ensure_future(coro)
+    # 被取消前若已出错，标记异常已读取，避免 “Task exception was never retrieved”
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return task
+
+
+async def _aroute(user_text: str, role: RoleConfig, llm_client, speculate):
+    """SPECULATIVE_ROUTING 打开时走推测式路由（分类与普通对话并行），否则先分类后生成。"""
+    if getattr(settings, "SPECULATIVE_ROUTING", False):
+        return await aroute_speculative(user_text, role, llm_client, speculate)
+    return await aroute(user_text=user_text, role=role, llm_client=llm_client, context_hint=None), None
+
+
+async def arespond(user_text: str, state: SessionState, role: RoleConfig, llm_client, max_rounds: int = None) -> TurnResult:
+    max_rounds = max_rounds or settings.MAX_ROUNDS
+    history = get_recent_messages(state, max_rounds, settings.HISTORY_TOKEN_BUDGET)
+    summary = state.summary
+    messages = assemble_messages(build_system_prompt(role), history, user_text, summary)
+    chat_llm = cached_llm(llm_client, "default")
+
+    skill_call, spec = await _aroute(user_text, role, llm_client,
+                                     lambda: _spec_task(chat_llm.acomplete(messages, max_tokens=settings.MAX_TOKENS_RESPONSE)))
+    route_debug = skill_call.args.get("debug", {}) if skill_call else {}
+
+    mod = _SKILLS.get(skill_call.name) if skill_call else None
+    ns = semantic_namespace(role.name, mod.NAME if mod else None, bool(history or summary))
+    hit = semantic_lookup(ns, user_text)
+    if hit is not None:
+        if spec is not None:
+            spec.cancel()
+            route_debug["speculative"] = "cancelled"
+        _note_semantic_hit(route_debug, hit)
+        amaybe_audit(ns, user_text, hit, lambda: _agenerate(user_text, role, history, mod, llm_client, summary))
+        reply_text = hit.reply
+    elif spec is not None:
+        reply_text = await spec
+    else:
+        reply_text = await _agenerate(user_text, role, history, mod, llm_client, summary)
+    if hit is None:
+        semantic_store(ns, user_text, reply_text)
+    return _record_turn(state, role, user_text, reply_text, mod, route_debug, max_rounds, stream=False)
+
+
+async def _agenerate(user_text: str, role: RoleConfig, history: List[Message], mod, llm_client,
+                     summary: str = "") -> str:
+    """_generate 的异步版本。"""
+    if mod is not None:
+        return (await _askill_run(mod, user_text, role, history, cached_llm(llm_client, mod.NAME))).reply_text
+    messages = assemble_messages(build_system_prompt(role), history, user_text, summary)
+    return await cached_llm(llm_client, "default").acomplete(messages, max_tokens=settings.MAX_TOKENS_RESPONSE)
+
+
+async def arespond_stream(user_text: str, state: SessionState, role: RoleConfig, llm_client,
+                          max_rounds: int = None) -> AsyncGenerator[Dict[str, Any], None]:
+    """respond_stream 的异步版本，事件格式相同（route / delta / done）；规则未命中时推测式并行生成。"""
+    max_rounds = max_rounds or settings.MAX_ROUNDS
+    history = get_recent_messages(state, max_rounds, settings.HISTORY_TOKEN_BUDGET)
+    summary = state.summary
+    messages = assemble_messages(build_system_prompt(role), history, user_text, summary)
+    chat_llm = cached_llm(llm_client, "default")
+
+    skill_call, spec = await _aroute(user_text, role, llm_client,
+                                     lambda: _SpecStream(chat_llm.acomplete_chunks(messages, max_tokens=settings.MAX_TOKENS_RESPONSE)))
+    route_debug = skill_call.args.get("debug", {}) if skill_call else {}
+
+    mod = _SKILLS.get(skill_call.name) if skill_call else None
+    ns = semantic_namespace(role.name, mod.NAME if mod else None, bool(history or summary))
+    hit = semantic_lookup(ns, user_text)
+    if hit is not None:
+        if spec is not None:
+            spec.cancel()
+            spec = None
+            route_debug["speculative"] = "cancelled"
+        _note_semantic_hit(route_debug, hit)
+        amaybe_audit(ns, user_text, hit, lambda: _agenerate(user_text, role, history, mod, llm_client, summary))
+
+    if mod is not None:
+        yield {"kind": "route", "skill": mod.NAME, "display_tag": mod.DISPLAY_TAG, "route_debug": route_debug}
+    else:
+        yield {"kind": "route", "skill": None, "display_tag": "", "route_debug": route_debug}
+    if hit is not None:
+        pieces = _aiter_once(hit.reply)
+    elif mod is not None:
+        pieces = _askill_stream(mod, user_text, role, history, cached_llm(llm_client, mod.NAME))
+    else:
+        pieces = spec.pieces() if spec is not None else \
+            chat_llm.acomplete_chunks(messages, max_tokens=settings.MAX_TOKENS_RESPONSE)
+
+    buf: List[str] = []
+    try:
+        async for piece in pieces:
+            buf.append(piece)
+            yield {"kind": "delta", "text": piece}
+    finally:
+        if spec is not None:
+            spec.cancel()   # 调用方中途退出时停止后台生成
+    reply_text = "".join(buf).strip()
+    if hit is None:
+        semantic_store(ns, user_text, reply_text)
+    yield {"kind": "done", "turn": _record_turn(state, role, user_text, reply_text, mod, route_debug, max_rounds, stream=True)}
+
+
+async def _aiter_once(text: str) -> AsyncGenerator[str, None]:
+    yield text
+
+
+async def arespond_voice(audio_np, sample_rate, state: SessionState, role: RoleConfig, llm_client,
+                         override_voice: Optional[str]=None, override_speed: Optional[float]=None) -> TurnResult:
+    """respond_voice 的异步版本：ASR -> arespond -> TTS。"""
+    t0 = time.time()
+    asr = get_asr_client()
+    tts = get_tts_client()
+
+    t_asr0 = time.time()
+    asr_res = await asr.atranscribe(audio_np, sample_rate, audio_url=None)
+    t_asr1 = time.time()
+    user_text = asr_res.text
+
+    if not user_text.strip() or user_text.strip().startswith("（ASR请求失败"):
+        write_log(settings.LOG_PATH, {"event":"voice_asr_failed_shortcircuit",
+                                      "asr_meta": asr_res.meta})
+        return TurnResult(
+            reply_text="语音识别未成功，请重录或改用文本输入。\n\n详情：ASR需要正确的音频/网络，请稍后重试。",
+            skill=None,
+            data={"route_debug":{"phase":"asr_failed","meta":asr_res.meta}},
+            audio_bytes=None
+        )
+
+    t_llm0 = time.time()
+    turn_text = await arespond(user_text=user_text, state=state, role=role, llm_client=llm_client)
+    t_llm1 = time.time()
+
+    tts_prefs = getattr(role, "tts", {}) or {}
+    voice = override_voice or tts_prefs.get("voice_type") or settings.TTS_VOICE
+    speed = override_speed if (override_speed is not None) else tts_prefs.get("speed_ratio", settings.TTS_SPEED)
+
+    t_tts0 = time.time()
+    tts_res = await tts.asynthesize(turn_text.reply_text, voice_type=voice, speed_ratio=speed)
+    t_tts1 = time.time()
+
+    if settings.DEBUG:
+        write_log(settings.LOG_PATH, {
+            "event": "voice_turn",
+            "async": True,
+            "asr_ms": int((t_asr1 - t_asr0)*1000),
+            "llm_ms": int((t_llm1 - t_llm0)*1000),
+            "tts_ms": int((t_tts1 - t_tts0)*1000),
+            "total_ms": int((time.time() - t0)*1000),
+            "asr_meta": asr_res.meta,
+            "tts_meta": tts_res.meta,
+            "user_text": user_text,
+            "skill": turn_text.skill,
+        })
+
+    return TurnResult(reply_text=turn_text.reply_text,
+                      skill=turn_text.skill,
+                      data={"route_debug": turn_text.data.get("route_debug"),
+                            "voice_used": voice, "speed_used": speed},
+                      audio_bytes=tts_res.audio_path)
+
+
+async def arespond_short(user_text: str, state: SessionState, role: RoleConfig, llm_client) -> TurnResult:
+    reply = "".join([p async for p in arespond_short_stream(user_text, state, role, llm_client)]).strip()
+    return TurnResult(reply_text=reply, skill=None, data={})
+
+
+async def arespond_short_stream(user_text: str, state: SessionState, role: RoleConfig, llm_client) -> AsyncGenerator[str, None]:
+    msgs = _short_reply_messages(user_text, state, role)
+    cap = ReplyCapper(settings.MAX_REPLY_CHARS_VOICE)
+    buf: List[str] = []
+    pieces = cached_llm(llm_client, "default").acomplete_chunks(msgs, max_tokens=256)
+    try:
+        async for piece in pieces:
+            out = cap.feed(piece)
+            if out:
+                buf.append(out)
+                yield out
+            if cap.done:
+                break
+    finally:
+        await pieces.aclose()
+    tail = cap.flush()
+    if tail:
+        buf.append(tail)
+        yield tail
+    _finish_short_turn(state, user_text, "".join(buf).strip(), cap)
+
+
+async def avoice_sentence_loop(audio_np, sample_rate, state: SessionState, role: RoleConfig, llm_client, asr_client, tts_client) -> AsyncGenerator[Dict[str, Any], None]:
+    """voice_sentence_loop 的异步版本，yield 字段相同。"""
+    t0 = time.time()
+    yield {"status": "🧠 正在识别(ASR)...", "chat_add": []}
+
+    asr_t0 = time.time()
+    asr_res = await asr_client.atranscribe(audio_np, sample_rate, audio_url=None)
+    asr_t1 = time.time()
+    user_text_all = (asr_res.text or "").strip()
+
+    if not user_text_all:
+        yield {
+            "status": "❗未识别到有效语音，请重录或改用文本输入。",
+            "audio_path": None,
+            "user_text": "",
+            "chat_add": [("user", "（空语音）"), ("assistant", "没听清哦，可以再试一次吗？")]
+        }
+        return
+
+    yield {"status": "🤖 正在思考(LLM)...", "chat_add": [("user", user_text_all)]}
+
+    sentences = split_for_tts(user_text_all, max_chars=settings.MAX_REPLY_CHARS_VOICE)
+    yield {"status": f"🎧 已识别：{user_text_all}（分{len(sentences)}句处理）", "audio_path": None, "user_text": user_text_all, "chat_add": []}
+
+    tts_prefs = getattr(role, "tts", {}) or {}
+    for idx, sent in enumerate(sentences, 1):
+        turn = await arespond_short(user_text=sent, state=state, role=role, llm_client=llm_client)
+        yield {"status": "🔊 正在合成(TTS)...", "chat_add": []}
+        tts_res = await tts_client.asynthesize(turn.reply_text,
+                                               voice_type=tts_prefs.get("voice_type"),
+                                               speed_ratio=tts_prefs.get("speed_ratio"))
+        audio_path = tts_res.audio_path
+        if audio_path:
+            audio_path = os.path.normpath(audio_path).replace("\\", "/")
+        yield {
+            "status": f"🗣️ 第{idx}/{len(sentences)}句：{sent}",
+            "audio_path": audio_path,
+            "user_text": sent,
+            "chat_add": [("assistant", turn.reply_text)]
+        }
+
+    write_log(settings.LOG_PATH, {
+        "event": "voice_sentence_loop_done",
+        "async": True,
+        "asr_ms": int((asr_t1-asr_t0)*1000),
+        "total_ms": int((time.time() - t0) * 1000),
+        "n_sent": len(sentences)
+    })
+
+
+async def avoice_stream_loop(audio_np, sample_rate, state: SessionState, role: RoleConfig, llm_client, asr_client, tts_client) -> AsyncGenerator[Dict[str, Any], None]:
+    """voice_stream_loop 的异步版本。"""
+    yield {"status": "🧠 正在识别(ASR)...", "chat_add": []}
+
+    asr_t0 = time.time()
+    asr_res = await asr_client.atranscribe(audio_np, sample_rate, audio_url=None)
+    asr_ms = int((time.time() - asr_t0) * 1000)
+
+    async for step in avoice_reply_stream(asr_res, state, role, llm_client, tts_client, asr_ms=asr_ms):
+        yield step
+
+
+async def avoice_reply_stream(asr_res, state: SessionState, role: RoleConfig, llm_client, tts_client,
+                              asr_ms: Optional[int] = None) -> AsyncGenerator[Dict[str, Any], None]:
+    """voice_reply_stream 的异步版本：句子的 TTS 作为任务在后台串行执行，LLM 流继续推进。"""
+    t0 = time.time()
+    user_text = (asr_res.text or "").strip()
+
+    if not user_text:
+        yield {
+            "status": "❗未识别到有效语音，请重录或改用文本输入。",
+            "audio_path": None,
+            "user_text": "",
+            "chat_add": [("user", "（空语音）"), ("assistant", "没听清哦，可以再试一次吗？")]
+        }
+        return
+
+    yield {"status": "🤖 正在思考(LLM)...", "chat_add": [("user", user_text)]}
+
+    tts_prefs = getattr(role, "tts", {}) or {}
+    voice, speed = tts_prefs.get("voice_type"), tts_prefs.get("speed_ratio")
+    seg = SentenceSegmenter(max_chars=getattr(settings, "VOICE_STREAM_SEG_CHARS", settings.MAX_REPLY_CHARS_VOICE))
+
+    # 与同步版的单线程池对应：锁按提交顺序（FIFO）串行合成，主循环只负责收片段与按序产出
+    tts_lock = asyncio.Lock()
+    pending: deque = deque()
+    said: List[str] = []
+    n_sent, ttft_ms, first_audio_ms = 0, None, None
+
+    async def _tts(sent: str):
+        async with tts_lock:
+            return await tts_client.asynthesize(sent, voice_type=voice, speed_ratio=speed)
+
+    def _emit(sent: str, task) -> Dict[str, Any]:
+        nonlocal n_sent, first_audio_ms
+        n_sent += 1
+        audio_path = task.result().audio_path
+        if audio_path:
+            audio_path = os.path.normpath(audio_path).replace("\\", "/")
+            if first_audio_ms is None:
+                first_audio_ms = int((time.time() - t0) * 1000)
+        return {"status": f"🗣️ 第{n_sent}句：{sent}", "audio_path": audio_path, "user_text": user_text, "chat_add": []}
+
+    def _submit(sent: str) -> Dict[str, Any]:
+        said.append(sent)
+        pending.append((sent, asyncio.ensure_future(_tts(sent))))
+        return {"status": "🔊 正在合成(TTS)...", "reply_so_far": "".join(said), "chat_add": []}
+
+    try:
+        async for piece in arespond_short_stream(user_text=user_text, state=state, role=role, llm_client=llm_client):
+            if ttft_ms is None:
+                ttft_ms = int((time.time() - t0) * 1000)
+            for sent in seg.feed(piece):
+                yield _submit(sent)
+            while pending and pending[0][1].done():
+                yield _emit(*pending.popleft())
+        for sent in seg.flush():
+            yield _submit(sent)
+        while pending:
+            await asyncio.wait([pending[0][1]])
+            yield _emit(*pending.popleft())
+    finally:
+        # 用户中途离开/取消：未播出的句子不再合成
+        for _, task in pending:
+            task.cancel()
+
+    write_log(settings.LOG_PATH, {
+        "event": "voice_stream_done",
+        "async": True,
+        "asr_ms": asr_ms,
+        "asr_stream": bool((asr_res.meta or {}).get("stream")),
+        "ttft_ms": ttft_ms,
+        "first_audio_ms": first_audio_ms,
+        "total_ms": int((time.time() - t0) * 1000),
+        "n_sent": n_sent
+    })
@@ -0,0 +1,34 @@
+# core/prompts.py
+from __future__ import annotations
+import threading
+from typing import Callable, Dict, Tuple
+
+from .types import RoleConfig
+
+# system prompt 模板缓存：按（模板种类, 角色）编译一次，之后每轮返回同一字符串。
+# 布局约定：静态部分（技能说明 / 人设 / 禁区）在前、随角色变化的提示在后、用户输入与历史在 system 之外，
+# 同一模板的 system 消息逐字节一致，OpenAI 兼容后端的自动前缀缓存可以复用 prefill。
+# 角色配置按对象身份判断是否变化（roles.jsonl 重新加载会得到新对象），原地修改 RoleConfig 不会触发重建。
+
+_cache: Dict[Tuple[str, str], Tuple[RoleConfig, str]] = {}
+_lock = threading.Lock()
+
+
+def memo_prompt(kind: str, role: RoleConfig, build: Callable[[RoleConfig], str]) -> str:
+    key = (kind, role.name)
+    item = _cache.get(key)
+    if item is not None and item[0] is role:
+        return item[1]
+    text = build(role)
+    with _lock:
+        _cache[key] = (role, text)
+    return text
+
+
+def skill_prompt(mod, role: RoleConfig) -> str:
+    """技能的 system prompt：技能说明（mod.SYSTEM_PROMPT，各角色共用的静态前缀）在前，角色风格提示（mod._style_hint）在后。"""
+    return memo_prompt(mod.NAME, role, lambda r: mod.SYSTEM_PROMPT + " " + mod._style_hint(r))
+
+
+def prompt_cache_size() -> int:
+    return len(_cache)
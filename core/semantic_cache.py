@@ -0,0 +1,193 @@
+# core/semantic_cache.py
+from __future__ import annotations
+import asyncio, random, re, threading, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from config import settings
+from utils.logging import write_log
+from utils.textvec import hash_sparse, normalize_query
+
+# 语义回复缓存：输入 -> 字符 n-gram 哈希向量（本地、无模型），按“角色|技能”分区建进程内索引，
+# 最近邻余弦相似度 ≥ SEMANTIC_CACHE_THRESHOLD 时直接复用其回复。
+# 极性守卫：n-gram 向量对“应该/不应该”“高效/低效”这类一字之差几乎不敏感（相似度仍在 0.9 以上），
+# 所以命中前还要求两段输入里的否定词与反义词字完全一致，不一致就当未命中。
+# 误命中统计：按 SEMANTIC_CACHE_AUDIT_RATE 抽样，命中后后台照常生成一次，新旧回复相似度过低记为误命中。
+
+
+# 否定词，以及成对反义词里的字（出现次数不同即视为立场/方向可能相反）
+_POLARITY_CHARS = frozenset("不没无非别未莫勿否"
+                            "高低增减多少好坏大小上下快慢强弱升降涨跌长短优劣对错正反利弊益损胜负真假新旧赞支")
+_POLARITY_WORDS = re.compile(r"\b(?:not|no|never|without|cannot|dont|doesnt|isnt|arent|wont|cant|shouldnt)\b")
+
+
+def polarity_signature(text: str) -> Counter:
+    t = normalize_query(text)
+    sig = Counter(ch for ch in t if ch in _POLARITY_CHARS)
+    sig.update(_POLARITY_WORDS.findall(t))
+    return sig
+
+
+@dataclass
+class SemanticHit:
+    reply: str
+    sim: float
+    matched_text: str
+
+
+class SemanticIndex:
+    """
+    单个分区的向量索引：预分配按桶存储的 (dim, capacity) 矩阵，环形覆盖最旧条目。
+    查询向量是稀疏的（几十个非零桶），打分只取这些桶对应的连续行：sims = val @ M[idx, :n]，
+    每分区几百条时约百微秒，精确最近邻，不需要近似结构。
+    """
+
+    def __init__(self, dim: int, capacity: int):
+        self.dim = dim
+        self._vecs = np.zeros((dim, capacity), dtype=np.float32)   # 列 = 条目
+        self._texts: List[str] = [""] * capacity
+        self._replies: List[str] = [""] * capacity
+        self._ts = np.zeros(capacity, dtype=np.float64)
+        self._n = 0       # 已用条数
+        self._next = 0    # 下一个写入位置（满了之后覆盖最旧）
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _embed(self, text: str):
+        return hash_sparse(normalize_query(text), self.dim)
+
+    def search(self, text: str, ttl: float) -> Optional[SemanticHit]:
+        idx, val = self._embed(text)
+        if idx.size == 0:
+            return None
+        with self._lock:
+            if self._n == 0:
+                return None
+            sims = val @ self._vecs[idx, :self._n]
+            sims[time.time() - self._ts[:self._n] > ttl] = -1.0   # 过期条目不参与
+            i = int(np.argmax(sims))
+            return SemanticHit(self._replies[i], float(sims[i]), self._texts[i])
+
+    def add(self, text: str, reply: str) -> None:
+        idx, val = self._embed(text)
+        if idx.size == 0:
+            return
+        with self._lock:
+            i = self._next
+            self._vecs[:, i] = 0.0
+            self._vecs[idx, i] = val
+            self._texts[i], self._replies[i], self._ts[i] = text, reply, time.time()
+            self._next = (i + 1) % len(self._texts)
+            self._n = min(self._n + 1, len(self._texts))
+
+
+_indexes: Dict[str, SemanticIndex] = {}
+_lock = threading.Lock()
+_stats = {"lookups": 0, "hits": 0, "audits": 0, "false_hits": 0}
+_audit_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="semantic-audit")
+_audit_tasks: set = set()
+
+
+def semantic_namespace(role_name: str, skill: Optional[str], has_history: bool) -> Optional[str]:
+    """
+    返回分区名（"角色|技能"），该路径不参与语义缓存时返回 None。
+    普通对话（skill=None）的回复依赖历史，只在没有历史的首轮参与。
+    """
+    scope = skill or "default"
+    if not settings.SEMANTIC_CACHE_ENABLE or scope not in settings.SEMANTIC_CACHE_SCOPES:
+        return None
+    if skill is None and has_history:
+        return None
+    return f"{role_name}|{scope}"
+
+
+def _index(ns: str) -> SemanticIndex:
+    idx = _indexes.get(ns)
+    if idx is None:
+        with _lock:
+            idx = _indexes.setdefault(ns, SemanticIndex(settings.SEMANTIC_CACHE_DIM, settings.SEMANTIC_CACHE_MAX_ENTRIES))
+    return idx
+
+
+def semantic_lookup(ns: Optional[str], text: str) -> Optional[SemanticHit]:
+    if ns is None:
+        return None
+    hit = _index(ns).search(text, settings.SEMANTIC_CACHE_TTL_S)
+    ok = hit is not None and hit.sim >= settings.SEMANTIC_CACHE_THRESHOLD
+    refused = ok and polarity_signature(hit.matched_text) != polarity_signature(text)
+    ok = ok and not refused
+    _stats["lookups"] += 1
+    _stats["hits"] += ok
+    ev = {"event": "semantic_cache", "ns": ns, "hit": ok,
+          "sim": round(hit.sim, 4) if hit else None,
+          "matched_text": hit.matched_text if ok else None,
+          "hit_rate": round(_stats["hits"] / _stats["lookups"], 4)}
+    if refused:
+        ev["refused"] = "polarity"
+    write_log(settings.LOG_PATH, ev)
+    return hit if ok else None
+
+
+def semantic_store(ns: Optional[str], text: str, reply: str) -> None:
+    if ns is not None and reply:
+        _index(ns).add(text, reply)
+
+
+def reply_similarity(a: str, b: str) -> float:
+    ia, va = hash_sparse(normalize_query(a), settings.SEMANTIC_CACHE_DIM)
+    ib, vb = hash_sparse(normalize_query(b), settings.SEMANTIC_CACHE_DIM)
+    common, pa, pb = np.intersect1d(ia, ib, assume_unique=True, return_indices=True)
+    return float(va[pa] @ vb[pb]) if common.size else 0.0
+
+
+def _should_audit(hit: SemanticHit, text: str) -> bool:
+    # 完全相同（归一化后）的输入不会误命中，不必审计
+    return (normalize_query(hit.matched_text) != normalize_query(text)
+            and random.random() < settings.SEMANTIC_CACHE_AUDIT_RATE)
+
+
+def _record_audit(ns: str, text: str, hit: SemanticHit, fresh: str) -> None:
+    sim = reply_similarity(hit.reply, fresh)
+    false_hit = sim < settings.SEMANTIC_CACHE_AUDIT_MIN_SIM
+    _stats["audits"] += 1
+    _stats["false_hits"] += false_hit
+    write_log(settings.LOG_PATH, {"event": "semantic_cache_audit", "ns": ns, "user_text": text,
+                                  "matched_text": hit.matched_text, "query_sim": round(hit.sim, 4),
+                                  "reply_sim": round(sim, 4), "false_hit": false_hit,
+                                  "false_hit_rate": round(_stats["false_hits"] / _stats["audits"], 4)})
+
+
+def maybe_audit(ns: str, text: str, hit: SemanticHit, regenerate: Callable[[], str]) -> None:
+    """抽样审计（同步管线）：后台线程重新生成并比较，不阻塞本轮回复。"""
+    if not _should_audit(hit, text):
+        return
+
+    def _run():
+        try:
+            _record_audit(ns, text, hit, regenerate())
+        except Exception as e:
+            write_log(settings.LOG_PATH, {"event": "semantic_cache_audit_error", "ns": ns, "error": str(e)[:300]})
+
+    _audit_pool.submit(_run)
+
+
+def amaybe_audit(ns: str, text: str, hit: SemanticHit, regenerate: Callable[[], Awaitable[str]]) -> None:
+    """抽样审计（异步管线）：在当前 loop 上起后台任务。"""
+    if not _should_audit(hit, text):
+        return
+
+    async def _run():
+        try:
+            _record_audit(ns, text, hit, await regenerate())
+        except Exception as e:
+            write_log(settings.LOG_PATH, {"event": "semantic_cache_audit_error", "ns": ns, "error": str(e)[:300]})
+
+    task = asyncio.get_running_loop().create_task(_run())
+    _audit_tasks.add(task)               # 持有引用，防止任务被回收
+    task.add_done_callback(_audit_tasks.discard)
@@ -2,6 +2,8 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import List, Optional
+from config import settings
+from utils.textproc import message_tokens, truncate_messages_by_rounds, truncate_messages_by_tokens
 from .types import Message
 
 @dataclass
@@ -9,6 +11,10 @@ class SessionState:
     session_id: str
     messages: List[Message] = field(default_factory=list)  # 只存最近N轮（user/assistant）
     last_skill: Optional[str] = None
+    summary: str = ""                                     # 更早轮次的滚动摘要（core/memory.py 后台维护）
+    evicted: List[Message] = field(default_factory=list)   # 已移出窗口、等待折叠进摘要的消息
+    compacting: bool = False
+    generation: int = 0                                    # reset_session 递增；进行中的折叠据此丢弃过期结果
 
     @property
     def history(self):
@@ -18,29 +24,45 @@ class SessionState:
 def append_turn(state: SessionState, user_msg: Message, assistant_msg: Message, max_rounds: int = 8) -> SessionState:
     state.messages.append(user_msg)
     state.messages.append(assistant_msg)
+    # 增量计 token：只算新进来的两条，结果缓存在 meta 上
+    message_tokens(user_msg)
+    message_tokens(assistant_msg)
     # 只保留最近 n 轮（user+assistant 为一轮，故 *2）
     keep = 2 * max_rounds
     if len(state.messages) > keep:
+        if settings.SUMMARY_ENABLE:
+            state.evicted.extend(state.messages[:-keep])   # 交给摘要器折叠，而不是直接丢弃
         state.messages = state.messages[-keep:]
     return state
 
 
-def get_recent_messages(state, max_rounds: int):
+def history_store_rounds(max_rounds: int) -> int:
+    """会话里保留的轮数：按 token 预算选历史时多存一些，短对话可以装进更多轮。"""
+    if settings.HISTORY_TOKEN_BUDGET > 0:
+        return max(max_rounds, settings.HISTORY_STORE_ROUNDS)
+    return max_rounds
+
+
+def get_recent_messages(state, max_rounds: int, token_budget: Optional[int] = None):
     """
     兼容 v02/v03/v04：优先 messages，其次 turns，最终空列表。
-    每轮对话约 2 条（user+assistant）。
+    token_budget > 0 时按 token 预算从新到旧整轮装入；否则保留最近 max_rounds 轮（每轮 user+assistant 2 条）。
     """
     msgs = getattr(state, "messages", None)
     if msgs is None:
         msgs = getattr(state, "turns", None)
     if msgs is None:
         return []
-    try:
-        return msgs[-2 * max_rounds :]
-    except Exception:
-        return list(msgs)[-2 * max_rounds :]
+    if token_budget and token_budget > 0:
+        return truncate_messages_by_tokens(msgs, token_budget)
+    return truncate_messages_by_rounds(msgs, max_rounds)
 
 def reset_session(state: SessionState) -> SessionState:
-    state.messages.clear()
-    state.last_skill = None
+    from .memory import _lock   # 与后台折叠互斥（memory 依赖本模块，故延迟导入）
+    with _lock:
+        state.generation += 1
+        state.messages.clear()
+        state.last_skill = None
+        state.summary = ""
+        state.evicted.clear()
     return state
@@ -1,17 +1,15 @@
 # main.py
 from __future__ import annotations
-import os, io, uuid
+import os, io, uuid, time
 import gradio as gr
-from clients.llm_client import LLMClient
+from clients.registry import get_llm_client, get_tts_client, get_asr_client
 from core.state import SessionState, reset_session, append_turn 
 from core.types import RoleConfig, Message
 from core.roles import load_all_roles
 import json
 import numpy as np
-from core.pipeline import respond, respond_voice
-from core.pipeline import voice_sentence_loop, assemble_messages, build_system_prompt
-from clients.asr_ws_client import ASRWsClient                          
-from clients.tts_client import TTSClient         
+from core.pipeline import arespond, arespond_voice, arespond_stream
+from core.pipeline import avoice_sentence_loop, avoice_stream_loop, avoice_reply_stream, assemble_messages, build_system_prompt, precompile_prompts
 from config import settings
 import traceback
 
@@ -34,41 +32,42 @@ SKILL_LABELS = {
 
 # === 加载角色配置===
 ROLES_CACHE = load_all_roles()
+# 各角色 / 技能的 system prompt 启动时编译一次，之后每轮逐字节复用（利于服务端前缀缓存）
+precompile_prompts(ROLES_CACHE.values())
 
 def load_role_config(name: str) -> RoleConfig:
     return ROLES_CACHE.get(name, list(ROLES_CACHE.values())[0])
 
+def _route_debug_md(rd) -> str:
+    if not rd:
+        return "—"
+    # 如果 classify 返回了分布，也显示
+    cls = rd.get("classify")
+    if isinstance(cls, dict) and "confidence_map" in cls:
+        rd_pretty = {
+            "rule_hit": rd.get("rule_hit"),
+            "rule_name": rd.get("rule_name"),
+            "best_skill": cls.get("skill"),
+            "best_confidence": cls.get("confidence"),
+            "confidence_map": cls.get("confidence_map"),
+            "_raw_len": len(str(cls.get("_debug", {}).get("raw", "")))
+        }
+        return "### 路由调试\n```json\n" + json.dumps(rd_pretty, ensure_ascii=False, indent=2) + "\n```"
+    return "### 路由调试\n```json\n" + json.dumps(rd, ensure_ascii=False, indent=2) + "\n```"
+
 # === 回调：文本输入 ===
-def on_user_submit_text(user_text: str,
+async def on_user_submit_text(user_text: str,
                         session: SessionState,
                         role_name: str,
-                        llm: LLMClient,
                         debug_on: bool):
     try:
         role = load_role_config(role_name)
-        turn = respond(user_text=user_text, state=session, role=role, llm_client=llm)
+        turn = await arespond(user_text=user_text, state=session, role=role, llm_client=get_llm_client())
         chat_pair = [(user_text, turn.reply_text)]
         label = SKILL_LABELS.get(turn.skill) if turn.skill else None
         skill_tag = f"🧠 已触发：`{label}`" if label else "—"
 
-        debug_md = "—"
-        if debug_on:
-            rd = turn.data.get("route_debug")
-            if rd:
-                # 如果 classify 返回了分布，也显示
-                cls = rd.get("classify")
-                if isinstance(cls, dict) and "confidence_map" in cls:
-                    rd_pretty = {
-                        "rule_hit": rd.get("rule_hit"),
-                        "rule_name": rd.get("rule_name"),
-                        "best_skill": cls.get("skill"),
-                        "best_confidence": cls.get("confidence"),
-                        "confidence_map": cls.get("confidence_map"),
-                        "_raw_len": len(str(cls.get("_debug", {}).get("raw", "")))
-                    }
-                    debug_md = "### 路由调试\n```json\n" + json.dumps(rd_pretty, ensure_ascii=False, indent=2) + "\n```"
-                else:
-                    debug_md = "### 路由调试\n```json\n" + json.dumps(rd, ensure_ascii=False, indent=2) + "\n```"
+        debug_md = _route_debug_md(turn.data.get("route_debug")) if debug_on else "—"
 
         return chat_pair, skill_tag, debug_md, session
     except Exception:
@@ -76,14 +75,13 @@ def on_user_submit_text(user_text: str,
         return [(user_text, "抱歉，内部出现错误，正在修复。")], "—", "—", session
 
 
-def on_user_submit_text_stream(user_text: str,
+async def on_user_submit_text_stream(user_text: str,
                                session: SessionState,
                                role_name: str,
-                               llm: LLMClient,
                                debug_on: bool,
                                chatbot_hist: list[tuple[str, str]]):
     """
-    真·流式：分片直刷
+    真·流式：路由后分片直刷（普通对话与技能都走流式）
     """
     try:
         if not isinstance(chatbot_hist, list):
@@ -94,18 +92,26 @@ def on_user_submit_text_stream(user_text: str,
         yield ui_msgs, "—", "—", session
 
         role = load_role_config(role_name)
-        history = session.messages if hasattr(session, "messages") else []
-        msgs = assemble_messages(build_system_prompt(role), history, user_text)
+        skill_tag, debug_md = "—", "—"
 
+        # 先路由（规则/分类），再从普通对话或技能逐片直刷
         buf = []
-        for piece in llm.complete_chunks(msgs, max_tokens=settings.MAX_TOKENS_RESPONSE):
-            buf.append(piece)
-            ui_msgs[-1] = (user_text, "".join(buf))
-            yield ui_msgs, "—", "—", session
-
-        # 完成后把这一轮写回 state（用 append_turn）
-        append_turn(session, Message(role="user", content=user_text), Message(role="assistant", content="".join(buf)), settings.MAX_ROUNDS)
-        yield ui_msgs, "—", "—", session
+        async for ev in arespond_stream(user_text=user_text, state=session, role=role, llm_client=get_llm_client()):
+            kind = ev.get("kind")
+            if kind == "route":
+                label = SKILL_LABELS.get(ev.get("skill")) if ev.get("skill") else None
+                skill_tag = f"🧠 已触发：`{label}`" if label else "—"
+                if debug_on:
+                    debug_md = _route_debug_md(ev.get("route_debug"))
+                yield ui_msgs, skill_tag, debug_md, session
+            elif kind == "delta":
+                buf.append(ev.get("text", ""))
+                ui_msgs[-1] = (user_text, "".join(buf))
+                yield ui_msgs, skill_tag, debug_md, session
+            elif kind == "done":
+                # respond_stream 已把这一轮写回 state（append_turn）
+                ui_msgs[-1] = (user_text, ev["turn"].reply_text)
+                yield ui_msgs, skill_tag, debug_md, session
 
     except Exception:
         traceback.print_exc()
@@ -121,7 +127,7 @@ def on_reset(session: SessionState):
     return session
 
 # 语音处理
-def on_user_submit_audio(audio_tuple, session: SessionState, role_name: str, llm: LLMClient,
+async def on_user_submit_audio(audio_tuple, session: SessionState, role_name: str,
                          debug_on: bool, use_custom_voice: bool, custom_voice: str, custom_speed: float):
     try:
         if audio_tuple is None:
@@ -137,8 +143,8 @@ def on_user_submit_audio(audio_tuple, session: SessionState, role_name: str, llm
         ov = custom_voice if (use_custom_voice and custom_voice) else None
         ospeed = custom_speed if use_custom_voice else None
 
-        turn = respond_voice(audio_np=audio_np, sample_rate=sr, state=session,
-                             role=role, llm_client=llm, override_voice=ov, override_speed=ospeed)
+        turn = await arespond_voice(audio_np=audio_np, sample_rate=sr, state=session,
+                                   role=role, llm_client=get_llm_client(), override_voice=ov, override_speed=ospeed)
 
         chat_pair = [("🎤(语音)", turn.reply_text)]
         label = SKILL_LABELS.get(turn.skill) if turn.skill else None
@@ -164,17 +170,16 @@ def on_user_submit_audio(audio_tuple, session: SessionState, role_name: str, llm
 
 
 # “生成器式”的语音回调
-def on_user_submit_audio_stream(audio_tuple,
+async def on_user_submit_audio_stream(audio_tuple,
                                 chatbot_cur: list,
                                 session: SessionState,
                                 role_name: str,
-                                llm: LLMClient,
                                 debug_on: bool,
                                 use_custom_voice: bool,
                                 custom_voice: str,
                                 custom_speed: float):
     """
-    生成器：一次录音 => 句级快速反馈。
+    异步生成器：一次录音 => 句级快速反馈。
     每次 yield 更新：Chatbot(累积)、技能标签、调试面板、Audio(单句path)、Status、Session
     """
 
@@ -197,6 +202,80 @@ def on_user_submit_audio_stream(audio_tuple,
         audio_np = audio_np / max(1.0, maxv)
 
     # 角色 + 会话级音色覆盖
+    role = _role_with_voice(role_name, use_custom_voice, custom_voice, custom_speed)
+
+    # 客户端：进程级共享实例（HTTP 连接池 / ASR 预连接池跨会话复用）
+    asr = get_asr_client()
+    tts = get_tts_client()
+
+    # UI端累积对话,从已有历史开始
+    ui_msgs = list(chatbot_cur or [])
+
+    # 逐句生成：ASR → 切句 → 短答 → TTS → yield（流式模式：LLM 边生成边断句送 TTS）
+    loop_fn = avoice_stream_loop if settings.VOICE_STREAMING else avoice_sentence_loop
+    gen = loop_fn(audio_np=audio_np,
+                  sample_rate=sr,
+                  state=session,
+                  role=role,
+                  llm_client=get_llm_client(),
+                  asr_client=asr,
+                  tts_client=tts)
+
+    async for step in gen:
+        audio_path = _merge_voice_step(ui_msgs, step)
+        yield ui_msgs, audio_path, step.get("status", ""), step.get("skill_label", "—"), session
+
+
+# 麦克风流式采集：录音过程中每 ASR_STREAM_EVERY_S 秒回调一次，音频边录边送 ASR
+def on_mic_stream_chunk(chunk, asr_stream):
+    """
+    流式分片回调：chunk 为本次新增的 (sr, np.ndarray)；ASRStream 存在 gr.State 中跨回调复用。
+    返回 (asr_stream, status)
+    """
+    if chunk is None:
+        return asr_stream, gr.update()
+    sr, audio_np = chunk
+    if audio_np.dtype == np.int16:
+        # 分片不能按自身峰值归一化（各片增益不一致），按 int16 满量程换算
+        audio_np = audio_np.astype(np.float32) / 32768.0
+    if asr_stream is None:
+        asr_stream = get_asr_client().open_stream()
+    ended = asr_stream.push(audio_np, sr)
+    if ended:
+        return asr_stream, "✅ 检测到说话结束，可以停止录音"
+    partial = asr_stream.partial
+    return asr_stream, (f"👂 {partial}" if partial else "🎙️ 正在聆听...")
+
+
+async def on_mic_stream_stop(asr_stream,
+                       chatbot_cur: list,
+                       session: SessionState,
+                       role_name: str,
+                       use_custom_voice: bool,
+                       custom_voice: str,
+                       custom_speed: float):
+    """
+    停止录音：收尾流式识别（大部分音频已在录音期间识别完），随即进入 LLM 流式 + 边断句边TTS。
+    每次 yield 更新：Chatbot、Audio(单句path)、Status、技能标签、Session、ASRStream(State)
+    """
+    if asr_stream is None:
+        yield gr.update(), None, "❗未接收音频", "—", session, None
+        return
+
+    role = _role_with_voice(role_name, use_custom_voice, custom_voice, custom_speed)
+    ui_msgs = list(chatbot_cur or [])
+
+    asr_t0 = time.time()
+    asr_res = await asr_stream.afinish()
+    asr_ms = int((time.time() - asr_t0) * 1000)
+
+    async for step in avoice_reply_stream(asr_res, session, role, get_llm_client(), get_tts_client(), asr_ms=asr_ms):
+        audio_path = _merge_voice_step(ui_msgs, step)
+        yield ui_msgs, audio_path, step.get("status", ""), step.get("skill_label", "—"), session, None
+
+
+def _role_with_voice(role_name: str, use_custom_voice: bool, custom_voice: str, custom_speed: float):
+    """加载角色配置，并套用会话级音色覆盖。"""
     role = load_role_config(role_name)
     if use_custom_voice:
         tts_pref = getattr(role, "tts", {}) or {}
@@ -205,52 +284,35 @@ def on_user_submit_audio_stream(audio_tuple,
         if custom_speed:
             tts_pref["speed_ratio"] = float(custom_speed)
         setattr(role, "tts", tts_pref)
-
-    # 客户端
-    asr = ASRWsClient()
-    tts = TTSClient()
-
-    # UI端累积对话,从已有历史开始
-    ui_msgs = list(chatbot_cur or [])
-
-    # 逐句生成：ASR → 切句 → 短答 → TTS → yield
-    gen = voice_sentence_loop(audio_np=audio_np,
-                              sample_rate=sr,
-                              state=session,
-                              role=role,
-                              llm_client=llm,
-                              asr_client=asr,
-                              tts_client=tts)
-
-    for step in gen:
-        for who, txt in step.get("chat_add", []):
-            if who == "user":
-                # 若最后一条是“未配对”的用户占位，则覆盖；否则追加
-                if ui_msgs and ui_msgs[-1][0] is not None and ui_msgs[-1][1] is None:
-                    ui_msgs[-1] = (txt, None)
-                else:
-                    ui_msgs.append((txt, None))
-            elif who == "assistant":
-                if ui_msgs and ui_msgs[-1][0] is not None and ui_msgs[-1][1] is None:
-                    ui_msgs[-1] = (ui_msgs[-1][0], txt)
-                else:
-                    ui_msgs.append((None, txt))
-
-        # 生成 HTML 自动播（如果本步有音频文件）
-        audio_path = step.get("audio_path")
-        if audio_path:
-            # 注意转正斜杠
-            src = str(audio_path).replace("\\", "/")
-            # # 方案B：直接HTML自动播，隐藏控件
-            # audio_html = f"""<audio src="{src}" autoplay playsinline style="display:none"></audio>"""
-
-        yield ui_msgs, audio_path, step.get("status", ""), step.get("skill_label", "—"), session
+    return role
+
+
+def _merge_voice_step(ui_msgs: list, step: dict):
+    """把语音循环的一步合并进 UI 对话列表（原地修改），返回本步的音频路径。"""
+    for who, txt in step.get("chat_add", []):
+        if who == "user":
+            # 若最后一条是“未配对”的用户占位，则覆盖；否则追加
+            if ui_msgs and ui_msgs[-1][0] is not None and ui_msgs[-1][1] is None:
+                ui_msgs[-1] = (txt, None)
+            else:
+                ui_msgs.append((txt, None))
+        elif who == "assistant":
+            if ui_msgs and ui_msgs[-1][0] is not None and ui_msgs[-1][1] is None:
+                ui_msgs[-1] = (ui_msgs[-1][0], txt)
+            else:
+                ui_msgs.append((None, txt))
+
+    # 流式模式：助手气泡随断句累积刷新
+    reply_so_far = step.get("reply_so_far")
+    if reply_so_far and ui_msgs:
+        ui_msgs[-1] = (ui_msgs[-1][0], reply_so_far)
+
+    return step.get("audio_path")
 
     
 def _load_voices():
     try:
-        tts = TTSClient()
-        items = tts.list_voices()
+        items = get_tts_client().list_voices()
         labels, mapping = [], {}
         for it in items:
             vt = it.get("voice_type") or ""
@@ -281,6 +343,12 @@ THEME = gr.themes.Soft(primary_hue="blue", secondary_hue="cyan")  # 中性不压
 
 # === 组装 UI ===
 def build_ui():
+    # 预建 ASR WebSocket 热连接（后台常驻 loop），首个语音轮次免握手
+    if settings.ENABLE_ASR and settings.ASR_TRANSPORT == "ws":
+        get_asr_client().warmup()
+    # 麦克风流式采集依赖 WS 全双工会话；HTTP 传输下退回“录完整段再识别”
+    stream_capture = settings.ASR_STREAMING_CAPTURE and settings.ASR_TRANSPORT == "ws"
+
     with gr.Blocks(title="Voicery · 思辨训练营", theme=THEME, css=CUSTOM_CSS) as demo:
         # 顶部：左标题 + 右上“用户信息”
         with gr.Row():
@@ -291,9 +359,8 @@ def build_ui():
                 gr.Markdown("### 👤  匿名用户 ")
 
 
-        # 全局状态：会话 + LLM 客户端（持久化在 Gradio 的 State 里）
+        # 全局状态：会话（持久化在 Gradio 的 State 里）；上游客户端为进程级共享实例，见 clients/registry.py
         session_state = gr.State(SessionState(session_id=str(uuid.uuid4())))
-        llm_client = gr.State(LLMClient())   # 使用 .env/settings.py 配好的 API/模型
         drawer_visible = gr.State(False)
 
         with gr.Row():
@@ -308,6 +375,7 @@ def build_ui():
                 reset_btn = gr.Button("重置会话", variant="secondary")
 
         voices_map = gr.State({})
+        asr_stream_state = gr.State(None)   # 流式采集时的 ASRStream（每次录音一个）
 
         # 中间主体：左“聊天框（含角标）” + 右“抽屉”（默认隐藏）
         with gr.Row():
@@ -337,7 +405,9 @@ def build_ui():
                                     placeholder="输入文字，或点右侧 🎙️ 说话…", lines=3)
                 send_btn = gr.Button("发送", variant="primary", elem_id="send_btn")
             with gr.Column(scale=2):
-                mic = gr.Audio(sources=["microphone"], type="numpy", label=None, show_label=False, visible=True)
+                # 流式采集：录音期间分片送 ASR；否则录完整段回调
+                mic = gr.Audio(sources=["microphone"], type="numpy", label=None, show_label=False, visible=True,
+                               streaming=stream_capture)
             with gr.Column(scale=1):
                 with gr.Row():
                     re_record_btn = gr.Button("🔁 重录", variant="secondary", elem_id="mic_btn")
@@ -393,16 +463,30 @@ def build_ui():
             outputs=[mic, audio_out, status_badge, skill_badge]
         )
 
-        mic.change(
-            fn=on_user_submit_audio_stream,
-            inputs=[mic, chatbot, session_state, role_dd, llm_client, debug_ck, use_custom_voice, custom_voice, custom_speed],
-            outputs=[chatbot, audio_out, status_badge, skill_badge, session_state]   # ← 注意：输出目标变了
-        )
+        if stream_capture:
+            mic.stream(
+                fn=on_mic_stream_chunk,
+                inputs=[mic, asr_stream_state],
+                outputs=[asr_stream_state, status_badge],
+                stream_every=settings.ASR_STREAM_EVERY_S,
+                show_progress="hidden"
+            )
+            mic.stop_recording(
+                fn=on_mic_stream_stop,
+                inputs=[asr_stream_state, chatbot, session_state, role_dd, use_custom_voice, custom_voice, custom_speed],
+                outputs=[chatbot, audio_out, status_badge, skill_badge, session_state, asr_stream_state]
+            )
+        else:
+            mic.change(
+                fn=on_user_submit_audio_stream,
+                inputs=[mic, chatbot, session_state, role_dd, debug_ck, use_custom_voice, custom_voice, custom_speed],
+                outputs=[chatbot, audio_out, status_badge, skill_badge, session_state]   # ← 注意：输出目标变了
+            )
 
         # 文本事件
         send_btn.click(
             fn=on_user_submit_text_stream,
-            inputs=[txt_in, session_state, role_dd, llm_client, debug_ck, chatbot],
+            inputs=[txt_in, session_state, role_dd, debug_ck, chatbot],
             outputs=[chatbot, skill_badge, debug_panel, session_state]   # 技能徽标=skill_badge
         ).then(lambda: "", None, txt_in)# 发送后清空输入框
         
@@ -413,6 +497,8 @@ def build_ui():
 
         stop_btn.click(_stop_play, outputs=[audio_out, status_badge])
 
+    # 回调均为协程：等待上游时不占线程，放宽每个事件的并发上限
+    demo.queue(default_concurrency_limit=settings.UI_CONCURRENCY_LIMIT)
     demo.launch(show_api=False)   # “通过 API 使用”不显示；其它通过 CSS 已隐藏
 
 if __name__ == "__main__":
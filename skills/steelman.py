@@ -1,7 +1,11 @@
 # skills/steelman.py
 from __future__ import annotations
 from typing import List
-from core.types import SkillResult, RoleConfig, Message
+from core.types import RoleConfig, Message
+
+NAME = "steelman"
+DISPLAY_TAG = "强化论证（Steelman）"
+MAX_TOKENS = 450
 
 def _style_hint(role: RoleConfig) -> str:
     hints = []
@@ -10,27 +14,18 @@ def _style_hint(role: RoleConfig) -> str:
     if role.catchphrases: hints.append(f"可酌情用其口头禅开场：{role.catchphrases[0]}")
     return "；".join(hints)
 
-def run(user_text: str, role: RoleConfig, history: List[Message], llm_client) -> SkillResult:
-    sys = (
-        "你是“强化论证（Steelman）”教练。用中文，帮用户把观点强化到“最强版本”。"
-        "输出严格三段：\n"
-        "【立场（最强表述）】：\n"
-        "【关键论据（3-4条）】：\n"
-        "【潜在反驳与预案（2-3条）】：\n"
-        "要求：精准、克制、可执行。"
-    )
-    sys = sys + " " + _style_hint(role)
+SYSTEM_PROMPT = (
+    "你是“强化论证（Steelman）”教练。用中文，帮用户把观点强化到“最强版本”。"
+    "输出严格三段：\n"
+    "【立场（最强表述）】：\n"
+    "【关键论据（3-4条）】：\n"
+    "【潜在反驳与预案（2-3条）】：\n"
+    "要求：精准、克制、可执行。"
+)
+
+def build_messages(user_text: str, role: RoleConfig, history: List[Message]) -> List[Message]:
     msgs = [
-        Message(role="system", content=sys),
         Message(role="user", content=f"待强化的观点/命题：{user_text}")
     ]
-    reply = llm_client.complete(msgs, max_tokens=450)
-    return SkillResult(
-        name="steelman",
-        display_tag="强化论证（Steelman）",
-        reply_text=reply,
-        data={}
-    )
-
-
+    return msgs
 
@@ -0,0 +1,54 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config import settings
+from clients.asr_cache import asr_cache_get, asr_cache_put
+
+
+def test_put_skips_failures_and_truncated_ws(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+    monkeypatch.setattr(settings, "CACHE_ASR_DIR", str(tmp_path / "asr"))
+    asr_cache_put("a", "（ASR请求失败）", {"transport": "ws", "error": "boom"})
+    asr_cache_put("b", "今天天气", {"transport": "ws", "last_pkg": False})   # 空闲超时提前结束，可能截断
+    asr_cache_put("c", "今天天气不错", {"transport": "ws", "last_pkg": True})
+    asr_cache_put("d", "识别结果", {"transport": "http"})
+    assert [asr_cache_get(k, "ws") for k in "abcd"] == [None, None, "今天天气不错", "识别结果"]
+
+
+def test_session_reader_error_wakes_finish(tmp_path, monkeypatch):
+    import asyncio, json, time
+    from clients.asr_ws_client import _AsrSession
+
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+
+    class _BadWs:
+        async def send(self, data):
+            pass
+
+        async def recv(self):
+            raise ValueError("bad frame header")
+
+    async def _go():
+        sess = _AsrSession(_BadWs(), 16000)
+        sess._reader = asyncio.ensure_future(sess._read())
+        await asyncio.sleep(0)
+        t0 = time.time()
+        text = await sess.finish()
+        return sess, text, time.time() - t0
+
+    sess, text, took = asyncio.run(_go())
+    assert text == "" and not sess.got_last and "bad frame header" in sess.error
+    assert took < 0.2
+    events = [json.loads(l)["event"] for l in open(settings.LOG_PATH, encoding="utf-8")]
+    assert "asr_ws_read_error" in events
+
+
+def test_session_idle_cutoff_follows_partials():
+    from clients.asr_ws_client import _AsrSession
+
+    sess = _AsrSession(None, 16000)
+    assert sess._idle_cutoff(0.8) is None              # 尚无识别文本：不按空闲截断
+    sess.n_partial, sess._n_rx, sess._first_rx, sess._last_rx = 3, 4, 100.0, 106.0
+    assert sess._idle_cutoff(0.8) == 4.0               # 平均帧间隔 2s → 截断放宽到 4s
+    sess._last_rx = 100.6
+    assert sess._idle_cutoff(0.8) == 0.8
@@ -0,0 +1,111 @@
+import sys, os, asyncio
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config import settings
+from core.pipeline import avoice_reply_stream, arespond_stream, arespond_short
+from core.state import SessionState
+from core.types import RoleConfig
+from clients.tts_client import TTSResult
+
+ROLE = RoleConfig(name="r", style="s")
+
+
+class _ASR:
+    text, meta = "你好", {}
+
+
+class _LLM:
+    async def acomplete_chunks(self, msgs, max_tokens=512):
+        for ch in "今天天气真不错，我们可以一起去公园散步聊聊天。然后再去吃点好吃的东西吧，你觉得怎么样呢？":
+            await asyncio.sleep(0)
+            yield ch
+
+    async def aclassify(self, text, candidates=None):
+        return {"skill": "none", "confidence": 1.0}
+
+
+class _TTS:
+    def __init__(self):
+        self.calls = []
+
+    async def asynthesize(self, text, voice_type=None, speed_ratio=None):
+        self.calls.append(text)
+        await asyncio.sleep(0.01)
+        return TTSResult(f"/tmp/{len(self.calls)}.wav", None, {})
+
+
+async def _collect(agen):
+    return [x async for x in agen]
+
+
+def test_avoice_reply_stream_emits_audio_in_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+    state, tts = SessionState("t"), _TTS()
+    steps = asyncio.run(_collect(avoice_reply_stream(_ASR(), state, ROLE, _LLM(), tts)))
+    audio = [s["audio_path"] for s in steps if s.get("audio_path")]
+    assert audio == [f"/tmp/{i}.wav" for i in range(1, len(tts.calls) + 1)]
+    assert len(tts.calls) >= 2
+    assert [m.role for m in state.messages] == ["user", "assistant"]
+
+
+def test_arespond_stream_events(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+    state = SessionState("t")
+    evs = asyncio.run(_collect(arespond_stream("随便聊聊", state, ROLE, _LLM())))
+    assert evs[0]["kind"] == "route" and evs[0]["skill"] is None
+    assert evs[-1]["kind"] == "done"
+    assert evs[-1]["turn"].reply_text == "".join(e["text"] for e in evs if e["kind"] == "delta")
+    assert len(state.messages) == 2
+
+
+class _SpecLLM(_LLM):
+    def __init__(self, skill):
+        self.skill, self.closed = skill, 0
+
+    async def aclassify(self, text, candidates=None):
+        await asyncio.sleep(0.02)
+        return {"skill": self.skill, "confidence": 0.9}
+
+    async def acomplete_chunks(self, msgs, max_tokens=512):
+        try:
+            async for ch in super().acomplete_chunks(msgs, max_tokens):
+                yield ch
+        finally:
+            self.closed += 1
+
+
+def test_speculative_routing_keeps_or_cancels(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+    monkeypatch.setattr(settings, "SPECULATIVE_ROUTING", True)
+    monkeypatch.setattr(settings, "CLASSIFY_CACHE_ENABLE", False)   # 同一句话两次分类结果不同
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLE", False)
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLE", False)
+    for skill, expect in (("none", "kept"), ("steelman", "cancelled")):
+        llm = _SpecLLM(skill)
+        evs = asyncio.run(_collect(arespond_stream("随便聊聊", SessionState("t"), ROLE, llm)))
+        assert evs[0]["route_debug"]["speculative"] == expect
+        assert evs[-1]["turn"].skill == (None if skill == "none" else skill)
+        # 推测流（以及技能流）都已关闭，不残留在途请求
+        assert llm.closed == (1 if skill == "none" else 2)
+
+
+def test_short_reply_capped_closes_upstream(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+    monkeypatch.setattr(settings, "MAX_REPLY_CHARS_VOICE", 20)
+
+    class _Counting(_LLM):
+        pulled, closed = 0, False
+
+        async def acomplete_chunks(self, msgs, max_tokens=512):
+            try:
+                async for ch in super().acomplete_chunks(msgs, max_tokens):
+                    self.pulled += 1
+                    yield ch
+            finally:
+                self.closed = True
+
+    llm, state = _Counting(), SessionState("t")
+    turn = asyncio.run(arespond_short("你好", state, ROLE, llm))
+    assert turn.reply_text == "今天天气真不错，"              # 首句超过上限：退到逗号处截断
+    assert llm.closed and llm.pulled <= 21                    # 到上限即断开，不读完整段
+    assert state.messages[-1].content == turn.reply_text
@@ -0,0 +1,133 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import numpy as np
+from tools.bench_audio import legacy_rms_dbfs, legacy_stereo_to_mono, legacy_trim_silence
+from utils.audio import rms_dbfs, stereo_to_mono, trim_silence, Resampler, resample, vad_trim, Endpointer
+from utils.cache import audio_fingerprint
+
+
+def _pcm(seed=0, sr=8000):
+    rnd = np.random.default_rng(seed)
+    x = np.zeros(sr * 2, dtype=np.int16)
+    x[3000:9000] = (rnd.standard_normal(6000) * 4000).astype(np.int16)   # 中间一段“语音”
+    x[:3000] = (rnd.standard_normal(3000) * 3).astype(np.int16)          # 底噪
+    return x.tobytes(), sr
+
+
+def test_rms_matches_legacy():
+    pcm, _ = _pcm()
+    assert abs(rms_dbfs(pcm) - legacy_rms_dbfs(pcm)) < 1e-9
+    assert rms_dbfs(b"") == float("-inf")
+    assert rms_dbfs(np.zeros(100, np.int16).tobytes()) == float("-inf")
+
+
+def test_stereo_to_mono_matches_legacy():
+    x = np.array([3, -3, -5, 2, 32767, 32767, -32768, -32767, 7], dtype=np.int16)
+    assert stereo_to_mono(x.tobytes()) == legacy_stereo_to_mono(x.tobytes())
+
+
+def test_trim_matches_legacy():
+    pcm, sr = _pcm()
+    for n in (len(pcm), len(pcm) - 2 * 37):   # 样本数整除 / 不整除窗口长度
+        for thr, win, pad in ((-45.0, 30, 60), (-30.0, 7, 0), (-10.0, 30, 60)):
+            got = trim_silence(pcm[:n], sr, thr, win, pad)
+            assert got == legacy_trim_silence(pcm[:n], sr, thr, win, pad)
+    silent = np.zeros(sr, np.int16).tobytes()
+    assert trim_silence(silent, sr, -45.0, 30, 60) == silent
+
+
+def _tone(freq, sr, sec=1.0):
+    t = np.arange(int(sr * sec)) / sr
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def test_resample_tone_and_length():
+    for sr_in, sr_out in ((48000, 16000), (44100, 16000), (16000, 24000)):
+        x = _tone(440, sr_in)
+        y = resample(x, sr_in, sr_out)
+        assert len(y) == -(-len(x) * sr_out // sr_in)
+        ref = 0.5 * np.sin(2 * np.pi * 440 * np.arange(len(y)) / sr_out)
+        mid = slice(sr_out // 10, -sr_out // 10)
+        assert np.max(np.abs(y[mid] - ref[mid])) < 1e-3
+
+
+def test_resample_rejects_aliasing():
+    # 高于目标 Nyquist 的音调应被滤掉，而不是折叠回通带
+    y = resample(_tone(10000, 48000), 48000, 16000)
+    assert np.sqrt(np.mean(y[1600:-1600] ** 2)) < 1e-3
+
+
+def test_resampler_chunked_equals_oneshot():
+    x = _tone(300, 44100) + _tone(3000, 44100)
+    rs, parts, i = Resampler(44100, 16000), [], 0
+    rnd = np.random.default_rng(0)
+    while i < len(x):
+        k = int(rnd.integers(1, 3000))
+        parts.append(rs.process(x[i:i + k]))
+        i += k
+    parts.append(rs.flush())
+    assert np.allclose(np.concatenate(parts), resample(x, 44100, 16000), atol=1e-6)
+
+
+def test_vad_trims_and_rejects_silence():
+    sr, rnd = 16000, np.random.default_rng(0)
+    noise = (rnd.standard_normal(sr * 4) * 0.002).astype(np.float32)
+    x = noise.copy()
+    x[sr:2 * sr] += _tone(200, sr)
+    y, info = vad_trim(x, sr, pad_ms=200)
+    assert info["vad"] == "speech"
+    assert 1.0 <= len(y) / sr <= 1.5
+    assert info["trimmed_ms"] == info["in_ms"] - info["out_ms"]
+
+    _, info = vad_trim(noise, sr)
+    assert info["vad"] == "silent" and info["out_ms"] == 0
+    assert vad_trim(np.zeros(0, np.float32), sr)[1]["vad"] == "silent"
+
+
+def test_endpointer_drops_lead_silence_and_detects_end():
+    sr = 16000
+    x = np.concatenate([np.zeros(sr), _tone(200, sr), np.zeros(sr)]).astype(np.float32)
+    ep, out = Endpointer(sr, frame_ms=30, silence_ms=600, preroll_ms=150), []
+    for i in range(0, len(x), 4800):
+        out.append(ep.feed(x[i:i + 4800]))
+        if ep.ended:
+            break
+    out.append(ep.flush())
+    assert ep.started and ep.ended
+    # 前导静音只保留 preroll，语音后转发到静音满 silence_ms 为止
+    assert 1.6 <= sum(len(o) for o in out) / sr <= 1.8
+
+
+def test_endpointer_resumes_after_pause_and_adapts_to_quiet_mic():
+    sr, rnd = 16000, np.random.default_rng(2)
+    quiet = 0.01 * _tone(200, sr) / np.abs(_tone(200, sr)).max()          # 约 -43dBFS 的轻声
+    x = np.concatenate([np.zeros(sr), quiet, np.zeros(sr), quiet, np.zeros(sr // 2)]).astype(np.float32)
+    x += (rnd.standard_normal(x.size) * 0.0005).astype(np.float32)        # 约 -66dBFS 底噪
+    ep, out, ended_seen = Endpointer(sr, frame_ms=30, silence_ms=600, preroll_ms=150), [], False
+    for i in range(0, len(x), 4800):
+        out.append(ep.feed(x[i:i + 4800]))
+        ended_seen |= ep.ended
+    out.append(ep.flush())
+    # 句中停顿超过 silence_ms 只是提示，之后的第二句照样转发（两句语音 + 各自的 preroll/尾部静音）
+    assert ended_seen and ep.started
+    assert 3.2 <= sum(len(o) for o in out) / sr <= 3.8
+
+
+def test_audio_fingerprint_gain_invariant():
+    x = _tone(200, 16000)
+    assert audio_fingerprint(x, 16000) == audio_fingerprint(x * 0.5, 16000)
+    assert audio_fingerprint(x, 16000) != audio_fingerprint(_tone(210, 16000), 16000)
+    assert audio_fingerprint(x, 16000) != audio_fingerprint(x, 8000)
+
+
+def test_vad_keeps_quiet_speech_and_rejects_white_noise():
+    sr, rnd = 16000, np.random.default_rng(1)
+    # 底噪偏高的房间里轻声说话：语音 -40dBFS 左右，底噪约 -50dBFS
+    x = (rnd.standard_normal(sr * 3) * 0.003).astype(np.float32)
+    x[sr:2 * sr] += 0.014 * _tone(200, sr) / np.abs(_tone(200, sr)).max()
+    y, info = vad_trim(x, sr)
+    assert info["vad"] == "speech" and len(y) / sr >= 1.0
+    # 纯白噪声（过零率高、能量略低于阈值）不算语音
+    hiss = (rnd.standard_normal(sr * 2) * 0.004).astype(np.float32)
+    assert vad_trim(hiss, sr)[1]["vad"] == "silent"
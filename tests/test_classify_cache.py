@@ -0,0 +1,60 @@
+import sys, os, json
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config import settings
+from core import classify_cache
+from core.dispatcher import route
+from core.types import RoleConfig
+from utils.cache import TTLCache
+
+
+class _LLM:
+    def __init__(self):
+        self.calls = 0
+
+    def classify(self, text, candidates=None):
+        self.calls += 1
+        return {"skill": "x_exam", "confidence": 0.9, "_debug": {"raw": "x_exam 0.90"}}
+
+
+def test_normalized_text_hits_per_role(tmp_path, monkeypatch):
+    log = tmp_path / "app.jsonl"
+    monkeypatch.setattr(settings, "LOG_PATH", str(log))
+    monkeypatch.setattr(classify_cache, "_cache", TTLCache(16, 60))
+    monkeypatch.setattr(classify_cache, "_stats", {"lookups": 0, "hits": 0})
+    llm, role = _LLM(), RoleConfig(name="Socratic mentor", style="")
+    assert route("挑挑我的毛病吧", role, llm).name == "x_exam"
+    call = route("  挑挑我的毛病吧！！", role, llm)          # 空白/标点/全半角差异
+    assert call.name == "x_exam" and call.args["debug"]["classify_cache"]
+    assert "_debug" not in call.args["debug"]["classify"]
+    assert llm.calls == 1
+    route("挑挑我的毛病吧", RoleConfig(name="Know-it-all", style=""), llm)   # 角色不同：不共用
+    assert llm.calls == 2
+    rates = [json.loads(l)["hit_rate"] for l in log.read_text(encoding="utf-8").splitlines()
+             if json.loads(l).get("event") == "classify_cache"]
+    assert rates == [0.0, 0.5, 0.3333]
+
+
+def test_ttl_and_size_bounds(monkeypatch):
+    c = TTLCache(2, 10)
+    c.put("a", 1); c.put("b", 2); c.get("a"); c.put("c", 3)
+    assert c.get("b") is None and c.get("a") == 1            # b 最久未用被淘汰
+    c.put("old", 4, ts=0)
+    assert c.get("old") is None                              # 已过期
+
+
+def test_fallback_result_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+    monkeypatch.setattr(classify_cache, "_cache", TTLCache(16, 60))
+
+    class _Garbled(_LLM):
+        def classify(self, text, candidates=None):
+            if self.calls == 0:   # 第一次输出乱码：解析失败兜底为 none
+                self.calls += 1
+                return {"skill": "none", "confidence": 1.0, "fallback": True}
+            return super().classify(text, candidates)
+
+    llm, role = _Garbled(), RoleConfig(name="Socratic mentor", style="")
+    assert route("挑挑我的毛病吧", role, llm).name == "__none__"
+    assert route("挑挑我的毛病吧", role, llm).name == "x_exam"   # 兜底结果没进缓存，重新分类
+    assert llm.calls == 2
@@ -0,0 +1,35 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from clients.llm_client import LLMClient, _CompactScanner
+
+CANDS = ["steelman", "x_exam", "counterfactual", "none"]
+
+
+def test_done_as_soon_as_score_complete():
+    scan = _CompactScanner(CANDS)
+    assert not any(scan.feed(p) for p in ["steel", "man", " 0.", "8"])
+    assert scan.feed("5")                      # 两位小数：无需等后续 token
+    assert scan.result() == ("steelman", 0.85)
+
+
+def test_stream_end_fallbacks():
+    scan = _CompactScanner(CANDS)
+    scan.feed("none 0.9")                      # 流结束时未 done，按缓冲解析
+    assert scan.result() == ("none", 0.9)
+    scan = _CompactScanner(CANDS)
+    scan.feed("x_exam")                        # 只有标签
+    assert scan.result() == ("x_exam", 1.0)
+    scan = _CompactScanner(CANDS)
+    scan.feed("unknown 0.99")                  # 非候选项
+    assert scan.result() == (None, 0.0)
+
+
+def test_parse_failure_marked_as_fallback():
+    scan = _CompactScanner(CANDS)
+    scan.feed("嗯……")
+    res = LLMClient._compact_result(None, scan, CANDS)     # 不依赖实例状态
+    assert res["skill"] == "none" and res["fallback"]
+    scan = _CompactScanner(CANDS)
+    scan.feed("x_exam 0.80")
+    assert "fallback" not in LLMClient._compact_result(None, scan, CANDS)
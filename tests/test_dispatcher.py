@@ -0,0 +1,53 @@
+import sys, os, glob, json, random
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+from config import settings
+from core import classify_cache
+from core.dispatcher import _RULES, _table_for, route
+from core.types import RoleConfig
+from utils.cache import TTLCache
+from utils.kwmatch import KeywordMatcher
+
+
+@pytest.fixture(autouse=True)
+def _isolated(tmp_path, monkeypatch):
+    # route() 会查分类缓存并写日志：不碰仓库里的 logs/app.jsonl，也不给后面的测试留下缓存条目
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+    monkeypatch.setattr(classify_cache, "_cache", TTLCache(16, 60))
+
+
+def _linear(text):
+    # 旧版：按规则顺序逐条 any(kw in text)
+    for keywords, skill_name in _RULES:
+        if any(kw.lower() in text for kw in keywords):
+            return skill_name
+    return None
+
+
+def test_matcher_agrees_with_linear_scan():
+    m = KeywordMatcher((kw.lower(), i, sk) for i, (kws, sk) in enumerate(_RULES) for kw in kws)
+    alphabet = [kw for kws, _ in _RULES for kw in kws] + list("你好今天强化故事练习如果")
+    rnd = random.Random(0)
+    for _ in range(3000):
+        text = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 6))).lower()
+        assert m.search(text) == _linear(text)
+
+
+def test_rules_and_candidates_are_role_scoped():
+    luma, aris = RoleConfig(name="Luma", style=""), RoleConfig(name="Aris", style="")
+    assert route("给我讲个故事", luma).name == "luma_story"
+    assert route("给我讲个故事", aris).name == "__none__"     # 其他角色的关键词不触发
+    assert "luma_story" not in _table_for(aris).candidates
+    # 未配置的角色：规则与分类候选一致（默认候选），不会触发其他角色的技能
+    unknown = RoleConfig(name="?", style="")
+    assert route("给我讲个故事", unknown).name == "__none__"
+    assert route("帮我强化一下这个观点", unknown).name == "steelman"
+
+
+def test_every_shipped_role_has_a_table():
+    roles_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "roles")
+    for path in glob.glob(os.path.join(roles_dir, "*.json")):
+        with open(path, encoding="utf-8") as f:
+            assert json.load(f)["name"] in settings.ROLE_SKILL_CANDIDATES, path
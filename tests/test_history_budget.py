@@ -0,0 +1,50 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config import settings
+from core.state import SessionState, append_turn, get_recent_messages, history_store_rounds
+from core.types import Message
+from utils.textproc import estimate_tokens, message_tokens, truncate_messages_by_tokens
+
+
+def _turn(state, q, a, rounds=30):
+    append_turn(state, Message(role="user", content=q), Message(role="assistant", content=a), rounds)
+
+
+def test_token_count_cached_on_message():
+    m = Message(role="user", content="你好，世界")
+    assert message_tokens(m) == estimate_tokens("你好，世界") + 4
+    m.meta["tokens"] = 99                       # 之后直接读缓存
+    assert message_tokens(m) == 99
+
+
+def test_budget_fills_newest_rounds_first():
+    state = SessionState(session_id="s")
+    _turn(state, "长问题", "长" * 400)          # 一条超长回复
+    for i in range(10):
+        _turn(state, f"短{i}", "好")
+    assert all("tokens" in m.meta for m in state.messages)      # append 时已增量计数
+
+    hist = get_recent_messages(state, max_rounds=3, token_budget=200)
+    assert len(hist) == 20 and hist[0].content == "短0"         # 短对话装进 10 轮，长回复被挤出
+    assert sum(message_tokens(m) for m in hist) <= 200
+    assert len(get_recent_messages(state, max_rounds=3)) == 6   # 不给预算：按轮数
+
+
+def test_never_starts_with_assistant():
+    msgs = [Message(role="assistant", content="开场白"), Message(role="user", content="问"),
+            Message(role="assistant", content="答")]
+    assert [m.content for m in truncate_messages_by_tokens(msgs, 1000)] == ["问", "答"]
+    # 最新一轮单独就超预算：仍保留这一轮，更早的不再装入
+    assert [m.content for m in truncate_messages_by_tokens(msgs, 5)] == ["问", "答"]
+    long_turn = [Message(role="user", content="旧"), Message(role="assistant", content="旧答"),
+                 Message(role="user", content="长" * 500), Message(role="assistant", content="好")]
+    assert [m.content for m in truncate_messages_by_tokens(long_turn, 100)] == ["长" * 500, "好"]
+
+
+def test_store_rounds(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET", 0)
+    assert history_store_rounds(8) == 8
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET", 1000)
+    monkeypatch.setattr(settings, "HISTORY_STORE_ROUNDS", 30)
+    assert history_store_rounds(8) == 30
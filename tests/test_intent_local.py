@@ -0,0 +1,35 @@
+import sys, os, json
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.intent_local import LocalIntentModel, load_training_records
+
+TEXTS = ["帮我把这个论证打磨得更有说服力", "我的观点是远程办公更高效，帮我完善论证", "请加强我的论点",
+         "今天天气怎么样", "你好呀，随便聊聊", "晚饭吃什么好呢"]
+LABELS = ["steelman"] * 3 + ["none"] * 3
+
+
+def test_fit_predict_and_roundtrip(tmp_path):
+    model = LocalIntentModel.fit(TEXTS, LABELS)
+    res = model.predict("帮我把论证完善一下")
+    assert res["skill"] == "steelman" and res["source"] == "local"
+    assert abs(sum(res["confidence_map"].values()) - 1.0) < 1e-5
+    # 与训练集毫无重叠的文本：相似度低，应判为拿不准
+    assert not model.predict("quantum chromodynamics")["sure"]
+
+    path = str(tmp_path / "m.npz")
+    model.save(path)
+    again = LocalIntentModel.load(path)
+    assert again.labels == model.labels
+    assert again.predict("帮我把论证完善一下") == res
+
+
+def test_training_records_use_router_decision(tmp_path):
+    log = tmp_path / "app.jsonl"
+    rows = [
+        {"event": "chat_turn", "user_text": "强化一下", "route_debug": {"classify": {"skill": "steelman", "confidence": 0.9}}},
+        {"event": "chat_turn", "user_text": "聊聊天", "route_debug": {"classify": {"skill": "steelman", "confidence": 0.1}}},
+        {"event": "chat_turn", "user_text": "本地判的", "route_debug": {"classify": {"skill": "none", "source": "local"}}},
+        {"event": "voice_turn", "user_text": "忽略"},
+    ]
+    log.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in rows), encoding="utf-8")
+    assert sorted(load_training_records(str(log))) == [("强化一下", "steelman"), ("聊聊天", "none")]
@@ -0,0 +1,104 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import threading
+
+import pytest
+
+from config import settings
+from core import memory
+from core.memory import schedule_compaction
+from core.pipeline import assemble_messages, respond_short
+from core.state import SessionState, append_turn, reset_session
+from core.types import Message, RoleConfig
+
+
+class _SummaryLLM:
+    def __init__(self, fail=False):
+        self.prompts, self.fail = [], fail
+
+    def complete(self, msgs, max_tokens=512, stream=False):
+        if self.fail:
+            raise RuntimeError("upstream down")
+        self.prompts.append(msgs[-1].content)
+        return f"摘要{len(self.prompts)}"
+
+
+@pytest.fixture(autouse=True)
+def _cfg(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+    monkeypatch.setattr(settings, "SUMMARY_ENABLE", True)
+    monkeypatch.setattr(settings, "SUMMARY_BATCH_ROUNDS", 2)
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET", 0)   # 窗口按轮数，便于断言
+
+
+def _talk(state, llm, n, start=0, max_rounds=2):
+    for i in range(start, start + n):
+        append_turn(state, Message(role="user", content=f"问{i}"), Message(role="assistant", content=f"答{i}"), 30)
+        schedule_compaction(state, max_rounds, llm)
+        memory._pool.submit(lambda: None).result()   # 单线程池：等前面的折叠跑完
+
+
+def test_evicted_rounds_folded_into_summary():
+    state, llm = SessionState(session_id="s"), _SummaryLLM()
+    _talk(state, llm, 4)
+    assert [m.content for m in state.messages] == ["问2", "答2", "问3", "答3"]   # 只留最近窗口
+    assert state.summary == "摘要1" and state.evicted == []
+    assert "问0" in llm.prompts[0] and "答1" in llm.prompts[0]
+
+    _talk(state, llm, 2, start=4)
+    assert state.summary == "摘要2" and "已有摘要：\n摘要1" in llm.prompts[1]
+
+    msgs = assemble_messages("sys", state.messages, "新问题", state.summary)
+    assert msgs[1].role == "system" and msgs[1].content.endswith("摘要2")
+    assert len(msgs) == 2 + 4 + 1
+
+
+def test_failure_keeps_pending_messages():
+    state = SessionState(session_id="s")
+    _talk(state, _SummaryLLM(fail=True), 4)
+    assert state.summary == "" and len(state.evicted) == 4 and not state.compacting
+    _talk(state, _SummaryLLM(), 1, start=4)                  # 下次成功时一并折叠
+    assert state.summary == "摘要1" and state.evicted == []
+
+
+def test_reset_during_compaction_discards_summary():
+    started, release = threading.Event(), threading.Event()
+
+    class _Slow(_SummaryLLM):
+        def complete(self, msgs, max_tokens=512, stream=False):
+            started.set()
+            release.wait(5)
+            return super().complete(msgs, max_tokens, stream)
+
+    state = SessionState(session_id="s")
+    for i in range(4):
+        append_turn(state, Message(role="user", content=f"问{i}"), Message(role="assistant", content=f"答{i}"), 30)
+    assert schedule_compaction(state, 2, _Slow())
+    assert started.wait(5)
+    reset_session(state)                                     # 折叠进行中按下“重置”
+    release.set()
+    memory._pool.submit(lambda: None).result()
+    assert state.summary == "" and state.evicted == [] and not state.compacting
+    assert assemble_messages("sys", state.messages, "新问题", state.summary)[1].content == "新问题"
+
+
+def test_voice_turns_are_counted_and_folded(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_ROUNDS", 2)
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLE", False)
+    summarizer = _SummaryLLM()
+    monkeypatch.setattr("clients.registry.get_summary_llm_client", lambda: summarizer)
+
+    class _Chat:
+        model = "m"
+
+        def complete_chunks(self, msgs, max_tokens=512):
+            yield "好的。"
+
+    state = SessionState(session_id="v")
+    for i in range(4):
+        respond_short(f"语音{i}", state, RoleConfig(name="r", style=""), _Chat())
+        memory._pool.submit(lambda: None).result()
+    assert [m.content for m in state.messages] == ["语音2", "好的。", "语音3", "好的。"]
+    assert all("tokens" in m.meta for m in state.messages)
+    assert state.summary == "摘要1" and "语音0" in summarizer.prompts[0]
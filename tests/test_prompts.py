@@ -0,0 +1,32 @@
+import sys, os, json
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.pipeline import _skill_messages, build_system_prompt
+from core.prompts import skill_prompt
+from core.types import RoleConfig
+from clients.llm_client import _sse_piece
+from skills import steelman
+
+
+def _role(name, style):
+    return RoleConfig(name=name, style=style, persona=["冷静"], taboos=["人身攻击"])
+
+
+def test_prompts_built_once_and_prefix_stable():
+    a, b = _role("A", "理性"), _role("B", "温柔")
+    assert build_system_prompt(a) is build_system_prompt(a)          # 同一对象，逐字节一致
+    pa, pb = skill_prompt(steelman, a), skill_prompt(steelman, b)
+    assert pa.startswith(steelman.SYSTEM_PROMPT) and pb.startswith(steelman.SYSTEM_PROMPT)
+    assert _skill_messages(steelman, "观点一", a, [])[0].content is pa
+
+    a2 = _role("A", "犀利")                                           # 角色重新加载：重建
+    assert "犀利" in build_system_prompt(a2)
+
+
+def test_sse_usage_frame():
+    seen = []
+    usage = {"prompt_tokens": 120, "completion_tokens": 8, "prompt_tokens_details": {"cached_tokens": 96}}
+    line = "data: " + json.dumps({"choices": [], "usage": usage})
+    assert _sse_piece(line, seen.append) == ""
+    assert seen == [usage]
+    assert _sse_piece('data: {"choices":[{"delta":{"content":"好"}}]}', seen.append) == "好"
@@ -0,0 +1,187 @@
+import sys, os, asyncio, threading, time
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+import requests
+
+from config import settings
+from utils import resilience
+from utils.resilience import CircuitOpenError, UpstreamHTTPError, ahedged_call, endpoint, hedged_call
+
+
+@pytest.fixture(autouse=True)
+def _env(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+    monkeypatch.setattr(settings, "HEDGE_MIN_SAMPLES", 3)
+    monkeypatch.setattr(settings, "HEDGE_MIN_DELAY_S", 0.05)
+    monkeypatch.setattr(settings, "CIRCUIT_FAIL_THRESHOLD", 3)
+    monkeypatch.setattr(resilience, "_endpoints", {})
+
+
+def _warm(name, seconds=0.01, n=3):
+    for _ in range(n):
+        endpoint(name).latency.add(seconds)
+
+
+def test_hedge_fires_and_fast_copy_wins():
+    _warm("t")
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.5)      # 主请求卡住
+            return "慢"
+        return "快"
+
+    t0 = time.time()
+    assert hedged_call("t", fn) == "快"
+    assert len(calls) == 2 and time.time() - t0 < 0.4
+
+
+def test_busy_hedge_pool_runs_inline(monkeypatch):
+    monkeypatch.setattr(settings, "HEDGE_MAX_WORKERS", 1)
+    monkeypatch.setattr(resilience, "_pool", None)
+    monkeypatch.setattr(resilience, "_slots", None)
+    _warm("t")
+    release, threads = threading.Event(), []
+
+    def stuck():
+        release.wait(2)          # 主请求与副本都卡住
+        return "慢"
+
+    def fn():
+        threads.append(threading.current_thread())
+        return "快"
+
+    first = threading.Thread(target=lambda: hedged_call("t", stuck))
+    first.start()
+    time.sleep(0.1)                                   # 第一个调用已对冲，两份都占着线程
+    assert hedged_call("t", fn) == "快"
+    assert threads == [threading.current_thread()]    # 名额用满：本线程直接执行，不排队
+    release.set()
+    first.join()
+    time.sleep(0.05)
+    assert hedged_call("t", fn) == "快" and threads[-1] is not threading.current_thread()   # 名额已归还
+
+
+def test_no_hedge_without_samples():
+    calls = []
+    assert hedged_call("t", lambda: calls.append(1) or "ok") == "ok"
+    assert len(calls) == 1 and endpoint("t").latency.hedge_delay() is None
+
+
+def test_breaker_opens_and_recovers(monkeypatch):
+    def boom():
+        raise UpstreamHTTPError("上游 500", 500)
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            hedged_call("t", boom)
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        hedged_call("t", lambda: calls.append(1))
+    assert calls == []                                      # 熔断期间不发请求
+
+    monkeypatch.setattr(settings, "CIRCUIT_COOLDOWN_S", 0)   # 冷却结束：半开探测
+    assert hedged_call("t", lambda: "ok") == "ok"
+    assert endpoint("t").breaker.state == "closed"
+
+
+def test_half_open_failure_reopens(monkeypatch):
+    br = endpoint("t").breaker
+    for _ in range(3):
+        br.record_failure()
+    monkeypatch.setattr(settings, "CIRCUIT_COOLDOWN_S", 0)
+    def timeout():
+        raise requests.exceptions.ReadTimeout("read timed out")
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        hedged_call("t", timeout)
+    assert br.state == "open"
+
+
+def test_client_errors_do_not_trip_breaker():
+    def bad_request():
+        try:
+            raise requests.exceptions.HTTPError("401", response=_Resp(401))
+        except requests.exceptions.HTTPError as e:
+            raise RuntimeError("LLM HTTP error: unauthorized") from e   # 客户端包装后的形态
+
+    for _ in range(5):
+        with pytest.raises(RuntimeError):
+            hedged_call("t", bad_request)
+    br = endpoint("t").breaker
+    assert br.state == "closed" and br.failures == 0
+
+    def throttled():
+        raise UpstreamHTTPError("限流", 429)
+
+    for _ in range(3):
+        with pytest.raises(UpstreamHTTPError):
+            hedged_call("t", throttled)
+    assert br.state == "open"
+
+
+class _Resp:
+    def __init__(self, status_code):
+        self.status_code, self.text = status_code, ""
+
+
+def test_async_hedge_cancels_loser():
+    _warm("a")
+    started, cancelled = [], []
+
+    async def factory():
+        started.append(1)
+        if len(started) == 1:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+            return "慢"
+        return "快"
+
+    async def main():
+        out = await ahedged_call("a", factory)
+        await asyncio.sleep(0)
+        return out
+
+    assert asyncio.run(main()) == "快"
+    assert cancelled == [1]
+
+
+def test_cancelled_probe_reopens(monkeypatch):
+    br = endpoint("a").breaker
+    for _ in range(3):
+        br.record_failure()
+    monkeypatch.setattr(settings, "CIRCUIT_COOLDOWN_S", 0)
+
+    async def main():
+        probe = asyncio.ensure_future(ahedged_call("a", lambda: asyncio.sleep(1)))
+        await asyncio.sleep(0.01)
+        probe.cancel()                       # 例如推测执行的对话被取消
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(main())
+    assert br.state == "open"                # 不会卡在半开
+    assert hedged_call("a", lambda: "ok") == "ok" and br.state == "closed"
+
+
+def test_llm_endpoints_are_per_model(monkeypatch):
+    from clients.llm_client import LLMClient
+
+    def _once(self, messages, max_tokens):
+        if self.model == "cheap-summary":
+            raise requests.exceptions.ConnectionError("refused")
+        return "好的"
+
+    monkeypatch.setattr(LLMClient, "_complete_once", _once)
+    summary, chat = LLMClient(model="cheap-summary", api_key="k"), LLMClient(model="chat-model", api_key="k")
+    for _ in range(3):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            summary.complete([{"role": "user", "content": "hi"}])
+    assert endpoint("llm_complete:cheap-summary").breaker.state == "open"
+    assert chat.complete([{"role": "user", "content": "hi"}]) == "好的"   # 主对话模型不受摘要模型熔断影响
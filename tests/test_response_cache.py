@@ -0,0 +1,98 @@
+import sys, os, asyncio
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config import settings
+from clients import response_cache
+from clients.response_cache import cached_llm, response_cache_key
+from core.types import Message
+
+
+class _LLM:
+    model = "m"
+
+    def __init__(self):
+        self.calls = 0
+
+    def complete_chunks(self, msgs, max_tokens=512):
+        self.calls += 1
+        yield from ["第一句。", "第二句。"]
+
+    async def acomplete(self, msgs, max_tokens=512):
+        self.calls += 1
+        return "异步回复"
+
+
+def _fresh_cache(tmp_path, monkeypatch, db=True):
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_DB", str(tmp_path / "r.sqlite3") if db else "")
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_SCOPES", ["steelman"])
+    monkeypatch.setattr(response_cache, "_cache", None)
+
+
+def test_opt_in_and_stream_roundtrip(tmp_path, monkeypatch):
+    _fresh_cache(tmp_path, monkeypatch)
+    llm, msgs = _LLM(), [Message(role="user", content="你好")]
+    assert cached_llm(llm, "x_exam") is llm                       # 未开启的技能不包装
+    wrapped = cached_llm(llm, "steelman")
+
+    gen = wrapped.complete_chunks(msgs)
+    next(gen); gen.close()                                         # 中途关闭：不写缓存
+    assert list(wrapped.complete_chunks(msgs)) == ["第一句。", "第二句。"]
+    assert list(wrapped.complete_chunks(msgs)) == ["第一句。第二句。"]
+    assert llm.calls == 2
+
+    monkeypatch.setattr(response_cache, "_cache", None)           # 模拟重启：内存清空，SQLite 仍命中
+    assert list(cached_llm(llm, "steelman").complete_chunks(msgs)) == ["第一句。第二句。"]
+    assert llm.calls == 2
+
+
+def test_key_covers_model_temperature_and_async(tmp_path, monkeypatch):
+    _fresh_cache(tmp_path, monkeypatch, db=False)
+    msgs = [{"role": "user", "content": "你好"}]
+    assert response_cache_key(msgs, "a", 0.7, 256) != response_cache_key(msgs, "b", 0.7, 256)
+    assert response_cache_key(msgs, "a", 0.7, 256) != response_cache_key(msgs, "a", 0.2, 256)
+    llm = _LLM()
+    wrapped = cached_llm(llm, "steelman")
+    assert asyncio.run(wrapped.acomplete(msgs)) == asyncio.run(wrapped.acomplete(msgs)) == "异步回复"
+    assert llm.calls == 1
+
+    cool = _LLM()
+    cool.temperature = 0.1                                          # 同模型、不同温度的 client 不共用缓存
+    assert asyncio.run(cached_llm(cool, "steelman").acomplete(msgs)) == "异步回复"
+    assert cool.calls == 1
+
+
+def test_concurrent_stream_is_deduplicated(tmp_path, monkeypatch):
+    _fresh_cache(tmp_path, monkeypatch, db=False)
+
+    class _Slow(_LLM):
+        async def acomplete_chunks(self, msgs, max_tokens=512):
+            self.calls += 1
+            for p in ["第一句。", "第二句。"]:
+                await asyncio.sleep(0.02)
+                yield p
+
+    llm, msgs = _Slow(), [Message(role="user", content="同时问")]
+    wrapped = cached_llm(llm, "steelman")
+
+    async def collect():
+        return [p async for p in wrapped.acomplete_chunks(msgs)]
+
+    async def main():
+        return await asyncio.gather(collect(), collect())
+
+    lead, follow = asyncio.run(main())
+    assert llm.calls == 1
+    assert lead == ["第一句。", "第二句。"] and follow == ["第一句。第二句。"]
+
+
+def test_follower_stops_waiting_for_stalled_leader(tmp_path, monkeypatch):
+    _fresh_cache(tmp_path, monkeypatch, db=False)
+    monkeypatch.setattr(settings, "REQUEST_TIMEOUT", (0.05, 0.05))
+    llm, msgs = _LLM(), [Message(role="user", content="搁置")]
+    wrapped = cached_llm(llm, "steelman")
+    stalled = wrapped.complete_chunks(msgs)
+    assert next(stalled) == "第一句。"             # 发起方拿到第一片后被搁置：既不迭代也不关闭
+    assert list(wrapped.complete_chunks(msgs)) == ["第一句。", "第二句。"]   # 等待方超时后自己生成
+    assert llm.calls == 2
+    stalled.close()
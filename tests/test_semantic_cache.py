@@ -0,0 +1,67 @@
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config import settings
+from core import semantic_cache
+from core.pipeline import respond
+from core.semantic_cache import SemanticIndex, semantic_lookup, semantic_namespace, semantic_store
+from core.state import SessionState
+from core.types import RoleConfig
+
+
+def test_index_nearest_ttl_and_ring():
+    idx = SemanticIndex(dim=1024, capacity=2)
+    idx.add("讲个关于勇气的故事", "A")
+    idx.add("用数学和编程解释递归", "B")
+    hit = idx.search("讲一个关于勇气的故事！", ttl=60)
+    assert hit.reply == "A" and hit.sim > 0.8
+    assert idx.search("讲个关于勇气的故事", ttl=-1).sim < 0       # 全部过期
+    idx.add("第三条", "C")                                        # 容量 2：覆盖最旧的 A
+    assert len(idx) == 2 and idx.search("讲个关于勇气的故事", ttl=60).reply != "A"
+
+
+class _LLM:
+    model = "m"
+
+    def __init__(self):
+        self.calls = 0
+
+    def complete(self, msgs, max_tokens=512, stream=False):
+        self.calls += 1
+        return f"回复{self.calls}"
+
+
+def test_respond_reuses_paraphrase(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLE", False)
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_AUDIT_RATE", 0.0)
+    monkeypatch.setattr(semantic_cache, "_indexes", {})
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_SCOPES", ["steelman"])
+    role, llm = RoleConfig(name="Socratic mentor", style=""), _LLM()
+
+    first = respond("帮我强化一下这个观点：远程办公比坐班更高效", SessionState("a"), role, llm)
+    again = respond("帮我强化下这个观点：远程办公比坐班更高效！", SessionState("b"), role, llm)
+    assert first.skill == again.skill == "steelman"
+    assert again.reply_text == first.reply_text and llm.calls == 1
+    assert again.data["route_debug"]["semantic_cache"]["sim"] >= settings.SEMANTIC_CACHE_THRESHOLD
+    # 观点相反：相似度不够，照常生成
+    respond("帮我强化一下这个观点：坐班比远程办公更高效", SessionState("c"), role, llm)
+    assert llm.calls == 2
+
+
+def test_opposite_stance_is_not_a_hit(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+    monkeypatch.setattr(semantic_cache, "_indexes", {})
+    ns = "r|luma_story"
+    semantic_store(ns, "应该提高最低工资，这样能改善低收入者的生活", "正方")
+    semantic_store(ns, "帮我强化一下这个观点：远程办公比坐班更高效，因为省下了通勤时间", "高效")
+    # 字符 n-gram 相似度都在阈值以上，但否定词/反义词不同：拒绝命中
+    assert semantic_lookup(ns, "不应该提高最低工资，这样能改善低收入者的生活") is None
+    assert semantic_lookup(ns, "帮我强化一下这个观点：远程办公比坐班更低效，因为省下了通勤时间") is None
+    assert semantic_lookup(ns, "帮我强化下这个观点：远程办公比坐班更高效，因为省下了通勤时间！").reply == "高效"
+
+
+def test_default_scopes_skip_stance_skills():
+    assert semantic_namespace("r", "steelman", False) is None
+    assert semantic_namespace("r", None, False) is None
+    assert semantic_namespace("r", "luma_story", False) == "r|luma_story"
@@ -0,0 +1,74 @@
+import sys, os, asyncio, threading, time
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+from config import settings
+from utils.singleflight import SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def _log(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_PATH", str(tmp_path / "app.jsonl"))
+
+
+def test_threads_share_one_call():
+    sf, calls, out = SingleFlight("t"), [], []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        return "结果"
+
+    ts = [threading.Thread(target=lambda: out.append(sf.do("k", fn))) for _ in range(8)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    assert len(calls) == 1 and out == ["结果"] * 8
+    assert sf.do("k", lambda: "新一轮") == "新一轮"             # 完成后不再共享
+
+
+def test_async_share_and_leader_cancel():
+    async def main():
+        sf, calls = SingleFlight("a"), []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        assert await asyncio.gather(*[sf.ado("k", slow) for _ in range(5)]) == [1] * 5
+
+        # 发起方被取消：等待方不跟着失败，重新发起一次
+        leader = asyncio.ensure_future(sf.ado("c", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(sf.ado("c", slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == 3
+
+    asyncio.run(main())
+
+
+def test_errors_are_shared():
+    sf = SingleFlight("e")
+    barrier, errs = threading.Barrier(2), []
+
+    def boom():
+        barrier.wait()
+        time.sleep(0.05)
+        raise ValueError("上游失败")
+
+    def call(fn):
+        try:
+            sf.do("k", fn)
+        except ValueError as e:
+            errs.append(str(e))
+
+    t1 = threading.Thread(target=call, args=(boom,))
+    t1.start()
+    barrier.wait()
+    call(lambda: "不会执行")
+    t1.join()
+    assert errs == ["上游失败", "上游失败"]
@@ -0,0 +1,68 @@
+import sys, os, random
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from utils.textseg import SentenceSegmenter, ReplyCapper, split_for_tts
+
+TEXT = ("今天天气真不错，我们可以一起去公园散步。然后再去吃点好吃的东西吧！"
+        "你觉得怎么样？如果下雨的话，我们就在家里看书、听音乐，或者做点别的事情；"
+        "总之不要浪费这个周末。Let's keep it short, simple, and fun!") * 3
+
+
+def _reference_split(text, max_chars=120):
+    # 旧版逐字符拼接实现，作为行为基准
+    text = (text or "").strip()
+    parts, buf = [], ""
+    for ch in text:
+        buf += ch
+        if ch in "。！？!?；;" and len(buf) >= max_chars * 0.5:
+            parts.append(buf.strip()); buf = ""
+        elif ch in "，," and len(buf) >= max_chars:
+            parts.append(buf.strip()); buf = ""
+        elif len(buf) >= max_chars * 1.2:
+            parts.append(buf.strip()); buf = ""
+    if buf.strip():
+        parts.append(buf.strip())
+    return parts
+
+
+def test_split_matches_reference():
+    for max_chars in (10, 40, 120):
+        assert split_for_tts(TEXT, max_chars=max_chars) == _reference_split(TEXT, max_chars)
+
+
+def test_feed_is_chunking_invariant():
+    rnd = random.Random(0)
+    expected = split_for_tts(TEXT, max_chars=40)
+    seg, out, i = SentenceSegmenter(max_chars=40), [], 0
+    while i < len(TEXT):
+        n = rnd.randint(1, 7)
+        out.extend(seg.feed(TEXT[i:i + n]))
+        i += n
+    out.extend(seg.flush())
+    assert out == expected
+
+
+def test_sentence_emitted_at_boundary():
+    seg = SentenceSegmenter(max_chars=10)
+    assert seg.feed("你好呀，朋友") == []
+    assert seg.feed("们。后") == ["你好呀，朋友们。"]
+    assert seg.flush() == ["后"]
+    assert seg.flush() == []
+
+
+def test_reply_capper_cuts_at_last_sentence_boundary():
+    cap, out = ReplyCapper(12), []
+    for p in ["你好呀", "，今天不错。", "我们去", "公园吧！然后", "再去吃饭。"]:
+        out.append(cap.feed(p))
+        if cap.done:
+            break
+    assert "".join(out) == "你好呀，今天不错。" and cap.done   # 第二句会超过上限：整句丢弃
+    assert cap.flush() == ""
+
+
+def test_reply_capper_long_first_sentence_and_normal_end():
+    cap = ReplyCapper(8)
+    assert cap.feed("这是一句很长，很长的话没有句号") == "这是一句很长，"
+    cap = ReplyCapper(50)
+    assert cap.feed("短回复。没说完") == "短回复。"
+    assert cap.flush() == "没说完" and not cap.done
@@ -0,0 +1,105 @@
+# tools/bench_audio.py
+# 对比 TTS 后处理的旧版纯 Python 实现与 utils/audio 向量化实现（结果一致性 + 耗时）
+# 用法：python -m tools.bench_audio [--dir cache/tts] [--repeat 3]
+import argparse, array, glob, io, math, os, sys, time, wave
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config import settings
+from utils.audio import rms_dbfs, stereo_to_mono, trim_silence
+
+
+# ---- 旧版实现（逐样本循环），仅作基准 ----
+def legacy_rms_dbfs(pcm: bytes) -> float:
+    n = len(pcm) // 2
+    if n == 0:
+        return float("-inf")
+    a = array.array('h'); a.frombytes(pcm[:n*2])
+    s = 0.0
+    for v in a: s += (v*v)
+    rms = (s / n) ** 0.5
+    if rms <= 1e-3:
+        return float("-inf")
+    return 20.0 * math.log10(rms / 32768.0)
+
+def legacy_stereo_to_mono(pcm: bytes) -> bytes:
+    a = array.array('h'); a.frombytes(pcm)
+    if len(a) % 2 != 0:
+        a = a[:-1]
+    out = array.array('h')
+    for i in range(0, len(a), 2):
+        out.append(int((a[i] + a[i+1]) / 2))
+    return out.tobytes()
+
+def legacy_trim_silence(pcm: bytes, sample_rate: int, thr_dbfs: float, win_ms: int, pad_ms: int) -> bytes:
+    if not pcm:
+        return pcm
+    a = array.array('h'); a.frombytes(pcm)
+    win = max(1, int(sample_rate * win_ms / 1000))
+    pad = max(0, int(sample_rate * pad_ms / 1000))
+
+    def _db(seg):
+        if not seg: return -999.0
+        s = 0.0
+        for v in seg: s += v*v
+        rms = (s / max(1, len(seg))) ** 0.5
+        return -999.0 if rms <= 1e-3 else 20.0*math.log10(rms/32768.0)
+
+    head = 0
+    for i in range(0, len(a), win):
+        if _db(a[i:i+win]) > thr_dbfs:
+            head = max(0, i - pad); break
+    tail = len(a)
+    for i in range(len(a), 0, -win):
+        if _db(a[max(0, i-win):i]) > thr_dbfs:
+            tail = min(len(a), i + pad); break
+    if tail <= head:
+        return b""
+    return array.array('h', a[head:tail]).tobytes()
+
+
+def _best_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn()
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best
+
+
+def run(wav_dir: str = settings.CACHE_TTS_DIR, repeat: int = 3):
+    thr = settings.TTS_SILENCE_DBFS
+    win, pad = settings.TTS_RMS_WIN_MS, settings.TTS_TRIM_PAD_MS
+    tot_old = tot_new = 0.0
+    print(f"{'file':14s} {'sec':>6s} {'legacy_ms':>10s} {'numpy_ms':>9s} {'speedup':>8s}  same")
+    for fp in sorted(glob.glob(os.path.join(wav_dir, "*.wav"))):
+        with wave.open(fp, "rb") as wf:
+            sr, sw = wf.getframerate(), wf.getsampwidth()
+            pcm = wf.readframes(wf.getnframes())
+        if sw != 2 or not pcm:
+            continue
+        stereo = array.array('h', [v for v in array.array('h', pcm) for _ in (0, 1)]).tobytes()
+
+        def old():
+            legacy_rms_dbfs(pcm); legacy_stereo_to_mono(stereo)
+            return legacy_trim_silence(pcm, sr, thr, win, pad)
+        def new():
+            rms_dbfs(pcm); stereo_to_mono(stereo)
+            return trim_silence(pcm, sr, thr, win, pad)
+
+        same = (old() == new() and legacy_stereo_to_mono(stereo) == stereo_to_mono(stereo)
+                and abs(legacy_rms_dbfs(pcm) - rms_dbfs(pcm)) < 1e-6)
+        t_old, t_new = _best_ms(old, repeat), _best_ms(new, repeat)
+        tot_old += t_old; tot_new += t_new
+        print(f"{os.path.basename(fp)[:12]:14s} {len(pcm)/2/sr:6.2f} {t_old:10.1f} {t_new:9.2f} {t_old/max(t_new,1e-9):7.0f}x  {same}")
+    if tot_new:
+        print(f"{'TOTAL':14s} {'':6s} {tot_old:10.1f} {tot_new:9.2f} {tot_old/tot_new:7.0f}x")
+    else:
+        print(f"{wav_dir} 下没有 16-bit WAV")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir", type=str, default=settings.CACHE_TTS_DIR)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.dir, args.repeat)
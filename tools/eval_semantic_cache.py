@@ -0,0 +1,81 @@
+# tools/eval_semantic_cache.py
+# 用 logs/app.jsonl 中的对话记录离线回放语义缓存：不同阈值下的命中率 / 误命中率；并汇总线上命中与抽样审计结果
+# 用法：python -m tools.eval_semantic_cache [--log logs/app.jsonl] [--thresholds 0.8,0.85,0.9,0.95]
+import argparse, json, os, sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config import settings
+from core.semantic_cache import SemanticIndex, reply_similarity
+
+
+def load_events(log_file):
+    turns, online, audits = [], [], []
+    with open(log_file, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except Exception:
+                continue
+            ev = rec.get("event")
+            if ev == "chat_turn" and rec.get("user_text"):
+                turns.append(rec)
+            elif ev == "semantic_cache":
+                online.append(rec)
+            elif ev == "semantic_cache_audit":
+                audits.append(rec)
+    return turns, online, audits
+
+
+def replay(turns, threshold):
+    """
+    按时间顺序回放：每轮先查本分区（角色|技能）索引，未命中再写入。
+    命中且两侧都记录了回复时，用与线上审计相同的标准（回复相似度 < SEMANTIC_CACHE_AUDIT_MIN_SIM）判定误命中。
+    日志里本身就是语义缓存命中的轮次不参与（其回复来自缓存）。
+    """
+    indexes, hits, false_hits, verified, n = {}, 0, 0, 0, 0
+    for rec in turns:
+        if (rec.get("route_debug") or {}).get("semantic_cache"):
+            continue
+        ns = f"{rec.get('role') or '?'}|{rec.get('skill') or 'default'}"
+        idx = indexes.setdefault(ns, SemanticIndex(settings.SEMANTIC_CACHE_DIM, settings.SEMANTIC_CACHE_MAX_ENTRIES))
+        text, reply = rec["user_text"], rec.get("reply_text") or ""
+        n += 1
+        hit = idx.search(text, ttl=float("inf"))
+        if hit is not None and hit.sim >= threshold:
+            hits += 1
+            if reply and hit.reply:
+                verified += 1
+                false_hits += reply_similarity(hit.reply, reply) < settings.SEMANTIC_CACHE_AUDIT_MIN_SIM
+        else:
+            idx.add(text, reply)
+    return n, hits, verified, false_hits
+
+
+def run(log_file, thresholds):
+    turns, online, audits = load_events(log_file)
+    print(f"== 离线回放（{len(turns)} 条 chat_turn）==")
+    print("阈值    命中率    误命中率（可核验命中数）")
+    for th in thresholds:
+        n, hits, verified, false_hits = replay(turns, th)
+        fr = f"{false_hits / verified:.1%}" if verified else "—"
+        print(f"{th:.2f}   {hits / max(1, n):7.1%}   {fr}（{verified}）")
+
+    print("\n== 线上统计 ==")
+    if online:
+        print(f"语义缓存查询 {len(online)} 次，命中率 {sum(r.get('hit', False) for r in online) / len(online):.1%}")
+    else:
+        print("暂无 semantic_cache 记录")
+    if audits:
+        fh = sum(r.get("false_hit", False) for r in audits)
+        print(f"抽样审计 {len(audits)} 次，误命中 {fh} 次（{fh / len(audits):.1%}）")
+    else:
+        print("暂无 semantic_cache_audit 记录")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", type=str, default=settings.LOG_PATH)
+    parser.add_argument("--thresholds", type=str, default="0.8,0.85,0.9,0.95")
+    args = parser.parse_args()
+    run(args.log, [float(x) for x in args.thresholds.split(",") if x.strip()])
@@ -0,0 +1,66 @@
+# tools/train_intent.py
+# 从 logs/app.jsonl 的 LLM 分类记录训练本地意图分类器，并报告与 LLM 路由的一致率
+# 用法：python -m tools.train_intent [--log logs/app.jsonl] [--out cache/intent_local.npz] [--folds 5] [--eval-only]
+import argparse, os, sys, time
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from config import settings
+from core.intent_local import LocalIntentModel, cross_validate, load_training_records
+
+
+def report(pairs, title):
+    """pairs: [(LLM 路由标签, 本地预测结果)]"""
+    n = len(pairs)
+    print(f"== {title}（{n} 条）==")
+    if not n:
+        print("无可评估样本")
+        return
+    agree = sum(res["skill"] == label for label, res in pairs)
+    sure = [(label, res) for label, res in pairs if res["sure"]]
+    sure_agree = sum(res["skill"] == label for label, res in sure)
+    print(f"整体一致率      : {agree / n:.1%}")
+    print(f"本地直出覆盖率  : {len(sure) / n:.1%}（其余回退 LLM 分类）")
+    if sure:
+        print(f"直出部分一致率  : {sure_agree / len(sure):.1%}")
+    # 直出且不一致的才是真正的路由差异，逐条列出便于调阈值
+    confusion = Counter((label, res["skill"]) for label, res in sure if res["skill"] != label)
+    for (label, pred), c in confusion.most_common():
+        print(f"  LLM={label:15s} 本地={pred:15s}: {c}")
+
+
+def run(log_file, out_path, folds, seed, eval_only):
+    records = load_training_records(log_file)
+    labels = Counter(l for _, l in records)
+    print(f"样本 {len(records)} 条，标签分布：{dict(labels)}")
+    if len(labels) < 2:
+        print("至少需要两类标签才能训练，请先积累更多 LLM 分类日志")
+        return 1
+
+    if eval_only:
+        model = LocalIntentModel.load(out_path)
+        report([(l, model.predict(t)) for t, l in records], f"已有模型 {out_path} 在日志样本上的表现")
+        return 0
+
+    report(cross_validate(records, folds=folds, seed=seed), f"{folds} 折交叉验证")
+
+    model = LocalIntentModel.fit([t for t, _ in records], [l for _, l in records])
+    t0 = time.perf_counter()
+    for t, _ in records:
+        model.predict(t)
+    us = (time.perf_counter() - t0) / len(records) * 1e6
+    model.save(out_path)
+    print(f"\n模型已保存：{out_path}（{len(model.labels)} 类，单次预测约 {us:.0f} µs）")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", type=str, default=settings.LOG_PATH)
+    parser.add_argument("--out", type=str, default=settings.LOCAL_INTENT_MODEL_PATH)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--eval-only", action="store_true", help="只评估已有模型，不重新训练")
+    args = parser.parse_args()
+    sys.exit(run(args.log, args.out, args.folds, args.seed, args.eval_only))
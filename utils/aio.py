@@ -0,0 +1,41 @@
+# utils/aio.py
+from __future__ import annotations
+import asyncio, threading
+from typing import Any, Awaitable, Optional
+
+# 进程级常驻事件循环（后台守护线程）：长连接/连接池等异步资源都挂在这一个 loop 上，
+# 同步代码通过 run_sync 投递协程，异步代码通过 run_async 桥接，避免每次 asyncio.run 新建 loop。
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """返回（必要时启动）后台事件循环。"""
+    global _loop, _thread
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_loop.run_forever, name="bg-asyncio", daemon=True)
+            _thread.start()
+        return _loop
+
+
+def in_loop_thread() -> bool:
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def run_sync(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """同步门面：把协程投递到后台 loop 并阻塞等待结果。"""
+    if in_loop_thread():
+        raise RuntimeError("run_sync 不能在后台 loop 线程内调用（会死锁），请直接 await")
+    fut = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    return fut.result(timeout)
+
+
+async def run_async(coro: Awaitable[Any]) -> Any:
+    """异步门面：协程在后台 loop 上执行，调用方在自己的 loop 中 await 结果。"""
+    loop = get_loop()
+    if in_loop_thread():
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
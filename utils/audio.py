@@ -0,0 +1,341 @@
+# utils/audio.py
+from __future__ import annotations
+import math
+from collections import deque
+import numpy as np
+
+# ======== PCM16 DSP：全部基于 np.frombuffer 视图做向量化运算，无逐样本 Python 循环 ========
+
+_SILENT_RMS = 1e-3   # RMS 低于此值视作数字静音
+
+
+def pcm16_view(pcm: bytes) -> np.ndarray:
+    """bytes -> int16 只读视图（零拷贝；奇数字节尾部丢弃）。"""
+    return np.frombuffer(pcm, dtype="<i2", count=len(pcm) // 2)
+
+
+def _rms_to_dbfs(rms: float) -> float:
+    return 20.0 * math.log10(rms / 32768.0)
+
+
+def rms_dbfs(pcm: bytes) -> float:
+    """计算 int16 PCM 的 RMS(dBFS)。空数据/数字静音返回 -inf。"""
+    a = pcm16_view(pcm)
+    if a.size == 0:
+        return float("-inf")
+    x = a.astype(np.float64)
+    rms = math.sqrt(float(np.dot(x, x)) / a.size)
+    if rms <= _SILENT_RMS:
+        return float("-inf")
+    return _rms_to_dbfs(rms)
+
+
+def stereo_to_mono(pcm: bytes) -> bytes:
+    """双声道交织 int16 -> 单声道（两声道平均，向零取整）。"""
+    a = pcm16_view(pcm)
+    a = a[: a.size - (a.size % 2)].reshape(-1, 2)
+    s = a[:, 0].astype(np.int32) + a[:, 1]
+    # (s + [s<0]) >> 1 即 s/2 向零取整，与 int((l + r) / 2) 一致
+    return ((s + (s < 0)) >> 1).astype("<i2").tobytes()
+
+
+def window_rms(sq: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    连续分段的 RMS：sq 为样本平方，starts 为升序分段起点（第 i 段为 [starts[i], starts[i+1])，
+    最后一段到末尾）。np.add.reduceat 一次遍历求出全部分段的平方和。
+    """
+    lens = np.diff(np.append(starts, sq.size))
+    return np.sqrt(np.add.reduceat(sq, starts) / np.maximum(1, lens))
+
+
+def trim_silence(pcm: bytes, sample_rate: int, thr_dbfs: float, win_ms: int, pad_ms: int) -> bytes:
+    """按 RMS 窗裁剪两端静音；返回裁剪后的 PCM16（全段无声时原样返回）。"""
+    a = pcm16_view(pcm)
+    n = a.size
+    if n == 0:
+        return pcm
+    win = max(1, int(sample_rate * win_ms / 1000))
+    pad = max(0, int(sample_rate * pad_ms / 1000))
+    # dB > thr 等价于 rms > 32768 * 10^(thr/20)，同时排除数字静音
+    thr_rms = max(_SILENT_RMS, 32768.0 * 10.0 ** (thr_dbfs / 20.0))
+
+    sq = a.astype(np.float64)
+    sq *= sq
+
+    # 找头：窗口 [i, i+win)，i = 0, win, 2win, ...（从前往后第一个有声窗）
+    starts = np.arange(0, n, win)
+    loud = np.flatnonzero(window_rms(sq, starts) > thr_rms)
+    head = max(0, int(starts[loud[0]]) - pad) if loud.size else 0
+
+    # 找尾：窗口 [i-win, i)，i = n, n-win, ...（从后往前第一个有声窗；最前面可能是不足一窗的残段）
+    starts = np.arange(n % win, n, win)
+    if n % win:
+        starts = np.concatenate(([0], starts))
+    loud = np.flatnonzero(window_rms(sq, starts) > thr_rms)
+    ends = np.append(starts[1:], n)
+    tail = min(n, int(ends[loud[-1]]) + pad) if loud.size else n
+
+    if tail <= head:
+        return b""
+    return a[head:tail].tobytes()
+
+
+# ======== 重采样：有理数比多相加窗 sinc（Kaiser 窗），分块处理并跨块保持状态 ========
+
+class Resampler:
+    """
+    流式重采样器：sr_in -> sr_out，按 L/M = sr_out/sr_in（约分后）做多相 FIR。
+      - 低通截止取 min(sr_in, sr_out)/2，带抗混叠；
+      - process(chunk) 可反复调用，只保留 FIR 所需的少量历史样本，长录音内存有界；
+      - flush() 冲出尾部，总输出长度 = ceil(总输入 * L / M)，与一次性处理结果一致。
+    """
+
+    def __init__(self, sr_in: int, sr_out: int, num_zeros: int = 16, beta: float = 8.6,
+                 block: int = 8192):
+        g = math.gcd(int(sr_in), int(sr_out))
+        self.sr_in, self.sr_out = int(sr_in), int(sr_out)
+        self.L, self.M = self.sr_out // g, self.sr_in // g
+        self.block = max(1, int(block))    # 每次向量化计算的输出样本数上限（控制临时内存）
+        self._n_in = 0
+        self._n_out = 0
+        if self.L == self.M:
+            return
+
+        # 原型滤波器（工作在上采样 L 倍后的速率上），长度为奇数，群延迟 c 为整数
+        L, M = self.L, self.M
+        n_taps = 2 * num_zeros * max(L, M) + 1
+        self._c = (n_taps - 1) // 2
+        fc = 0.95 / max(L, M)    # 相对上采样 Nyquist 的截止频率，留 5% 过渡带
+        t = np.arange(n_taps) - self._c
+        h = L * fc * np.sinc(fc * t) * np.kaiser(n_taps, beta)
+        # 多相分解：hp[p, j] = h[p + j*L]
+        self._K = -(-n_taps // L)
+        h = np.concatenate((h, np.zeros(self._K * L - n_taps)))
+        self._hp = h.reshape(self._K, L).T.astype(np.float32)
+
+        # 历史缓冲：_buf[0] 对应绝对输入下标 _buf_start；开头补 K-1 个零
+        self._buf = np.zeros(self._K - 1, dtype=np.float32)
+        self._buf_start = -(self._K - 1)
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32).reshape(-1)
+        self._n_in += x.size
+        if self.L == self.M:
+            self._n_out += x.size
+            return x.copy()
+        self._buf = np.concatenate((self._buf, x))
+        return self._emit(self._n_in, self._n_out_limit(self._n_in))
+
+    def flush(self) -> np.ndarray:
+        """输入结束：补零冲出剩余输出。之后不应再调用 process。"""
+        if self.L == self.M:
+            return np.zeros(0, dtype=np.float32)
+        total = -(-self._n_in * self.L // self.M)
+        pad = self._c // self.L + self._K + 1
+        self._buf = np.concatenate((self._buf, np.zeros(pad, dtype=np.float32)))
+        return self._emit(self._n_in + pad, total)
+
+    def _n_out_limit(self, avail: int) -> int:
+        # 输出 n 需要输入下标 base(n) = (n*M + c) // L <= avail - 1
+        return max(0, (avail * self.L - 1 - self._c) // self.M + 1)
+
+    def _emit(self, avail: int, n_hi: int) -> np.ndarray:
+        outs = []
+        ks = np.arange(self._K)
+        while self._n_out < n_hi:
+            n = np.arange(self._n_out, min(n_hi, self._n_out + self.block))
+            idx = n * self.M + self._c
+            base = idx // self.L - self._buf_start
+            win = self._buf[base[:, None] - ks[None, :]]          # (n, K)：x[base - j]
+            outs.append(np.einsum("ij,ij->i", win, self._hp[idx % self.L]))
+            self._n_out = int(n[-1]) + 1
+
+        # 丢弃不再需要的历史
+        keep_from = (self._n_out * self.M + self._c) // self.L - (self._K - 1)
+        drop = min(keep_from - self._buf_start, self._buf.size)
+        if drop > 0:
+            self._buf = self._buf[drop:]
+            self._buf_start += drop
+        if not outs:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(outs).astype(np.float32, copy=False)
+
+
+def resample(x: np.ndarray, sr_in: int, sr_out: int, chunk: int = 65536) -> np.ndarray:
+    """一次性重采样（内部按 chunk 分块走 Resampler，长音频内存有界）。"""
+    x = np.asarray(x, dtype=np.float32).reshape(-1)
+    if int(sr_in) == int(sr_out):
+        return x
+    rs = Resampler(sr_in, sr_out)
+    parts = [rs.process(x[i:i + chunk]) for i in range(0, x.size, chunk)]
+    parts.append(rs.flush())
+    return np.concatenate(parts)
+
+
+def resample_pcm16(pcm: bytes, sr_in: int, sr_out: int) -> bytes:
+    """PCM16 字节重采样（TTS 采样率规范化用）。"""
+    if int(sr_in) == int(sr_out):
+        return pcm
+    y = resample(pcm16_view(pcm).astype(np.float32) / 32768.0, sr_in, sr_out)
+    return (np.clip(y, -1.0, 32767.0 / 32768.0) * 32768.0).round().astype("<i2").tobytes()
+
+
+# ======== VAD：帧能量 + 过零率，裁掉首尾静音，整段无声直接判空 ========
+
+def frame_features(x: np.ndarray, sample_rate: int, frame_ms: int) -> tuple[np.ndarray, np.ndarray, int]:
+    """按不重叠帧计算 (能量 dBFS, 过零率, 帧长)；x 为 [-1,1] float。末尾不足一帧的部分单独成帧。"""
+    x = np.asarray(x, dtype=np.float32).reshape(-1)
+    flen = max(1, int(sample_rate * frame_ms / 1000))
+    if x.size == 0:
+        return np.zeros(0), np.zeros(0), flen
+    starts = np.arange(0, x.size, flen)
+    lens = np.diff(np.append(starts, x.size))
+    sq = x.astype(np.float64) ** 2
+    rms = np.sqrt(np.add.reduceat(sq, starts) / lens)
+    db = 20.0 * np.log10(np.maximum(rms, 1e-10))
+    # 过零：相邻样本符号变化；按帧求和（每帧首样本与上一帧末样本之间的跳变记到本帧）
+    sign = np.signbit(x)
+    cross = np.concatenate(([0], (sign[1:] != sign[:-1]).astype(np.int32)))
+    zcr = np.add.reduceat(cross, starts) / lens
+    return db, zcr, flen
+
+
+def _runs_at_least(mask: np.ndarray, n: int) -> np.ndarray:
+    """只保留长度 ≥ n 的连续 True 段。"""
+    if n <= 1 or not mask.any():
+        return mask
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    keep = np.zeros(mask.size + 1, dtype=np.int32)
+    long_ = (ends - starts) >= n
+    np.add.at(keep, starts[long_], 1)
+    np.add.at(keep, ends[long_], -1)
+    return np.cumsum(keep[:-1]) > 0
+
+
+def speech_frames(db: np.ndarray, zcr: np.ndarray, thr: float, frame_ms: int,
+                  min_voiced_ms: int = 90, reach_ms: int = 150) -> np.ndarray:
+    """
+    逐帧语音判定：
+      - 浊音段：能量超过阈值且连续至少 min_voiced_ms（孤立的咔哒声/突发噪声不算）；
+      - 清辅音/摩擦音：能量略低（阈值-6dB 内）且过零率高，但只有紧挨浊音段（reach_ms 内）才算，
+        单凭过零率高的帧（白噪声）不会被当成语音。
+    """
+    voiced = _runs_at_least(db > thr, max(1, -(-min_voiced_ms // frame_ms)))
+    reach = max(0, reach_ms // frame_ms)
+    near = np.convolve(voiced.astype(np.int32), np.ones(2 * reach + 1, dtype=np.int32), mode="same") > 0
+    return voiced | ((db > thr - 6.0) & (zcr >= 0.25) & near)
+
+
+def vad_trim(x: np.ndarray, sample_rate: int, frame_ms: int = 30, thr_dbfs: float = -55.0,
+             margin_db: float = 12.0, max_thr_dbfs: float = -45.0, pad_ms: int = 200,
+             min_speech_ms: int = 120) -> tuple[np.ndarray, dict]:
+    """
+    能量/过零率 VAD：
+      - 阈值自适应：底噪（帧能量 10% 分位）+ margin_db，限制在 [thr_dbfs, max_thr_dbfs] 内
+        （上限取低：底噪很高时宁可少裁，也不把轻声说话判成静音）；
+      - 语音帧见 speech_frames（浊音连续性 + 紧邻浊音的清辅音）；
+      - 语音总时长不足 min_speech_ms 视为整段静音，返回空数组；
+      - 否则裁到 [首个语音帧 - pad, 最后语音帧 + pad]。
+    返回 (裁剪后音频, info)；info 含 vad/in_ms/out_ms/trimmed_ms/thr_dbfs。
+    """
+    x = np.asarray(x, dtype=np.float32).reshape(-1)
+    in_ms = int(x.size * 1000 / sample_rate) if sample_rate else 0
+    db, zcr, flen = frame_features(x, sample_rate, frame_ms)
+    if db.size == 0:
+        return x[:0], {"vad": "silent", "in_ms": in_ms, "out_ms": 0, "trimmed_ms": in_ms, "thr_dbfs": thr_dbfs}
+
+    noise = float(np.percentile(db, 10))
+    thr = float(min(max(noise + margin_db, thr_dbfs), max_thr_dbfs))
+    idx = np.flatnonzero(speech_frames(db, zcr, thr, frame_ms))
+
+    info = {"thr_dbfs": round(thr, 1), "in_ms": in_ms}
+    if idx.size * frame_ms < min_speech_ms:
+        info.update({"vad": "silent", "out_ms": 0, "trimmed_ms": in_ms})
+        return x[:0], info
+
+    pad = int(sample_rate * pad_ms / 1000)
+    head = max(0, int(idx[0]) * flen - pad)
+    tail = min(x.size, (int(idx[-1]) + 1) * flen + pad)
+    out = x[head:tail]
+    out_ms = int(out.size * 1000 / sample_rate)
+    info.update({"vad": "speech", "out_ms": out_ms, "trimmed_ms": in_ms - out_ms})
+    return out, info
+
+
+class Endpointer:
+    """
+    流式端点检测（录音进行中逐块喂入）：
+      - 阈值自适应：最近 noise_window_ms 内帧能量的 10% 分位作底噪，+ margin_db，夹在 [thr_dbfs, max_thr_dbfs]；
+        底噪样本不足时用 max_thr_dbfs；
+      - 能量超阈的帧连续 min_voiced_ms 才算开始说话（孤立的咔哒声不触发）；
+      - 没在说话时（开头、句间停顿）只保留最近 preroll_ms 的音频，静音不转发；
+      - 语音后连续静音达到 silence_ms 记 ended（只是“可以停止录音”的提示）；之后再说话则清除 ended 继续转发，
+        输入何时结束由调用方决定（松手停止录音）。
+    """
+
+    def __init__(self, sample_rate: int, frame_ms: int = 30, thr_dbfs: float = -55.0,
+                 max_thr_dbfs: float = -45.0, margin_db: float = 12.0, silence_ms: int = 800,
+                 preroll_ms: int = 200, min_voiced_ms: int = 90, noise_window_ms: int = 5000):
+        self.sample_rate = int(sample_rate)
+        self.frame_ms = frame_ms
+        self.thr_dbfs = thr_dbfs
+        self.max_thr_dbfs = max_thr_dbfs
+        self.margin_db = margin_db
+        self.silence_ms = silence_ms
+        self._flen = max(1, int(self.sample_rate * frame_ms / 1000))
+        self._min_voiced = max(1, -(-min_voiced_ms // frame_ms))
+        self._preroll_frames = max(0, int(preroll_ms / frame_ms)) + self._min_voiced
+        self._preroll: list = []
+        self._levels: deque = deque(maxlen=max(10, noise_window_ms // frame_ms))
+        self._rest = np.zeros(0, dtype=np.float32)
+        self._run = 0          # 连续超阈帧数
+        self._silence = 0
+        self._active = False   # 正在说话（转发中）
+        self.started = False
+        self.ended = False
+
+    def threshold(self) -> float:
+        if len(self._levels) < 10:
+            return self.max_thr_dbfs
+        noise = float(np.percentile(np.fromiter(self._levels, dtype=np.float64), 10))
+        return min(max(noise + self.margin_db, self.thr_dbfs), self.max_thr_dbfs)
+
+    def feed(self, x: np.ndarray) -> np.ndarray:
+        """喂入一块音频，返回应转发给 ASR 的部分（可能为空）。"""
+        x = np.concatenate((self._rest, np.asarray(x, dtype=np.float32).reshape(-1)))
+        n_full = x.size // self._flen * self._flen
+        self._rest = x[n_full:]
+        if n_full == 0:
+            return np.zeros(0, dtype=np.float32)
+        frames = x[:n_full].reshape(-1, self._flen)
+        db, _, _ = frame_features(x[:n_full], self.sample_rate, self.frame_ms)
+        self._levels.extend(db.tolist())
+        voiced = db > self.threshold()
+
+        out = []
+        for frame, is_voiced in zip(frames, voiced):
+            self._run = self._run + 1 if is_voiced else 0
+            if not self._active:
+                self._preroll.append(frame)
+                if len(self._preroll) > self._preroll_frames:
+                    self._preroll.pop(0)
+                if self._run < self._min_voiced:
+                    continue
+                self._active, self.started, self.ended = True, True, False
+                out.extend(self._preroll)
+                self._preroll = []
+                self._silence = 0
+                continue
+            out.append(frame)
+            self._silence = 0 if is_voiced else self._silence + self.frame_ms
+            if self._silence >= self.silence_ms:
+                self._active, self.ended = False, True
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.float32)
+
+    def flush(self) -> np.ndarray:
+        """录音结束：正在说话时转发剩余不足一帧的尾巴。"""
+        rest, self._rest = self._rest, np.zeros(0, dtype=np.float32)
+        if self._active:
+            return rest
+        return np.zeros(0, dtype=np.float32)
@@ -1,7 +1,9 @@
 # utils/cache.py
 from __future__ import annotations
-import os, json, hashlib
-from typing import Optional, Dict, Any
+import os, json, hashlib, threading, time
+from collections import OrderedDict
+import numpy as np
+from typing import Optional, Dict, Any, Hashable
 
 def _ensure_dir(d: str):
     if d and not os.path.exists(d):
@@ -13,6 +15,21 @@ def sha256_bytes(b: bytes) -> str:
 def sha256_text(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
+def audio_fingerprint(audio: np.ndarray, sample_rate: int) -> str:
+    """
+    归一化音频指纹：峰值归一化后量化为 PCM16 再哈希（连同采样率）。
+    同一段录音的重复上传、增益略有差异的重提交都会得到同一指纹。
+    调用方应先统一采样率、裁掉首尾静音，指纹只反映“有效语音内容”。
+    """
+    a = np.asarray(audio, dtype=np.float32).reshape(-1)
+    peak = float(np.max(np.abs(a))) if a.size else 0.0
+    if peak > 0:
+        a = a / peak
+    pcm16 = np.round(np.clip(a, -1.0, 1.0) * 32767.0).astype("<i2")
+    h = hashlib.sha256(f"{int(sample_rate)}:".encode("ascii"))
+    h.update(pcm16.tobytes())
+    return h.hexdigest()
+
 def cache_get_text(dirpath: str, key: str) -> Optional[str]:
     _ensure_dir(dirpath)
     ftxt = os.path.join(dirpath, key + ".txt")
@@ -39,3 +56,36 @@ def cache_put_file(dirpath: str, key: str, ext: str, data: bytes) -> str:
     with open(fpath, "wb") as f:
         f.write(data)
     return fpath
+
+
+class TTLCache:
+    """
+    进程内 LRU + TTL 缓存（线程安全）：超过 maxsize 淘汰最久未用项，超过 ttl 秒视为过期。
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()   # key -> (写入时间, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and time.time() - item[0] > self.ttl:
+                del self._data[key]
+                item = None
+            if item is None:
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def put(self, key: Hashable, value: Any, ts: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (time.time() if ts is None else ts, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,65 @@
+# utils/http.py
+from __future__ import annotations
+import asyncio, threading, weakref
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import settings
+
+# 进程级共享 HTTP 会话：LLM / TTS / ASR(HTTP) 走同一个上游主机，
+# 共用一个连接池即可复用 keep-alive 连接，新会话、新请求都不再重新握手 TLS。
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+
+# 异步客户端按事件循环各持一个（httpx 连接池绑定创建它的 loop）；loop 回收后自动释放
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = weakref.WeakKeyDictionary()
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    retry = Retry(
+        total=settings.HTTP_MAX_RETRIES,
+        read=settings.HTTP_MAX_RETRIES,
+        connect=settings.HTTP_MAX_RETRIES,
+        backoff_factor=settings.HTTP_BACKOFF_SEC,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "POST"])
+    )
+    # pool_maxsize：单主机最多保留的空闲连接数，需覆盖同时在途的请求（LLM 流 + TTS 合成 + 多会话并发）
+    adapter = HTTPAdapter(max_retries=retry,
+                          pool_connections=settings.HTTP_POOL_CONNECTIONS,
+                          pool_maxsize=settings.HTTP_POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def shared_session() -> requests.Session:
+    """返回（必要时创建）进程级共享 Session；线程安全，可跨会话/线程并发使用。"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def shared_async_client():
+    """
+    返回当前事件循环上的共享 httpx.AsyncClient（异步流水线用）。
+    单个 loop 即可同时挂起数百个在途请求，不再每个请求占一个线程。
+    """
+    import httpx  # 仅异步路径需要（随 gradio 安装）
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.READ_TIMEOUT, connect=settings.CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=settings.HTTP_ASYNC_MAX_CONNECTIONS,
+                                max_keepalive_connections=settings.HTTP_ASYNC_MAX_KEEPALIVE),
+        )
+        _async_clients[loop] = client
+    return client
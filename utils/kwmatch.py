@@ -0,0 +1,64 @@
+# utils/kwmatch.py
+from __future__ import annotations
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick 多关键词匹配：一次扫描文本即可找出所有关键词命中，
+    耗时只与文本长度相关，不随关键词/规则数量增长。
+    每个关键词带一个优先级（越小越优先）与取值；search 返回命中项中优先级最高者的取值。
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, int, Any]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Optional[Tuple[int, Any]]] = [None]   # 该状态（含 fail 链）上优先级最高的命中
+        for kw, prio, value in entries:
+            if kw:
+                self._add(kw, prio, value)
+        self._build()
+
+    def _add(self, kw: str, prio: int, value: Any) -> None:
+        s = 0
+        for ch in kw:
+            nxt = self._goto[s].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[s][ch] = nxt
+                self._goto.append({}); self._fail.append(0); self._out.append(None)
+            s = nxt
+        if self._out[s] is None or prio < self._out[s][0]:
+            self._out[s] = (prio, value)
+
+    def _build(self) -> None:
+        q = deque(self._goto[0].values())   # 第一层 fail 均指向根
+        while q:
+            s = q.popleft()
+            for ch, t in self._goto[s].items():
+                f = self._fail[s]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[t] = self._goto[f].get(ch, 0)
+                # 合并 fail 链上的输出：每个状态只保留最优命中
+                fo = self._out[self._fail[t]]
+                if fo is not None and (self._out[t] is None or fo[0] < self._out[t][0]):
+                    self._out[t] = fo
+                q.append(t)
+
+    def search(self, text: str) -> Optional[Any]:
+        """返回文本中命中的、优先级最高的关键词取值；无命中返回 None。"""
+        goto, fail, out = self._goto, self._fail, self._out
+        best: Optional[Tuple[int, Any]] = None
+        s = 0
+        for ch in text:
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            o = out[s]
+            if o is not None and (best is None or o[0] < best[0]):
+                best = o
+                if best[0] == 0:
+                    break
+        return best[1] if best is not None else None
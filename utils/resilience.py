@@ -0,0 +1,297 @@
+# utils/resilience.py
+from __future__ import annotations
+import asyncio, threading, time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import requests
+
+from config import settings
+from utils.logging import write_log
+
+# 上游调用的对冲请求 + 熔断（按端点：llm_complete:<模型> / llm_classify:<模型> / tts）：
+# - 对冲：主请求超过“最近成功调用耗时的 HEDGE_QUANTILE 分位”仍未返回，就再发一份相同请求，先回来的为准；
+#   样本不足 HEDGE_MIN_SAMPLES 时不对冲。被调用的 fn 必须可重复执行（只包网络请求，不包落盘等副作用）。
+# - 熔断：连续失败 CIRCUIT_FAIL_THRESHOLD 次后打开，CIRCUIT_COOLDOWN_S 内直接抛 CircuitOpenError（快速失败），
+#   冷却后放一个探测请求（半开），成功则关闭，失败则重新打开。
+#   只有上游故障（超时、连接错误、5xx、429）计失败；其它 4xx 等是请求本身的问题，原样抛出，不影响熔断。
+
+
+class CircuitOpenError(RuntimeError):
+    """端点处于熔断状态：不发请求，直接失败。"""
+
+
+class UpstreamHTTPError(RuntimeError):
+    """上游返回了 HTTP 错误状态（客户端包装后抛出，保留状态码供熔断判断）。"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+_TRANSIENT = (TimeoutError, ConnectionError, asyncio.TimeoutError,
+              requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.RetryError)
+try:
+    import httpx
+    _TRANSIENT += (httpx.TransportError,)
+except ImportError:   # 仅异步路径需要
+    pass
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """是否算上游故障（计入熔断）：超时 / 连接错误 / 5xx / 429；沿 __cause__ 看被包装的原始异常。"""
+    e: Optional[BaseException] = exc
+    while e is not None:
+        status = getattr(e, "status_code", None)
+        if status is None:
+            status = getattr(getattr(e, "response", None), "status_code", None)
+        if status is not None:
+            return status >= 500 or status == 429
+        if isinstance(e, _TRANSIENT):
+            return True
+        e = e.__cause__
+    return False
+
+
+class LatencyTracker:
+    """最近 window 次成功调用的耗时（秒），给出对冲延迟。"""
+
+    def __init__(self, window: int):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < settings.HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        q = ordered[min(len(ordered) - 1, int(settings.HEDGE_QUANTILE * len(ordered)))]
+        return min(max(q, settings.HEDGE_MIN_DELAY_S), settings.HEDGE_MAX_DELAY_S)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "closed"      # closed / open / half_open
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.time() - self._opened_at >= settings.CIRCUIT_COOLDOWN_S:
+                self._set("half_open")   # 冷却结束：只放行这一个探测请求
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            if self.state != "closed":
+                self._set("closed")
+
+    def record_answered(self) -> None:
+        """上游有应答但请求本身出错（4xx、响应解析失败等）：不计失败；半开探测拿到应答说明上游已恢复。"""
+        with self._lock:
+            if self.state == "half_open":
+                self.failures = 0
+                self._set("closed")
+
+    def record_abort(self) -> None:
+        """调用被取消/中断（不算成功也不算失败）：若正是半开探测，退回打开并重新计冷却，免得永远卡在半开。"""
+        with self._lock:
+            if self.state == "half_open":
+                self._opened_at = time.time()
+                self._set("open")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed"
+                                             and self.failures >= settings.CIRCUIT_FAIL_THRESHOLD):
+                self._opened_at = time.time()
+                self._set("open")
+
+    def _set(self, state: str) -> None:
+        self.state = state
+        write_log(settings.LOG_PATH, {"event": "circuit_state", "endpoint": self.name,
+                                      "state": state, "failures": self.failures})
+
+
+class Endpoint:
+    def __init__(self, name: str):
+        self.name = name
+        self.latency = LatencyTracker(settings.HEDGE_WINDOW)
+        self.breaker = CircuitBreaker(name)
+
+
+_endpoints: Dict[str, Endpoint] = {}
+_endpoints_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+_slots: Optional[threading.BoundedSemaphore] = None
+
+
+def endpoint(name: str) -> Endpoint:
+    ep = _endpoints.get(name)
+    if ep is None:
+        with _endpoints_lock:
+            ep = _endpoints.setdefault(name, Endpoint(name))
+    return ep
+
+
+def _hedge_pool() -> ThreadPoolExecutor:
+    """同步对冲线程池：最多 HEDGE_MAX_WORKERS 个调用同时对冲，每个占主/副本两个线程，提交永不排队。"""
+    global _pool, _slots
+    if _pool is None:
+        with _endpoints_lock:
+            if _pool is None:
+                _slots = threading.BoundedSemaphore(settings.HEDGE_MAX_WORKERS)
+                _pool = ThreadPoolExecutor(max_workers=2 * settings.HEDGE_MAX_WORKERS, thread_name_prefix="hedge")
+    return _pool
+
+
+class _Slot:
+    """一个对冲名额的引用计数：调用方和每份已提交的请求各持一份，全部结束（含输掉后仍在跑的副本）才归还。"""
+
+    def __init__(self, sem: threading.BoundedSemaphore):
+        self._sem, self._refs, self._lock = sem, 1, threading.Lock()
+
+    def hold(self) -> None:
+        with self._lock:
+            self._refs += 1
+
+    def drop(self, *_: Any) -> None:
+        with self._lock:
+            self._refs -= 1
+            last = self._refs == 0
+        if last:
+            self._sem.release()
+
+
+def _admit(ep: Endpoint) -> Optional[float]:
+    """熔断检查，返回本次的对冲延迟（None = 不对冲）。"""
+    if not ep.breaker.allow():
+        write_log(settings.LOG_PATH, {"event": "circuit_reject", "endpoint": ep.name})
+        raise CircuitOpenError(f"{ep.name} 熔断中，请稍后再试")
+    if not settings.HEDGE_ENABLE or ep.breaker.state == "half_open":
+        return None
+    return ep.latency.hedge_delay()
+
+
+def _log_hedge(ep: Endpoint, delay: float, winner: Optional[str] = None) -> None:
+    ev = {"event": "hedge_fired" if winner is None else "hedge_result", "endpoint": ep.name,
+          "delay_ms": int(delay * 1000)}
+    if winner is not None:
+        ev["winner"] = winner
+    write_log(settings.LOG_PATH, ev)
+
+
+def _record_error(ep: Endpoint, exc: Exception) -> None:
+    if is_upstream_failure(exc):
+        ep.breaker.record_failure()
+    else:
+        ep.breaker.record_answered()
+
+
+def hedged_call(name: str, fn: Callable[[], Any]) -> Any:
+    """
+    同步版：带熔断与对冲地执行 fn()。对冲时两份请求在线程池里跑，输的一份跑完后丢弃；
+    对冲名额（HEDGE_MAX_WORKERS）用满时不对冲，直接在调用线程里执行，慢的时候不会让新请求排在输家后面。
+    """
+    ep = endpoint(name)
+    delay = _admit(ep)
+    t0 = time.time()
+    try:
+        result = fn() if delay is None else _race(ep, fn, delay)
+    except Exception as e:
+        _record_error(ep, e)
+        raise
+    except BaseException:
+        ep.breaker.record_abort()
+        raise
+    ep.latency.add(time.time() - t0)
+    ep.breaker.record_success()
+    return result
+
+
+def _race(ep: Endpoint, fn: Callable[[], Any], delay: float) -> Any:
+    pool = _hedge_pool()
+    if not _slots.acquire(blocking=False):
+        write_log(settings.LOG_PATH, {"event": "hedge_skipped", "endpoint": ep.name, "reason": "pool_busy"})
+        return fn()
+    slot = _Slot(_slots)
+
+    def _submit() -> Any:
+        slot.hold()
+        fut = pool.submit(fn)
+        fut.add_done_callback(slot.drop)
+        return fut
+
+    try:
+        primary = _submit()
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        _log_hedge(ep, delay)
+        futs = {primary: "primary", _submit(): "hedge"}
+        pending = set(futs)
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            ok = [f for f in done if f.exception() is None]
+            if ok or not pending:
+                fut = (ok or list(done))[0]
+                _log_hedge(ep, delay, futs[fut])
+                return fut.result()   # 两份都失败时抛后完成的那份的异常
+    finally:
+        slot.drop()
+
+
+async def ahedged_call(name: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """异步版：对冲时两份请求是同一 loop 上的任务，先成功的返回，另一份直接取消。"""
+    ep = endpoint(name)
+    delay = _admit(ep)
+    t0 = time.time()
+    try:
+        result = await factory() if delay is None else await _arace(ep, factory, delay)
+    except asyncio.CancelledError:
+        ep.breaker.record_abort()
+        raise
+    except Exception as e:
+        _record_error(ep, e)
+        raise
+    except BaseException:
+        ep.breaker.record_abort()
+        raise
+    ep.latency.add(time.time() - t0)
+    ep.breaker.record_success()
+    return result
+
+
+async def _arace(ep: Endpoint, factory: Callable[[], Awaitable[Any]], delay: float) -> Any:
+    primary = asyncio.ensure_future(factory())
+    tasks = {primary: "primary"}
+    try:
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        _log_hedge(ep, delay)
+        tasks[asyncio.ensure_future(factory())] = "hedge"
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            ok = [t for t in done if t.exception() is None]
+            if ok or not pending:
+                task = (ok or list(done))[0]
+                _log_hedge(ep, delay, tasks[task])
+                return task.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,123 @@
+# utils/singleflight.py
+from __future__ import annotations
+import asyncio, threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import settings
+from utils.logging import write_log
+
+
+class _LeaderGone(Exception):
+    """发起调用的一方被取消/中断：等待方自己重新发起，不跟着失败。"""
+
+
+class SingleFlight:
+    """
+    在途请求去重：同一 key 的并发调用只真正执行一次，其余调用等待并共享其结果（或异常）。
+    key 与对应缓存的键一致（TTS 音频键、ASR 音频指纹键、分类缓存键、回复缓存键），
+    缓存只能在写入完成后命中，SingleFlight 覆盖“第一个请求还在路上”的窗口。
+    同步（线程）与异步（任意事件循环）调用共用一张表：结果放在 concurrent.futures.Future 上。
+
+    do / ado 适用于一次调用一个结果；流式生成用底层的 join / finish / abandon / wait / await_。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    # ---------- 底层原语 ----------
+    def join(self, key: str) -> Tuple[Future, bool]:
+        """返回 (future, leader)：leader=True 表示由本调用方执行并负责 finish/abandon。"""
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                write_log(settings.LOG_PATH, {"event": "singleflight_shared", "name": self.name, "key": key[:12]})
+                return fut, False
+            fut = Future()
+            fut.set_running_or_notify_cancel()   # RUNNING 状态不可被等待方 cancel()
+            self._calls[key] = fut
+            return fut, True
+
+    def finish(self, key: str, fut: Future, result: Any = None, exc: Optional[BaseException] = None) -> None:
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+
+    def abandon(self, key: str, fut: Future) -> None:
+        """发起方未拿到完整结果（被取消/流被提前关闭）：等待方收到 None，自行发起。"""
+        self.finish(key, fut, exc=_LeaderGone())
+
+    def wait(self, fut: Future, timeout: Optional[float] = None) -> Any:
+        """
+        等待方取结果；发起方放弃时返回 None。给了 timeout 时超时也返回 None
+        （发起方的生成器没人迭代、也没被关闭，finish/abandon 都不会发生），由调用方自行发起。
+        """
+        try:
+            return fut.result(timeout)
+        except _LeaderGone:
+            return None
+        except FutureTimeout:
+            self._log_timeout(timeout)
+            return None
+
+    async def await_(self, fut: Future, timeout: Optional[float] = None) -> Any:
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(fut)), timeout)
+        except _LeaderGone:
+            return None
+        except asyncio.TimeoutError:
+            self._log_timeout(timeout)
+            return None
+
+    def _log_timeout(self, timeout: Optional[float]) -> None:
+        write_log(settings.LOG_PATH, {"event": "singleflight_timeout", "name": self.name, "timeout_s": timeout})
+
+    # ---------- 一次调用一个结果 ----------
+    def do(self, key: Optional[str], fn: Callable[[], Any]) -> Any:
+        if not key:
+            return fn()
+        while True:
+            fut, leader = self.join(key)
+            if not leader:
+                try:
+                    return fut.result()
+                except _LeaderGone:
+                    continue
+            try:
+                result = fn()
+            except Exception as e:
+                self.finish(key, fut, exc=e)
+                raise
+            except BaseException:
+                self.abandon(key, fut)
+                raise
+            self.finish(key, fut, result)
+            return result
+
+    async def ado(self, key: Optional[str], factory: Callable[[], Awaitable[Any]]) -> Any:
+        if not key:
+            return await factory()
+        while True:
+            fut, leader = self.join(key)
+            if not leader:
+                try:
+                    return await asyncio.wrap_future(fut)
+                except _LeaderGone:
+                    continue
+            try:
+                result = await factory()
+            except Exception as e:
+                self.finish(key, fut, exc=e)
+                raise
+            except BaseException:
+                # 含 CancelledError：发起方被取消，等待方各自重试
+                self.abandon(key, fut)
+                raise
+            self.finish(key, fut, result)
+            return result
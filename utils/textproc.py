@@ -1,10 +1,63 @@
 # utils/textproc.py
 from __future__ import annotations
+import re
+from typing import Any, List
+
+# 粗略 token 估算（不依赖具体分词器）：中日韩字符/全角符号按 1 token 计，
+# 其余非空白字符按 4 字符 ≈ 1 token 计；另加每条消息的角色/分隔开销。
+_WIDE = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+_SPACE = re.compile(r"\s+")
+MESSAGE_OVERHEAD_TOKENS = 4
+
 
 def sanitize_user_text(text: str) -> str:
     """简单清洗：去控制字符、裁掉过长输入等"""
     ...
 
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    n_wide = len(_WIDE.findall(text))
+    n_rest = len(_SPACE.sub("", text)) - n_wide
+    return n_wide + (n_rest + 3) // 4
+
+
+def message_tokens(msg: Any) -> int:
+    """单条消息的 token 数：首次计算后缓存在 Message.meta["tokens"]，之后每轮选历史都不再重算。"""
+    meta = getattr(msg, "meta", None)
+    if meta is not None and "tokens" in meta:
+        return meta["tokens"]
+    content = msg["content"] if isinstance(msg, dict) else msg.content
+    n = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+    if meta is not None:
+        meta["tokens"] = n
+    return n
+
+
 def truncate_messages_by_rounds(messages, max_rounds: int):
-    """按轮数截断（MVP）；后续可换成按token截断"""
-    ...
+    """按轮数截断：保留最近 max_rounds 轮（user+assistant 为一轮）。"""
+    return list(messages)[-2 * max_rounds:] if max_rounds > 0 else []
+
+
+def truncate_messages_by_tokens(messages, budget: int) -> List[Any]:
+    """
+    按 token 预算截断：从最新一轮往前整轮装入，装不下即停（不拆半轮），
+    结果不以 assistant 开头，避免模型看到没有提问的回答。
+    最新一轮总是保留（即使单轮就超预算，比如贴了一篇长文），否则下一轮提示词里没有任何近期上下文。
+    """
+    msgs = list(messages)
+    start, used = len(msgs), 0
+    i = len(msgs)
+    while i > 0:
+        j = i - 1
+        if msgs[j].role == "assistant" and j > 0 and msgs[j - 1].role == "user":
+            j -= 1          # 一轮 = user + assistant
+        cost = sum(message_tokens(m) for m in msgs[j:i])
+        if used + cost > budget and start < len(msgs):
+            break
+        used += cost
+        start = i = j
+    while start < len(msgs) and msgs[start].role == "assistant":
+        start += 1
+    return msgs[start:]
@@ -1,23 +1,103 @@
-# utils/textseg.py
-def split_for_tts(text: str, max_chars: int = 120, seps: str = "。！？!?；;，,"):
+from typing import List
+
+_STRONG_SEPS = "。！？!?；;"
+_WEAK_SEPS = "，,"
+
+
+class SentenceSegmenter:
     """
-    用于“句级快速反馈”的简易分句：
+    增量断句器：逐片喂入 LLM 输出，一旦遇到句界立即吐出完整句子。
+    切分规则与 split_for_tts 一致：
     - 句号/叹号/问号优先切分（达到一半长度即可切）
     - 逗号次之（达到目标长度切）
     - 超过 1.2 * max_chars 强制切
+    缓冲区用片段列表 + 计数维护，总耗时与输入长度线性相关。
+    """
+
+    def __init__(self, max_chars: int = 120):
+        self.max_chars = max_chars
+        self._strong_at = max_chars * 0.5
+        self._force_at = max_chars * 1.2
+        self._buf: List[str] = []   # 当前句已收到的片段
+        self._n = 0                 # 当前句字符数
+
+    def feed(self, chunk: str) -> List[str]:
+        """喂入一段文本，返回本次新完成的句子（可能为空列表）。"""
+        out: List[str] = []
+        if not chunk:
+            return out
+        start = 0
+        for i, ch in enumerate(chunk):
+            self._n += 1
+            if ((ch in _STRONG_SEPS and self._n >= self._strong_at)
+                    or (ch in _WEAK_SEPS and self._n >= self.max_chars)
+                    or self._n >= self._force_at):
+                self._buf.append(chunk[start:i + 1])
+                start = i + 1
+                self._emit(out)
+        if start < len(chunk):
+            self._buf.append(chunk[start:])
+        return out
+
+    def flush(self) -> List[str]:
+        """输入结束：吐出剩余的不完整句子。"""
+        out: List[str] = []
+        self._emit(out)
+        return out
+
+    def _emit(self, out: List[str]) -> None:
+        sent = "".join(self._buf).strip()
+        if sent:
+            out.append(sent)
+        self._buf, self._n = [], 0
+
+
+def _last_sep(text: str, seps: str) -> int:
+    return max(text.rfind(c) for c in seps)
+
+
+class ReplyCapper:
+    """
+    字数上限截断器（语音短回复）：逐片喂入，只放出到最近一个句界为止的文本，未完成的句子先留着；
+    累计字数达到 cap 时在上限内最后一个句界处截断并置 done，调用方应立即关闭上游流。
+    第一句就超过 cap 时退而在逗号处截断，没有逗号则硬截到 cap。
+    """
+
+    def __init__(self, cap: int):
+        self.cap = cap
+        self.done = False
+        self._n = 0        # 已放出字数
+        self._tail = ""    # 未完成的句子
+
+    def feed(self, chunk: str) -> str:
+        if self.done or not chunk:
+            return ""
+        text = self._tail + chunk
+        if self._n + len(text) >= self.cap:
+            head = text[:self.cap - self._n]
+            cut = _last_sep(head, _STRONG_SEPS) + 1
+            if cut == 0 and self._n == 0:
+                cut = (_last_sep(head, _WEAK_SEPS) + 1) or len(head)
+            self.done, self._tail = True, ""
+        else:
+            cut = _last_sep(text, _STRONG_SEPS) + 1
+            self._tail = text[cut:]
+        self._n += cut
+        return text[:cut]
+
+    def flush(self) -> str:
+        """上游正常结束：放出剩余的不完整句子。"""
+        out, self._tail = ("" if self.done else self._tail), ""
+        self._n += len(out)
+        return out
+
+
+def split_for_tts(text: str, max_chars: int = 120, seps: str = "。！？!?；;，,"):
+    """
+    用于“句级快速反馈”的简易分句（整段版本，规则见 SentenceSegmenter）。
     """
     text = (text or "").strip()
     if not text:
         return []
-    parts, buf = [], ""
-    for ch in text:
-        buf += ch
-        if ch in "。！？!?；;" and len(buf) >= max_chars * 0.5:
-            parts.append(buf.strip()); buf = ""
-        elif ch in "，," and len(buf) >= max_chars:
-            parts.append(buf.strip()); buf = ""
-        elif len(buf) >= max_chars * 1.2:
-            parts.append(buf.strip()); buf = ""
-    if buf.strip():
-        parts.append(buf.strip())
-    return parts
+    seg = SentenceSegmenter(max_chars=max_chars)
+    return seg.feed(text) + seg.flush()